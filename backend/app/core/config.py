@@ -1,5 +1,6 @@
 # inventory_api/app/core/config.py
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,4 +8,69 @@ load_dotenv()
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "postgresql://inventory_user:inventory_pass@db:5432/inventory_db"
-)
\ No newline at end of file
+)
+
+# Асинхронный движок (asyncpg) для маршрутов товаров, продаж и истории,
+# только PostgreSQL. Адрес по умолчанию — DATABASE_URL с драйвером asyncpg
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or re.sub(
+    r"^postgresql(\+\w+)?://", "postgresql+asyncpg://", DATABASE_URL
+)
+
+# Пул соединений с PostgreSQL: постоянные соединения, временные сверх них,
+# ожидание свободного соединения (сек), пересоздание соединений старше N сек,
+# проверка соединения перед выдачей из пула
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Работа через PgBouncer в режиме pool_mode=transaction: соединения держит
+# PgBouncer, приложение их не копит (NullPool), asyncpg не кэширует
+# подготовленные выражения. LISTEN ленты остатков в этом режиме не работает —
+# для него нужен прямой адрес PostgreSQL или pool_mode=session
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# Поиск N+1: одинаковый SQL, выполненный за один HTTP-запрос столько раз и больше,
+# попадает в предупреждения и db_repeated_queries_total (0 — не проверять)
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "5"))
+
+# Медленные HTTP-запросы: дольше SLOW_REQUEST_MS (0 — не отслеживать) сохраняются
+# в кольцевой буфер на SLOW_REQUEST_BUFFER записей вместе с SLOW_EXPLAIN_STATEMENTS
+# самыми долгими SQL и их планами EXPLAIN (ANALYZE, BUFFERS только для читающих SELECT)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "50"))
+SLOW_EXPLAIN_STATEMENTS = int(os.getenv("SLOW_EXPLAIN_STATEMENTS", "3"))
+
+# Индекс автодополнения: как часто (сек) фоновый поток дочитывает изменения
+# других процессов, 0 — не дочитывать (только изменения своего процесса)
+SUGGEST_REFRESH_SEC = float(os.getenv("SUGGEST_REFRESH_SEC", "1"))
+
+# Только для сравнения в stress_sales.py --baseline: продажа по старой схеме
+# «прочитать остаток — записать новый» без блокировок. Допускает перепродажу,
+# в рабочем окружении не включать
+SALES_BASELINE_READ_MODIFY_WRITE = os.getenv("SALES_BASELINE_READ_MODIFY_WRITE", "false").lower() == "true"
+
+# Количество потоков для фоновых задач импорта
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+
+# Дельта-синхронизация товаров: изменения моложе этого окна (сек) не отдаются,
+# чтобы ещё не закоммиченные транзакции не оказались позади курсора
+CHANGES_SETTLE_SEC = float(os.getenv("CHANGES_SETTLE_SEC", "5"))
+
+# Лента изменений остатков (SSE): сколько последних событий хранит процесс
+# для догоняющей отправки переподключившимся клиентам
+STOCK_EVENTS_BACKLOG = int(os.getenv("STOCK_EVENTS_BACKLOG", "1000"))
+
+# Контрольные точки журнала остатков для /stock/as-of: как часто снимать (сек), 0 — не снимать
+STOCK_CHECKPOINT_INTERVAL_SEC = float(os.getenv("STOCK_CHECKPOINT_INTERVAL_SEC", "3600"))
+
+# Партиционирование stock_operations по месяцам (только PostgreSQL). Существующую
+# таблицу переводит `python -m app.services.stock_partitions migrate`
+STOCK_OPERATIONS_PARTITIONED = os.getenv("STOCK_OPERATIONS_PARTITIONED", "false").lower() == "true"
+
+# Архив истории: партиции старше STOCK_ARCHIVE_AFTER_MONTHS месяцев выгружаются
+# в сжатые файлы в STOCK_ARCHIVE_DIR и отключаются от таблицы
+STOCK_ARCHIVE_DIR = os.getenv("STOCK_ARCHIVE_DIR", "archive")
+STOCK_ARCHIVE_AFTER_MONTHS = int(os.getenv("STOCK_ARCHIVE_AFTER_MONTHS", "12"))
@@ -1,17 +1,122 @@
 # inventory_api/app/database.py
-from sqlalchemy import create_engine
+from datetime import datetime
+from uuid import uuid4
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from app.core.config import DATABASE_URL
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from sqlalchemy.sql.functions import now
+from app.core.config import (
+    ASYNC_DATABASE_URL,
+    DATABASE_URL,
+    DB_ASYNC,
+    DB_MAX_OVERFLOW,
+    DB_PGBOUNCER,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT
+)
+from app.services.pool_stats import PoolStats, timed_pool_class
 
-engine = create_engine(DATABASE_URL)
+
+@compiles(now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+    """
+    now() в SQLite — в том же текстовом виде, в каком SQLAlchemy пишет
+    datetime-параметры ('YYYY-MM-DD HH:MM:SS.ffffff'). CURRENT_TIMESTAMP
+    даёт 'YYYY-MM-DD HH:MM:SS', и строковое сравнение с курсором
+    (timestamp, id) < (:ts, :id) пропускало строки той же секунды.
+    """
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def _engine_options(url: str, stats: PoolStats, queue_pool) -> dict:
+    """Параметры пула для create_engine; для SQLite остаётся пул по умолчанию"""
+    if url.startswith("sqlite"):
+        return {}
+    if DB_PGBOUNCER:
+        options = {"poolclass": timed_pool_class(NullPool, stats)}
+        if "+asyncpg" in url:
+            # PgBouncer отдаёт транзакции разным серверным соединениям:
+            # подготовленные выражения не кэшируем, имена делаем уникальными
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        return options
+    return {
+        "poolclass": timed_pool_class(queue_pool, stats),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+pool_stats = [PoolStats("sync")]
+_options = _engine_options(DATABASE_URL, pool_stats[0], QueuePool)
+engine = create_engine(DATABASE_URL, **_options)
+pool_stats[0].attach(engine, _options.get("max_overflow"))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронные сессии используют тот же класс Session, поэтому на них
+# срабатывают все обработчики событий, повешенные на SessionLocal.
+# expire_on_commit=False: после коммита атрибуты не догружаются неявно
+# (в асинхронном коде это ошибка MissingGreenlet)
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    if not ASYNC_DATABASE_URL.startswith("postgresql+asyncpg"):
+        # aiosqlite не ставится, а begin_write работает с соединением pysqlite
+        raise RuntimeError("DB_ASYNC=true поддерживается только с PostgreSQL (asyncpg); для SQLite задайте DB_ASYNC=false")
+    pool_stats.append(PoolStats("async"))
+    _options = _engine_options(ASYNC_DATABASE_URL, pool_stats[1], AsyncAdaptedQueuePool)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_options)
+    pool_stats[1].attach(async_engine.sync_engine, _options.get("max_overflow"))
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, sync_session_class=SessionLocal.class_, autoflush=False, expire_on_commit=False
+    )
+
 Base = declarative_base()
 
+
+def begin_write(db: Session):
+    """
+    Начать транзакцию сессии с блокировкой записи в SQLite (BEGIN IMMEDIATE).
+
+    В SQLite нет SELECT ... FOR UPDATE, а pysqlite открывает транзакцию
+    только перед первым INSERT/UPDATE: остаток, прочитанный до этого,
+    может устареть, и параллельные продажи перезапишут друг друга.
+    BEGIN IMMEDIATE заранее берёт блокировку записи — такие транзакции
+    выполняются по очереди, а чтения не ждут. В PostgreSQL ничего не делает.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    dbapi_connection = db.connection().connection.dbapi_connection
+    if not dbapi_connection.in_transaction:
+        dbapi_connection.execute("BEGIN IMMEDIATE")
+
+
+def db_now(db: Session) -> datetime:
+    """
+    Текущее время по часам БД — в том же виде, что и значения func.now()
+    в колонках DateTime (без часового пояса). Сравнивать такие колонки с
+    datetime.utcnow() процесса нельзя: часы и пояс сервера БД могут отличаться.
+    """
+    return db.execute(select(func.now())).scalar().replace(tzinfo=None)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
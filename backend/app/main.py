@@ -1,11 +1,48 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.routing import APIRoute
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import products, sales, import_excel
-from app.database import Base, engine
+from app.core.config import DB_ASYNC
+from app.routes import products, sales, import_excel, stock, analytics, diagnostics, metrics, async_routes
+from app.database import Base, engine, SessionLocal, async_engine
+from app.services.metrics import MetricsMiddleware
+from app.services.product_suggest import suggest_index, suggest_refresher
+from app.services.stock_checkpoints import checkpoint_scheduler
+from app.services.stock_events import broker
+from app.services.sql_tracing import SqlTracingMiddleware
+from app.services.stock_partitions import partition_maintainer
 
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Партиции stock_operations на текущий и ближайшие месяцы (если таблица партиционирована)
+    partition_maintainer.start()
+    # Индекс автодополнения строится один раз при старте процесса
+    db = SessionLocal()
+    try:
+        suggest_index.rebuild(db)
+    finally:
+        db.close()
+    # Изменения других процессов индекс дочитывает в фоне, не на нажатиях клавиш
+    suggest_refresher.start()
+    # Слушатель ленты остатков (LISTEN в PostgreSQL) живёт вместе с процессом
+    broker.start(asyncio.get_running_loop())
+    # Контрольные точки для /stock/as-of снимаются в фоне
+    checkpoint_scheduler.start()
+    yield
+    checkpoint_scheduler.stop()
+    suggest_refresher.stop()
+    partition_maintainer.stop()
+    broker.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Inventory & Sales API",
     description="Полный учёт склада и продаж с Excel-импортом, историей и коэффициентами",
     version="1.0.0"
@@ -17,8 +54,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
+app.add_middleware(SqlTracingMiddleware)
+# Снаружи CORS: в замер попадает весь путь запроса внутри приложения
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(products.router, prefix="/api", tags=["📦 Склад"])
 app.include_router(sales.router, prefix="/api", tags=["💰 Продажи"])
-app.include_router(import_excel.router, prefix="/api", tags=["📤 Импорт"])
\ No newline at end of file
+app.include_router(import_excel.router, prefix="/api", tags=["📤 Импорт"])
+app.include_router(stock.router, prefix="/api", tags=["📡 Остатки"])
+app.include_router(analytics.router, prefix="/api", tags=["📊 Аналитика"])
+app.include_router(diagnostics.router, prefix="/api", tags=["🩺 Диагностика"])
+# /metrics без префикса /api — путь по умолчанию для Prometheus
+app.include_router(metrics.router, tags=["🩺 Диагностика"])
+
+
+def _replace_routes(app: FastAPI, router, prefix: str, tags: list):
+    """Подключить router, убрав синхронные маршруты с теми же путём и методом"""
+    replaced = {
+        (prefix + route.path, method) for route in router.routes for method in route.methods
+    }
+    app.router.routes = [
+        route for route in app.router.routes
+        if not (isinstance(route, APIRoute) and any((route.path, m) in replaced for m in route.methods))
+    ]
+    app.include_router(router, prefix=prefix, tags=tags)
+
+
+if DB_ASYNC:
+    # Товары, продажи и история — на асинхронном движке, остальное остаётся синхронным
+    _replace_routes(app, async_routes.products_router, "/api", ["📦 Склад"])
+    _replace_routes(app, async_routes.sales_router, "/api", ["💰 Продажи"])
@@ -1,4 +1,8 @@
 # inventory_api/app/models/__init__.py
-from .product import Product
+from .product import Product, ProductTombstone
 from .stock_operation import StockOperation
-from .sale import Sale, SaleItem
\ No newline at end of file
+from .sale import Sale, SaleItem
+from .import_job import ImportJob
+from .catalog_version import CatalogVersion
+from .stock_checkpoint import StockCheckpoint, StockSnapshot
+from .sales_rollup import SalesRollupProduct, SalesRollupClient
\ No newline at end of file
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, BigInteger, DDL, event
+from app.database import Base
+
+class CatalogVersion(Base):
+    """Версия каталога товаров: растёт после каждого коммита, меняющего товары или продажи"""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, default=0, nullable=False)
+
+
+# Единственная строка создаётся вместе с таблицей
+event.listen(
+    CatalogVersion.__table__,
+    "after_create",
+    DDL("INSERT INTO catalog_version (id, version) VALUES (1, 0)"),
+)
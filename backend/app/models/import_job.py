@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, func, Enum
+from app.database import Base
+import enum
+
+class ImportJobStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, nullable=False)
+    status = Column(Enum(ImportJobStatus), default=ImportJobStatus.PENDING, nullable=False)
+    rows_total = Column(Integer, nullable=True)  # Оценка по размеру листа
+    rows_processed = Column(Integer, default=0, nullable=False)
+    rows_failed = Column(Integer, default=0, nullable=False)
+    products_created = Column(Integer, default=0, nullable=False)
+    products_updated = Column(Integer, default=0, nullable=False)
+    errors = Column(JSON, default=list, nullable=False)  # Последние ошибки по строкам
+    detail = Column(String, nullable=True)  # Причина падения всей задачи
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
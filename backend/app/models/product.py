@@ -1,8 +1,21 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, func
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Index, DDL, event
 from app.database import Base
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Триграммные индексы для поиска по подстроке (ILIKE '%q%') и similarity()
+        Index(
+            "ix_products_name_trgm", "name",
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_products_sku_trgm", "sku",
+            postgresql_using="gin", postgresql_ops={"sku": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        # Под дельта-синхронизацию: WHERE (updated_at, id) > курсор ORDER BY updated_at, id
+        Index("ix_products_updated_at_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -11,4 +24,22 @@ class Product(Base):
     coefficient = Column(Numeric(10, 4), default=1.0, nullable=False)
     quantity = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class ProductTombstone(Base):
+    """Отметка об удалении товара — нужна клиентам дельта-синхронизации"""
+    __tablename__ = "product_tombstones"
+    __table_args__ = (
+        Index("ix_product_tombstones_deleted_at_product_id", "deleted_at", "product_id"),
+    )
+
+    product_id = Column(Integer, primary_key=True)
+    deleted_at = Column(DateTime, default=func.now(), nullable=False)
+
+
+# Расширение нужно до создания триграммных индексов
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
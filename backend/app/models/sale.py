@@ -1,4 +1,5 @@
 from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Enum, ForeignKey
+from sqlalchemy.orm import relationship
 from app.database import Base
 import enum
 
@@ -9,6 +10,8 @@ class PaymentStatus(str, enum.Enum):
 
 class Sale(Base):
     __tablename__ = "sales"
+    # created_at возвращается из INSERT (RETURNING) — по нему продажа попадает в агрегаты
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     client_name = Column(String, nullable=False)
@@ -18,6 +21,10 @@ class Sale(Base):
     payment_status = Column(Enum(PaymentStatus), default=PaymentStatus.UNPAID)
     created_at = Column(DateTime, default=func.now())
 
+    # lazy="raise": позиции грузятся только явно (joinedload/selectinload),
+    # чтобы случайный доступ в цикле не превращался в N+1 запросов
+    items = relationship("SaleItem", back_populates="sale", order_by="SaleItem.id", lazy="raise")
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
 
@@ -27,4 +34,7 @@ class SaleItem(Base):
     quantity = Column(Integer, nullable=False)
     sold_price_per_unit = Column(Numeric(15, 2), nullable=False)
     coefficient = Column(Numeric(10, 4), default=1.0, nullable=False)  # НДС, наличка и т.д.
-    purchase_price_at_sale = Column(Numeric(15, 2), nullable=False)
\ No newline at end of file
+    purchase_price_at_sale = Column(Numeric(15, 2), nullable=False)
+
+    sale = relationship("Sale", back_populates="items", lazy="raise")
+    product = relationship("Product", lazy="raise")
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, Numeric, Date, Enum
+from app.database import Base
+import enum
+
+class RollupPeriod(str, enum.Enum):
+    DAY = "day"
+    WEEK = "week"    # period_start — понедельник
+    MONTH = "month"  # period_start — первое число
+
+class SalesRollupProduct(Base):
+    """Продажи товара за период; обновляется вместе с созданием/удалением продаж"""
+    __tablename__ = "sales_rollup_products"
+
+    period = Column(Enum(RollupPeriod), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, default=0, nullable=False)
+    # Выручка и себестоимость считаются по позициям — храним с запасом точности
+    revenue = Column(Numeric(18, 4), default=0, nullable=False)
+    cost = Column(Numeric(18, 4), default=0, nullable=False)
+    sales_count = Column(Integer, default=0, nullable=False)
+
+class SalesRollupClient(Base):
+    """Продажи клиенту за период (по итогам продаж total_sale/total_cost)"""
+    __tablename__ = "sales_rollup_clients"
+
+    period = Column(Enum(RollupPeriod), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    client_name = Column(String, primary_key=True)
+    revenue = Column(Numeric(18, 2), default=0, nullable=False)
+    cost = Column(Numeric(18, 2), default=0, nullable=False)
+    sales_count = Column(Integer, default=0, nullable=False)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, Numeric, DateTime, ForeignKey, func, Index
+from app.database import Base
+
+class StockCheckpoint(Base):
+    """
+    Контрольная точка журнала операций: состояние склада с учётом всех
+    операций с timestamp <= taken_at. Сами остатки — в stock_snapshots.
+    """
+    __tablename__ = "stock_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    taken_at = Column(DateTime, nullable=False, index=True)
+    products_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+class StockSnapshot(Base):
+    """Остаток, закупочная цена и коэффициент товара на момент контрольной точки"""
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (
+        # Под /stock/as-of по одному товару
+        Index("ix_stock_snapshots_product_checkpoint", "product_id", "checkpoint_id"),
+    )
+
+    checkpoint_id = Column(Integer, ForeignKey("stock_checkpoints.id", ondelete="CASCADE"), primary_key=True)
+    # Без внешнего ключа: при удалении товара его снимки удаляются вместе с историей
+    product_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    purchase_price = Column(Numeric(15, 2), nullable=True)
+    coefficient = Column(Numeric(10, 4), nullable=True)
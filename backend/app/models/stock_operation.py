@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, ForeignKey, Numeric, String, DateTime, func, Enum
+from sqlalchemy import Column, Integer, ForeignKey, Numeric, String, DateTime, func, Enum, Index
+from app.core.config import STOCK_OPERATIONS_PARTITIONED
 from app.database import Base
 import enum
 
@@ -9,8 +10,15 @@ class OperationType(str, enum.Enum):
 
 class StockOperation(Base):
     __tablename__ = "stock_operations"
+    __table_args__ = (
+        # Под keyset-пагинацию истории: ORDER BY timestamp DESC, id DESC
+        Index("ix_stock_operations_timestamp_id", "timestamp", "id"),
+        Index("ix_stock_operations_product_timestamp_id", "product_id", "timestamp", "id"),
+        # Помесячные партиции по timestamp (PostgreSQL), см. app/services/stock_partitions.py
+        {"postgresql_partition_by": "RANGE (timestamp)"} if STOCK_OPERATIONS_PARTITIONED else {},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     operation_type = Column(Enum(OperationType), nullable=False)
     quantity_change = Column(Integer, nullable=False)
@@ -22,4 +30,5 @@ class StockOperation(Base):
     new_coefficient = Column(Numeric(10, 4), nullable=True)
     sold_price_per_unit = Column(Numeric(15, 2), nullable=True)
     reason = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=func.now(), nullable=False)
\ No newline at end of file
+    # В партиционированной таблице ключ партиции обязан входить в первичный ключ
+    timestamp = Column(DateTime, default=func.now(), nullable=False, primary_key=STOCK_OPERATIONS_PARTITIONED)
\ No newline at end of file
@@ -0,0 +1,94 @@
+# app/routes/analytics.py
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import date
+from typing import List, Optional
+from app.database import get_db
+from app.models.product import Product
+from app.models.sales_rollup import RollupPeriod, SalesRollupClient, SalesRollupProduct
+from app.schemas.analytics import SalesByClientResponse, SalesByProductResponse, SalesTotalsResponse
+from app.services.sales_rollups import period_start
+
+router = APIRouter()
+
+
+def _filter_rollups(query, model, period: RollupPeriod, date_from: Optional[date], date_to: Optional[date]):
+    # Период, в который попадает date_from, берём целиком
+    query = query.filter(model.period == period, model.sales_count > 0)
+    if date_from:
+        query = query.filter(model.period_start >= period_start(period, date_from))
+    if date_to:
+        query = query.filter(model.period_start <= date_to)
+    return query
+
+
+@router.get("/analytics/sales", response_model=List[SalesTotalsResponse], summary="Итоги продаж по периодам")
+def get_sales_totals(
+    period: RollupPeriod = Query(RollupPeriod.DAY),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Выручка, себестоимость, маржа и число продаж за каждый день/неделю/месяц.
+    Считается по готовым агрегатам, а не по истории продаж.
+    """
+    m = SalesRollupClient
+    query = db.query(
+        m.period_start,
+        func.sum(m.revenue).label("revenue"),
+        func.sum(m.cost).label("cost"),
+        func.sum(m.sales_count).label("sales_count"),
+    )
+    query = _filter_rollups(query, m, period, date_from, date_to)
+    rows = query.group_by(m.period_start).order_by(m.period_start).all()
+    return [SalesTotalsResponse(**row._asdict()) for row in rows]
+
+
+@router.get("/analytics/sales/by-product", response_model=List[SalesByProductResponse],
+            summary="Продажи по товарам за периоды")
+def get_sales_by_product(
+    period: RollupPeriod = Query(RollupPeriod.DAY),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    product_id: Optional[int] = Query(None),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Внутри периода товары отсортированы по выручке (по убыванию)"""
+    query = db.query(SalesRollupProduct, Product.name).outerjoin(
+        Product, Product.id == SalesRollupProduct.product_id
+    )
+    query = _filter_rollups(query, SalesRollupProduct, period, date_from, date_to)
+    if product_id:
+        query = query.filter(SalesRollupProduct.product_id == product_id)
+    rows = query.order_by(
+        SalesRollupProduct.period_start, SalesRollupProduct.revenue.desc(), SalesRollupProduct.product_id
+    ).limit(limit).all()
+
+    result = []
+    for rollup, product_name in rows:
+        item = SalesByProductResponse.model_validate(rollup)
+        item.product_name = product_name
+        result.append(item)
+    return result
+
+
+@router.get("/analytics/sales/by-client", response_model=List[SalesByClientResponse],
+            summary="Продажи по клиентам за периоды")
+def get_sales_by_client(
+    period: RollupPeriod = Query(RollupPeriod.DAY),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    client_name: Optional[str] = Query(None),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Внутри периода клиенты отсортированы по выручке (по убыванию)"""
+    query = _filter_rollups(db.query(SalesRollupClient), SalesRollupClient, period, date_from, date_to)
+    if client_name:
+        query = query.filter(SalesRollupClient.client_name == client_name)
+    return query.order_by(
+        SalesRollupClient.period_start, SalesRollupClient.revenue.desc(), SalesRollupClient.client_name
+    ).limit(limit).all()
@@ -0,0 +1,173 @@
+# app/routes/async_routes.py
+"""
+Асинхронные версии маршрутов товаров, продаж и истории (DB_ASYNC=true).
+
+Обработчики не занимают поток из пула Starlette: логика маршрутов из
+products.py и sales.py выполняется через AsyncSession.run_sync — тот же
+код на синхронном API сессии, но ввод-вывод идёт через asyncpg в event
+loop. Поведение и ответы совпадают с синхронными маршрутами; main.py
+подменяет ими одноимённые синхронные.
+
+Асинхронный режим частичный. Всё, что внутри run_sync не является
+запросом к БД, выполняется прямо в event loop, поэтому блокирующий
+ввод-вывод отсюда вынесен: архив истории читается в asyncio.to_thread,
+версия каталога поднимается запросом той же сессии, EXPLAIN медленных
+запросов строится в своём потоке. В event loop остаётся работа CPU —
+сериализация ответов, в том числе сборка кэша /products/all после
+смены версии. Остальные маршруты (импорт, отчёты, диагностика) —
+синхронные, в пуле потоков. Только PostgreSQL (asyncpg).
+"""
+import asyncio
+from fastapi import APIRouter, Body, Depends, Query, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.database import get_async_db
+from app.routes import products, sales
+from app.schemas.product import (
+    ProductBulkUpdate,
+    ProductChanges,
+    ProductCreate,
+    ProductResponse,
+    ProductUpdate
+)
+from app.schemas.sale import SaleBatchCreate, SaleBatchResponse, SaleCreate, SaleResponse, SaleStatusUpdate
+from app.schemas.stock_operation import StockOperationResponse
+
+products_router = APIRouter()
+sales_router = APIRouter()
+
+
+async def _run(db: AsyncSession, handler, response_model=None, **kwargs):
+    """Вызвать синхронный обработчик на сессии db внутри run_sync"""
+    def call(session):
+        result = handler(db=session, **kwargs)
+        if response_model is not None and not isinstance(result, Response):
+            # Сериализуем здесь же: вне run_sync обращение к незагруженному атрибуту — ошибка
+            result = TypeAdapter(response_model).validate_python(result, from_attributes=True)
+        return result
+    return await db.run_sync(call)
+
+
+@products_router.get("/products", response_model=list[ProductResponse], summary="Поиск по названию и SKU")
+async def search_products(
+    q: str = Query(None, min_length=1),
+    limit: int = Query(50, ge=1, le=500, description="Максимум результатов поиска"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Подстрока ищется в названии и SKU, лучшие совпадения — первыми"""
+    return await _run(db, products.search_products, list[ProductResponse], q=q, limit=limit)
+
+
+@products_router.get("/products/all", response_model=list[ProductResponse], summary="Все товары")
+async def get_all_products(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Каталог отдаётся из кэша сериализованного ответа. Если ETag клиента
+    совпадает с текущей версией каталога — 304 без тела.
+    """
+    return await _run(db, products.get_all_products, request=request)
+
+
+@products_router.get("/products/changes", response_model=ProductChanges, summary="Изменения каталога с момента курсора")
+async def get_product_changes(
+    since: Optional[str] = Query(None, description="Курсор из next_cursor предыдущего ответа"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Дельта-синхронизация каталога, см. синхронную версию маршрута"""
+    return await _run(db, products.get_product_changes, since=since, limit=limit)
+
+
+@products_router.post("/products", response_model=ProductResponse, summary="Добавить товар")
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    return await _run(db, products.create_product, ProductResponse, product=product)
+
+
+@products_router.post("/products/bulk", response_model=list[ProductResponse], summary="Добавить пачку товаров")
+async def create_products_bulk(
+    items: List[ProductCreate] = Body(..., min_length=1, max_length=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Все товары и их приходы записываются одной транзакцией"""
+    return await _run(db, products.create_products_bulk, list[ProductResponse], products=items)
+
+
+@products_router.put("/products/{id}", response_model=ProductResponse, summary="Обновить товар")
+async def update_product(id: int, update: ProductUpdate, db: AsyncSession = Depends(get_async_db)):
+    return await _run(db, products.update_product, ProductResponse, id=id, update=update)
+
+
+@products_router.patch("/products/bulk", response_model=list[ProductResponse], summary="Обновить пачку товаров")
+async def update_products_bulk(
+    updates: List[ProductBulkUpdate] = Body(..., min_length=1, max_length=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Частичные изменения списка товаров одной транзакцией. Если хотя бы
+    одного товара нет, ничего не применяется (404).
+    """
+    return await _run(db, products.update_products_bulk, list[ProductResponse], updates=updates)
+
+
+@products_router.delete("/products/{id}", summary="Удалить товар")
+async def delete_product(id: int, db: AsyncSession = Depends(get_async_db)):
+    return await _run(db, products.delete_product, id=id)
+
+
+@products_router.get("/stock-history", response_model=List[StockOperationResponse], summary="История операций со складом")
+async def get_stock_history(
+    response: Response,
+    product_id: Optional[int] = Query(None, description="ID товара для фильтрации"),
+    operation_type: Optional[str] = Query(None, enum=["INCOMING", "SALE", "ADJUSTMENT"]),
+    days: Optional[int] = Query(None, description="История за последние N дней"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
+    limit: int = Query(500, ge=1, le=5000, description="Размер страницы"),
+    include_archived: bool = Query(False, description="Продолжать в архиве старых партиций"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """История операций от новых к старым; курсор следующей страницы — в X-Next-Cursor"""
+    result, cursor_key = await db.run_sync(
+        products._history_page, product_id, operation_type, days, cursor, limit
+    )
+    if include_archived and len(result) <= limit:
+        deleted = await db.run_sync(products._deleted_products, product_id)
+        # Архив — чтение и распаковка файлов: в потоке, а не в event loop
+        archived = await asyncio.to_thread(
+            products._read_archive, result, cursor_key, product_id, operation_type, days, limit, deleted
+        )
+        result += await db.run_sync(products._archived_history_items, archived)
+    return products._trim_history_page(response, result, limit)
+
+
+@sales_router.post("/sales", response_model=SaleResponse, summary="Создать продажу")
+async def create_sale(sale: SaleCreate, db: AsyncSession = Depends(get_async_db)):
+    return await _run(db, sales.create_sale, sale=sale)
+
+
+@sales_router.post("/sales/batch", response_model=SaleBatchResponse, summary="Создать пачку продаж")
+async def create_sales_batch(batch: SaleBatchCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Массовый ввод продаж одной транзакцией.
+
+    - **all_or_nothing**: первая ошибка отменяет всю пачку (ответ 400/404)
+    - **best_effort**: ошибочные продажи пропускаются, остальные сохраняются
+    """
+    return await _run(db, sales.create_sales_batch, batch=batch)
+
+
+@sales_router.get("/sales", response_model=List[SaleResponse], summary="Получить все продажи")
+async def get_all_sales(
+    status: Optional[str] = Query(None, enum=["PAID", "UNPAID", "PARTIAL"]),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _run(db, sales.get_all_sales, status=status)
+
+
+@sales_router.put("/sales/{id}/status", summary="Изменить статус оплаты")
+async def update_sale_status(id: int, update: SaleStatusUpdate, db: AsyncSession = Depends(get_async_db)):
+    return await _run(db, sales.update_sale_status, id=id, update=update)
+
+
+@sales_router.delete("/sales/{id}", summary="Удалить продажу и вернуть товары на склад")
+async def delete_sale(id: int, db: AsyncSession = Depends(get_async_db)):
+    return await _run(db, sales.delete_sale, id=id)
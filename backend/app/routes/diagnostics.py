@@ -0,0 +1,43 @@
+# app/routes/diagnostics.py
+from fastapi import APIRouter, HTTPException
+from typing import List
+from app.database import pool_stats
+from app.schemas.diagnostics import PoolStatsResponse, SlowRequestResponse, SlowRequestSummary
+from app.services.slow_requests import slow_log
+
+router = APIRouter()
+
+
+@router.get("/diagnostics/pool", response_model=List[PoolStatsResponse], summary="Состояние пулов соединений с БД")
+def get_pool_stats():
+    """
+    Выданные и временные соединения, таймауты и время ожидания свободного
+    соединения для каждого движка. Рост wait_p95_ms и timeouts означает, что
+    запросы стоят в очереди пула: стоит увеличить DB_POOL_SIZE/DB_MAX_OVERFLOW
+    или поставить перед базой PgBouncer.
+    """
+    return [stats.snapshot() for stats in pool_stats]
+
+
+@router.get("/diagnostics/slow-requests", response_model=List[SlowRequestSummary],
+            summary="Медленные запросы")
+def get_slow_requests():
+    """
+    Последние запросы дольше SLOW_REQUEST_MS, от новых к старым. Буфер
+    хранится в памяти процесса и очищается при перезапуске.
+    """
+    return slow_log.list()
+
+
+@router.get("/diagnostics/slow-requests/{id}", response_model=SlowRequestResponse,
+            summary="Медленный запрос с планами SQL")
+def get_slow_request(id: int):
+    """
+    Самые долгие SQL запроса с параметрами и планами: EXPLAIN (ANALYZE, BUFFERS)
+    для читающих SELECT, простой EXPLAIN для записи и SELECT ... FOR UPDATE/SHARE.
+    План строится в фоне — сразу после запроса поле plan может быть пустым.
+    """
+    entry = slow_log.get(id)
+    if entry is None:
+        raise HTTPException(404, "Запрос не найден")
+    return entry
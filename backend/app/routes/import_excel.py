@@ -1,12 +1,16 @@
 # app/routes/import_excel.py
-import io
+import os
 import re
+import time
 from decimal import Decimal
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from sqlalchemy.orm import Session
-from openpyxl import load_workbook
 from app.database import get_db
-from app.models.product import Product
+from app.models.import_job import ImportJob
+from app.schemas.import_job import ImportJobResponse
+from app.services import import_jobs, metrics
+from app.services.excel_import_service import bulk_import_warehouse_rows
+from app.services.excel_reader import StreamingSheetReader, spool_upload
 
 router = APIRouter()
 
@@ -26,27 +30,21 @@ def parse_price_and_coeff(cell_value):
     except:
         return Decimal('0'), Decimal('1.0')
 
-@router.post("/import/warehouse", summary="Импорт склада из Excel (лист 'Склад')")
-async def upload_warehouse_excel(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
-):
-    if not file.filename.endswith(".xlsx"):
-        raise HTTPException(400, "Только .xlsx файлы")
-
-    contents = await file.read()
-
+def _open_warehouse_sheet(path: str) -> StreamingSheetReader:
     try:
-        wb = load_workbook(io.BytesIO(contents), data_only=False)
-        ws = wb["Склад"]
+        return StreamingSheetReader(path, "Склад")
     except KeyError:
         raise HTTPException(400, "В файле нет листа 'Склад'")
     except Exception as e:
         raise HTTPException(400, f"Ошибка чтения Excel: {e}")
 
-    created = 0
+
+def _iter_warehouse_rows(reader: StreamingSheetReader, errors: list, progress: dict = None):
+    """Разобранные строки листа: (name, sku, qty, purchase_price, coefficient)"""
     # Читаем 5 колонок: A, B, C, D, E
-    for row in ws.iter_rows(min_row=2, max_col=5):
+    for row_number, row in reader.iter_rows(min_row=2, max_col=5):
+        if progress is not None:
+            progress["rows_read"] += 1
         try:
             name_cell = row[1]  # B
             qty_cell = row[2]   # C
@@ -59,31 +57,102 @@ async def upload_warehouse_excel(
             name = str(name_cell.value).strip()
             sku = str(sku_cell.value).strip() if sku_cell.value else None
             qty = int(qty_cell.value)
-            purchase_price, coefficient = parse_price_and_coeff(price_cell.value)
-
-            # Ищем товар по (name, sku) — именно так они уникальны!
-            existing = db.query(Product).filter(
-                Product.name == name,
-                Product.sku == sku
-            ).first()
-
-            if existing:
-                existing.quantity += qty
-                db.add(existing)
-            else:
-                product = Product(
-                    name=name,
-                    sku=sku,
-                    purchase_price=purchase_price,
-                    coefficient=coefficient,
-                    quantity=qty
-                )
-                db.add(product)
-                created += 1
-
+            # Цена может быть формулой "=цена*коэф" — разбираем её текст
+            purchase_price, coefficient = parse_price_and_coeff(price_cell.formula or price_cell.value)
         except Exception as e:
             print(f"Ошибка строки: {e}")
+            errors.append(f"Строка {row_number}: {e}")
             continue
 
-    db.commit()
-    return {"message": "Склад успешно импортирован", "products_created": created}
\ No newline at end of file
+        # Товар однозначно определяется парой (name, sku)
+        yield name, sku, qty, purchase_price, coefficient
+
+
+@router.post("/import/warehouse", summary="Импорт склада из Excel (лист 'Склад')")
+def upload_warehouse_excel(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    # Обычный def: FastAPI выполняет обработчик в пуле потоков,
+    # и разбор большого файла не блокирует event loop
+    if not file.filename.endswith(".xlsx"):
+        raise HTTPException(400, "Только .xlsx файлы")
+
+    # Файл не читаем в память целиком: сохраняем на диск и разбираем построчно
+    path = spool_upload(file.file)
+    try:
+        with _open_warehouse_sheet(path) as reader:
+            started = time.perf_counter()
+            errors = []
+            stats = bulk_import_warehouse_rows(db, _iter_warehouse_rows(reader, errors))
+            elapsed = time.perf_counter() - started
+            metrics.IMPORT_ROWS.labels("failed").inc(len(errors))
+    finally:
+        os.remove(path)
+
+    return {
+        "message": "Склад успешно импортирован",
+        **stats,
+        "rows_failed": len(errors),
+        "elapsed_sec": round(elapsed, 3),
+        "rows_per_sec": round(stats["rows_processed"] / elapsed, 1) if elapsed else None,
+    }
+
+
+def _run_warehouse_import_job(db: Session, job: ImportJob, path: str):
+    try:
+        with _open_warehouse_sheet(path) as reader:
+            job.rows_total = max(reader.max_row - 1, 0) if reader.max_row else None
+            db.commit()
+
+            errors = []
+            progress = {"rows_read": 0}
+
+            def on_batch(stats):
+                # Фиксируем пачку вместе с прогрессом — его видно из GET /import/jobs/{id}
+                job.rows_processed = progress["rows_read"]
+                job.products_created = stats["products_created"]
+                job.products_updated = stats["products_updated"]
+                import_jobs.record_errors(job, errors)
+                db.commit()
+
+            stats = bulk_import_warehouse_rows(
+                db, _iter_warehouse_rows(reader, errors, progress), on_batch=on_batch
+            )
+            on_batch(stats)
+            metrics.IMPORT_ROWS.labels("failed").inc(len(errors))
+    except HTTPException as e:
+        raise ValueError(e.detail)
+    finally:
+        os.remove(path)
+
+
+@router.post("/import/jobs", response_model=ImportJobResponse, status_code=202,
+             summary="Фоновый импорт склада из Excel")
+def create_import_job(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Принимает файл и сразу возвращает задачу. Разбор и запись в БД
+    выполняются в фоне, прогресс — в **GET /import/jobs/{id}**.
+    Пачки фиксируются по мере обработки, поэтому при падении задачи
+    уже обработанные строки остаются в базе.
+    """
+    if not file.filename.endswith(".xlsx"):
+        raise HTTPException(400, "Только .xlsx файлы")
+
+    # Файл живёт до конца задачи — сохраняем его на диск
+    path = spool_upload(file.file)
+
+    job = import_jobs.create_job(db, file.filename)
+    import_jobs.submit_job(job.id, _run_warehouse_import_job, path)
+    return job
+
+
+@router.get("/import/jobs/{id}", response_model=ImportJobResponse, summary="Статус фонового импорта")
+def get_import_job(id: int, db: Session = Depends(get_db)):
+    job = db.query(ImportJob).filter(ImportJob.id == id).first()
+    if not job:
+        raise HTTPException(404, "Задача импорта не найдена")
+    return job
@@ -0,0 +1,15 @@
+# app/routes/metrics.py
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter()
+
+
+@router.get("/metrics", summary="Метрики Prometheus")
+def get_metrics():
+    """
+    Задержки, размеры ответов и статусы по маршрутам, запросы в обработке,
+    продажи и строки импорта, состояние пула соединений — в текстовом
+    формате Prometheus.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
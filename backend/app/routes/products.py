@@ -1,83 +1,220 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, func, insert, tuple_
 from decimal import Decimal
 from datetime import datetime, timedelta
+import csv
+import io
+from itertools import islice
 from typing import List, Optional
-from app.database import get_db
-from app.models.product import Product
+from app.database import get_db, SessionLocal
+from app.models.product import Product, ProductTombstone
 from app.models.stock_operation import StockOperation, OperationType
-from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse
+from app.models.stock_checkpoint import StockSnapshot
+from app.schemas.product import (
+    ProductBulkUpdate,
+    ProductCreate,
+    ProductUpdate,
+    ProductChanges,
+    ProductResponse,
+    ProductSuggestion
+)
 from app.schemas.stock_operation import StockOperationResponse
+from app.services import catalog_cache as catalog_cache_service
+from app.services import product_service
+from app.services.product_suggest import suggest_index
+from app.services.stock_partitions import iter_archived_operations
 
 router = APIRouter()
 
-@router.get("/products", response_model=list[ProductResponse], summary="Частичный поиск по названию")
-def search_products(q: str = Query(None, min_length=1), db: Session = Depends(get_db)):
-    query = db.query(Product)
-    if q:
-        query = query.filter(Product.name.ilike(f"%{q}%"))
-    return query.all()
+@router.get("/products", response_model=list[ProductResponse], summary="Поиск по названию и SKU")
+def search_products(
+    q: str = Query(None, min_length=1),
+    limit: int = Query(50, ge=1, le=500, description="Максимум результатов поиска"),
+    db: Session = Depends(get_db)
+):
+    """Подстрока ищется в названии и SKU, лучшие совпадения — первыми"""
+    return product_service.search_products(db, q, limit)
+
+@router.get("/products/suggest", response_model=list[ProductSuggestion], summary="Автодополнение по названию и SKU")
+def suggest_products(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """Подсказки только из индекса в памяти, без обращений к БД"""
+    return suggest_index.search(q, limit)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
 
 @router.get("/products/all", response_model=list[ProductResponse], summary="Все товары")
-def get_all_products(db: Session = Depends(get_db)):
-    return db.query(Product).all()
+def get_all_products(request: Request, db: Session = Depends(get_db)):
+    """
+    Каталог отдаётся из кэша сериализованного ответа. Если ETag клиента
+    совпадает с текущей версией каталога — 304 без тела.
+    """
+    version = catalog_cache_service.get_version(db)
+    etag = catalog_cache_service.etag_for(version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = catalog_cache_service.catalog_cache.get(db, version)
+    return Response(body, media_type="application/json", headers=headers)
+
+def _create_products(db: Session, items: List[ProductCreate]) -> List[int]:
+    """Вставить товары и их приходы (INCOMING) без коммита; возвращает id"""
+    db_products = [Product(**item.model_dump()) for item in items]
+    db.add_all(db_products)
+    db.flush()  # Получаем ID
+    product_service.forget_tombstones(db, (db_product.id for db_product in db_products))
+
+    db.execute(insert(StockOperation), [
+        dict(
+            product_id=db_product.id,
+            operation_type=OperationType.INCOMING,
+            quantity_change=item.quantity,
+            old_quantity=0,
+            new_quantity=item.quantity,
+            old_purchase_price=Decimal(0),
+            new_purchase_price=item.purchase_price,
+            old_coefficient=Decimal(1),
+            new_coefficient=item.coefficient,
+            reason="Ручной приход"
+        )
+        for db_product, item in zip(db_products, items)
+    ])
+    return [db_product.id for db_product in db_products]
+
+
+def _update_products(db: Session, updates: list) -> List[int]:
+    """
+    Применить частичные изменения [(id, ProductUpdate)] без коммита.
+    Старые значения для истории читаются одним запросом; если какого-то
+    товара нет — 404 и ничего не меняется.
+    """
+    ids = [product_id for product_id, _ in updates]
+    products = {
+        p.id: p for p in db.query(Product).filter(Product.id.in_(set(ids))).with_for_update()
+    }
+    missing = [product_id for product_id in ids if product_id not in products]
+    if missing:
+        raise HTTPException(404, f"Товар не найден: id={missing[0]}")
+
+    operations = []
+    for product_id, update in updates:
+        db_product = products[product_id]
+        old_qty = db_product.quantity
+        old_price = db_product.purchase_price
+        old_coeff = db_product.coefficient
+
+        for field, value in update.model_dump(exclude_unset=True).items():
+            if value is not None:
+                setattr(db_product, field, value)
+
+        operations.append(dict(
+            product_id=product_id,
+            operation_type=OperationType.ADJUSTMENT,
+            quantity_change=db_product.quantity - old_qty,
+            old_quantity=old_qty,
+            new_quantity=db_product.quantity,
+            old_purchase_price=old_price,
+            new_purchase_price=db_product.purchase_price,
+            old_coefficient=old_coeff,
+            new_coefficient=db_product.coefficient,
+            reason="Ручная корректировка"
+        ))
+
+    db.flush()
+    db.execute(insert(StockOperation), operations)
+    return ids
+
+
+def _load_products(db: Session, ids: List[int]) -> List[Product]:
+    """Товары в порядке ids одним запросом (после коммита)"""
+    products = {p.id: p for p in db.query(Product).filter(Product.id.in_(set(ids)))}
+    return [products[product_id] for product_id in ids]
+
+
+@router.get("/products/changes", response_model=ProductChanges, summary="Изменения каталога с момента курсора")
+def get_product_changes(
+    since: Optional[str] = Query(None, description="Курсор из next_cursor предыдущего ответа"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """
+    Дельта-синхронизация вместо повторной загрузки **/products/all**.
+
+    Первый запрос без **since** отдаёт весь каталог постранично. Дальше
+    клиент передаёт **next_cursor** и получает только созданные/изменённые
+    товары (**upserted**) и id удалённых (**deleted**). Пока **has_more**,
+    можно сразу запрашивать следующую страницу.
+    """
+    try:
+        upserted, deleted, next_cursor, has_more = product_service.get_product_changes(db, since, limit)
+    except ValueError:
+        raise HTTPException(400, "Некорректный курсор")
+    return ProductChanges(
+        upserted=[ProductResponse.model_validate(p) for p in upserted],
+        deleted=deleted,
+        next_cursor=next_cursor,
+        has_more=has_more
+    )
 
 @router.post("/products", response_model=ProductResponse, summary="Добавить товар")
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
-    db_product = Product(**product.model_dump())
-    db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-
-    op = StockOperation(
-        product_id=db_product.id,
-        operation_type=OperationType.INCOMING,
-        quantity_change=product.quantity,
-        old_quantity=0,
-        new_quantity=product.quantity,
-        old_purchase_price=Decimal(0),
-        new_purchase_price=product.purchase_price,
-        old_coefficient=Decimal(1),
-        new_coefficient=product.coefficient,
-        reason="Ручной приход"
-    )
-    db.add(op)
+    [product_id] = _create_products(db, [product])
     db.commit()
+
+    [db_product] = _load_products(db, [product_id])
+    suggest_index.upsert(db_product.id, db_product.name, db_product.sku)
     return db_product
 
+@router.post("/products/bulk", response_model=list[ProductResponse], summary="Добавить пачку товаров")
+def create_products_bulk(
+    products: List[ProductCreate] = Body(..., min_length=1, max_length=5000),
+    db: Session = Depends(get_db)
+):
+    """Все товары и их приходы записываются одной транзакцией"""
+    ids = _create_products(db, products)
+    db.commit()
+
+    db_products = _load_products(db, ids)
+    suggest_index.upsert_many((p.id, p.name, p.sku) for p in db_products)
+    return db_products
+
 @router.put("/products/{id}", response_model=ProductResponse, summary="Обновить товар")
 def update_product(id: int, update: ProductUpdate, db: Session = Depends(get_db)):
-    db_product = db.query(Product).filter(Product.id == id).first()
-    if not db_product:
-        raise HTTPException(404, "Товар не найден")
-
-    old_qty = db_product.quantity
-    old_price = db_product.purchase_price
-    old_coeff = db_product.coefficient
+    _update_products(db, [(id, update)])
+    db.commit()
 
-    for field, value in update.model_dump(exclude_unset=True).items():
-        if value is not None:
-            setattr(db_product, field, value)
+    [db_product] = _load_products(db, [id])
+    suggest_index.upsert(db_product.id, db_product.name, db_product.sku)
+    return db_product
 
+@router.patch("/products/bulk", response_model=list[ProductResponse], summary="Обновить пачку товаров")
+def update_products_bulk(
+    updates: List[ProductBulkUpdate] = Body(..., min_length=1, max_length=5000),
+    db: Session = Depends(get_db)
+):
+    """
+    Частичные изменения списка товаров одной транзакцией. Если хотя бы
+    одного товара нет, ничего не применяется (404).
+    """
+    ids = _update_products(db, [
+        (update.id, ProductUpdate(**update.model_dump(exclude={"id"}, exclude_unset=True)))
+        for update in updates
+    ])
     db.commit()
-    db.refresh(db_product)
-
-    op = StockOperation(
-        product_id=id,
-        operation_type=OperationType.ADJUSTMENT,
-        quantity_change=db_product.quantity - old_qty,
-        old_quantity=old_qty,
-        new_quantity=db_product.quantity,
-        old_purchase_price=old_price,
-        new_purchase_price=db_product.purchase_price,
-        old_coefficient=old_coeff,
-        new_coefficient=db_product.coefficient,
-        reason="Ручная корректировка"
-    )
-    db.add(op)
-    db.commit()
-    return db_product
+
+    db_products = _load_products(db, ids)
+    suggest_index.upsert_many((p.id, p.name, p.sku) for p in db_products)
+    return db_products
 
 @router.delete("/products/{id}", summary="Удалить товар")
 def delete_product(id: int, db: Session = Depends(get_db)):
@@ -85,49 +222,223 @@ def delete_product(id: int, db: Session = Depends(get_db)):
     if not product:
         raise HTTPException(404, "Товар не найден")
     
-    # Сначала удаляем все связанные записи в stock_operations
-    db.query(StockOperation).filter(StockOperation.product_id == id).delete()
+    # Сначала удаляем все связанные записи в stock_operations. Операций раньше
+    # создания товара не бывает — условие по timestamp отсекает старые партиции
+    operations = db.query(StockOperation).filter(StockOperation.product_id == id)
+    if product.created_at:
+        operations = operations.filter(StockOperation.timestamp >= product.created_at)
+    operations.delete()
+    # и снимки остатков — без истории по ним всё равно нельзя восстановить прошлое
+    db.query(StockSnapshot).filter(StockSnapshot.product_id == id).delete()
     
-    # Затем удаляем сам товар
+    # Затем удаляем сам товар и оставляем отметку для дельта-синхронизации
+    # (merge: от прошлого удаления того же id отметка могла остаться)
     db.delete(product)
+    db.merge(ProductTombstone(product_id=id, deleted_at=func.now()))
     db.commit()
+    suggest_index.remove(id)
     return {"detail": "Товар и его история удалены"}
 
 
+def _parse_history_cursor(cursor: str):
+    """Курсор имеет вид '<timestamp ISO>_<id>' последней записи предыдущей страницы"""
+    try:
+        ts, op_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(op_id)
+    except ValueError:
+        raise HTTPException(400, "Некорректный курсор")
+
+
+def _history_start(days):
+    return datetime.utcnow() - timedelta(days=days) if days else None
+
+
+def _filter_stock_history(query, product_id, operation_type, days):
+    if product_id:
+        query = query.filter(StockOperation.product_id == product_id)
+
+    if operation_type:
+        query = query.filter(StockOperation.operation_type == operation_type)
+
+    if days:
+        query = query.filter(StockOperation.timestamp >= _history_start(days))
+
+    return query
+
+
+def _deleted_products(db: Session, product_id: int = None) -> frozenset:
+    """id удалённых товаров — их операции остались в архиве, но в историю не попадают"""
+    query = db.query(ProductTombstone.product_id)
+    if product_id:
+        query = query.filter(ProductTombstone.product_id == product_id)
+    return frozenset(deleted_id for deleted_id, in query)
+
+
+def _archived_history_items(db: Session, ops: list) -> List[StockOperationResponse]:
+    """Ответы по операциям из архива; названия товаров — одним запросом"""
+    ids = {op["product_id"] for op in ops}
+    names = dict(db.query(Product.id, Product.name).filter(Product.id.in_(ids))) if ids else {}
+    return [
+        StockOperationResponse(**op, product_name=names.get(op["product_id"], "УДАЛЁН"))
+        for op in ops
+    ]
+
+
 @router.get("/stock-history", response_model=List[StockOperationResponse], summary="История операций со складом")
 def get_stock_history(
+    response: Response,
     product_id: Optional[int] = Query(None, description="ID товара для фильтрации"),
     operation_type: Optional[str] = Query(None, enum=["INCOMING", "SALE", "ADJUSTMENT"]),
     days: Optional[int] = Query(None, description="История за последние N дней"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
+    limit: int = Query(500, ge=1, le=5000, description="Размер страницы"),
+    include_archived: bool = Query(False, description="Продолжать в архиве старых партиций"),
     db: Session = Depends(get_db)
 ):
     """
     Получить историю операций со складом с опциональной фильтрацией
-    
+
     - **product_id**: Фильтр по товару
     - **operation_type**: Тип операции (INCOMING, SALE, ADJUSTMENT)
     - **days**: История за последние N дней (если не указано - вся история)
+    - **cursor**: Продолжить с места, где закончилась предыдущая страница
+    - **limit**: Максимум записей на странице
+    - **include_archived**: Когда записи в БД закончатся, читать архивные файлы
+      (медленнее: сжатый архив распаковывается по кускам)
+
+    Записи отдаются от новых к старым. Если есть следующая страница,
+    её курсор возвращается в заголовке **X-Next-Cursor**.
     """
-    query = db.query(StockOperation)
-    
-    if product_id:
-        query = query.filter(StockOperation.product_id == product_id)
-    
-    if operation_type:
-        query = query.filter(StockOperation.operation_type == operation_type)
-    
-    if days:
-        start_date = datetime.utcnow() - timedelta(days=days)
-        query = query.filter(StockOperation.timestamp >= start_date)
-    
-    operations = query.order_by(StockOperation.timestamp.desc()).all()
-    
-    # Добавляем названия товаров
+    result, cursor_key = _history_page(db, product_id, operation_type, days, cursor, limit)
+    if include_archived and len(result) <= limit:
+        deleted = _deleted_products(db, product_id)
+        archived = _read_archive(result, cursor_key, product_id, operation_type, days, limit, deleted)
+        result += _archived_history_items(db, archived)
+    return _trim_history_page(response, result, limit)
+
+
+def _history_page(db: Session, product_id, operation_type, days, cursor, limit):
+    """Страница истории из БД (до limit + 1 записей) и разобранный курсор"""
+    # Название товара подтягиваем LEFT JOIN'ом, а не запросом на каждую строку
+    query = db.query(StockOperation, Product.name).outerjoin(
+        Product, Product.id == StockOperation.product_id
+    )
+    query = _filter_stock_history(query, product_id, operation_type, days)
+
+    # Keyset-пагинация по (timestamp, id): стоимость страницы не зависит от глубины
+    cursor_key = _parse_history_cursor(cursor) if cursor else None
+    if cursor_key:
+        query = query.filter(
+            # Простое условие по timestamp нужно для отсечения партиций:
+            # по сравнению кортежей PostgreSQL партиции не отбрасывает
+            StockOperation.timestamp <= cursor_key[0],
+            tuple_(StockOperation.timestamp, StockOperation.id) < tuple_(*cursor_key),
+        )
+
+    rows = query.order_by(
+        StockOperation.timestamp.desc(), StockOperation.id.desc()
+    ).limit(limit + 1).all()
+
     result = []
-    for op in operations:
-        product = db.query(Product).filter(Product.id == op.product_id).first()
-        response = StockOperationResponse.model_validate(op)
-        response.product_name = product.name if product else "УДАЛЁН"
-        result.append(response)
-    
-    return result
\ No newline at end of file
+    for op, product_name in rows:
+        item = StockOperationResponse.model_validate(op)
+        item.product_name = product_name if product_name is not None else "УДАЛЁН"
+        result.append(item)
+    return result, cursor_key
+
+
+def _read_archive(result, cursor_key, product_id, operation_type, days, limit, deleted) -> list:
+    """Операции архива, дополняющие страницу до limit + 1 (только файлы, без БД)"""
+    # Архивные месяцы старше всего, что осталось в таблице, — продолжаем с них
+    before = (result[-1].timestamp, result[-1].id) if result else cursor_key
+    return list(islice(
+        iter_archived_operations(
+            product_id, operation_type, _history_start(days), before, deleted_products=deleted
+        ),
+        limit + 1 - len(result),
+    ))
+
+
+def _trim_history_page(response: Response, result: list, limit: int) -> list:
+    if len(result) > limit:
+        result = result[:limit]
+        response.headers["X-Next-Cursor"] = f"{result[-1].timestamp.isoformat()}_{result[-1].id}"
+    return result
+
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FIELDS = list(StockOperationResponse.model_fields)
+
+
+def _export_stock_history(fmt, product_id, operation_type, days, include_archived=False):
+    """
+    Генератор выгрузки истории. Строки читаются серверным курсором
+    пачками по EXPORT_CHUNK_SIZE и сразу отдаются клиенту, поэтому
+    память воркера не зависит от размера таблицы.
+    """
+    # Собственная сессия: сессия из Depends закрывается до начала стриминга
+    db = SessionLocal()
+    try:
+        query = db.query(StockOperation, Product.name).outerjoin(
+            Product, Product.id == StockOperation.product_id
+        )
+        query = _filter_stock_history(query, product_id, operation_type, days)
+        query = query.order_by(StockOperation.timestamp, StockOperation.id)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(EXPORT_FIELDS)
+
+        def items():
+            if include_archived:
+                # Архив старше данных в таблице — отдаём его первым
+                archived = iter_archived_operations(
+                    product_id, operation_type, _history_start(days), newest_first=False,
+                    deleted_products=_deleted_products(db, product_id),
+                )
+                while chunk := list(islice(archived, EXPORT_CHUNK_SIZE)):
+                    yield from _archived_history_items(db, chunk)
+            for op, product_name in query.yield_per(EXPORT_CHUNK_SIZE):
+                item = StockOperationResponse.model_validate(op)
+                item.product_name = product_name if product_name is not None else "УДАЛЁН"
+                yield item
+
+        for n, item in enumerate(items(), start=1):
+            if fmt == "csv":
+                row = item.model_dump(mode="json")
+                writer.writerow([row[field] for field in EXPORT_FIELDS])
+            else:
+                buffer.write(item.model_dump_json())
+                buffer.write("\n")
+
+            if n % EXPORT_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+@router.get("/stock-history/export", summary="Выгрузка истории операций (NDJSON/CSV)")
+def export_stock_history(
+    format: str = Query("ndjson", enum=["ndjson", "csv"]),
+    product_id: Optional[int] = Query(None, description="ID товара для фильтрации"),
+    operation_type: Optional[str] = Query(None, enum=["INCOMING", "SALE", "ADJUSTMENT"]),
+    days: Optional[int] = Query(None, description="История за последние N дней"),
+    include_archived: bool = Query(False, description="Включить архив старых партиций"),
+):
+    """
+    Потоковая выгрузка всей истории операций для BI, от старых записей к новым.
+    Фильтры те же, что у **/stock-history**.
+    """
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"stock_history.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        _export_stock_history(format, product_id, operation_type, days, include_archived),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
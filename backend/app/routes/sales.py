@@ -1,35 +1,123 @@
 # app/routes/sales.py
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload
 from decimal import Decimal
 from typing import List, Optional
-from app.database import get_db
+from app.core.config import SALES_BASELINE_READ_MODIFY_WRITE
+from app.database import begin_write, get_db
 from app.models.sale import Sale, SaleItem, PaymentStatus
 from app.models.product import Product
 from app.models.stock_operation import StockOperation, OperationType
 from app.schemas.sale import (
+    BatchMode,
+    SaleBatchCreate,
+    SaleBatchResponse,
+    SaleBatchResult,
     SaleCreate,
     SaleStatusUpdate,
     SaleItemResponse,
     SaleResponse
 )
+from app.services import metrics
+from app.services.sales_rollups import apply_sales
 
 router = APIRouter()
 
 
-@router.post("/sales", response_model=SaleResponse, summary="Создать продажу")
-def create_sale(sale: SaleCreate, db: Session = Depends(get_db)):
-    total_sale = Decimal(0)
-    total_cost = Decimal(0)
-    sale_items_to_create = []
+def _sales_query(db: Session):
+    """Продажи с жадной загрузкой позиций и товаров (без N+1)"""
+    return db.query(Sale).options(
+        joinedload(Sale.items).joinedload(SaleItem.product)
+    )
+
+
+def _sale_to_response(sale: Sale) -> SaleResponse:
+    items_response = [
+        SaleItemResponse(
+            product_id=si.product_id,
+            product_name=si.product.name if si.product else "УДАЛЁН",
+            product_sku=si.product.sku if si.product and si.product.sku else None,
+            quantity=si.quantity,
+            sold_price_per_unit=si.sold_price_per_unit,
+            coefficient=si.coefficient
+        )
+        for si in sale.items
+    ]
+    return SaleResponse(
+        id=sale.id,
+        client_name=sale.client_name,
+        total_sale=sale.total_sale,
+        total_cost=sale.total_cost,
+        margin=sale.margin,
+        payment_status=sale.payment_status,
+        items=items_response
+    )
+
+
+def _lock_products(db: Session, product_ids) -> dict:
+    """
+    Загрузить товары одним SELECT ... FOR UPDATE.
 
+    Строки блокируются в порядке id, поэтому параллельные продажи с
+    пересекающимися товарами не взаимоблокируются, а ждут друг друга —
+    и проверка остатка не может устареть до записи списания. В SQLite
+    вместо блокировки строк транзакция начинается с BEGIN IMMEDIATE.
+    """
+    begin_write(db)
+    products = (
+        db.query(Product)
+        .filter(Product.id.in_(sorted(set(product_ids))))
+        .order_by(Product.id)
+        .with_for_update()
+        .all()
+    )
+    return {p.id: p for p in products}
+
+
+def _read_products_unlocked(db: Session, product_ids) -> dict:
+    """
+    Старая схема (до блокировки строк): SELECT на каждую позицию без
+    блокировки, остаток пересчитывается в Python и записывается обратно.
+    Параллельные продажи перезаписывают друг друга — нужна только как
+    база для сравнения в stress_sales.py --baseline.
+    """
+    products = {}
+    for product_id in product_ids:
+        product = db.query(Product).filter(Product.id == product_id).first()
+        if product:
+            products[product_id] = product
+    return products
+
+
+def _check_stock(sale: SaleCreate, products: dict):
+    """Проверка наличия; несколько строк с одним товаром суммируются"""
+    requested = {}
     for item in sale.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
+        if item.product_id not in products:
             raise HTTPException(404, f"Товар с id={item.product_id} не найден")
-        if product.quantity < item.quantity:
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+
+    for product_id, quantity in requested.items():
+        product = products[product_id]
+        if product.quantity < quantity:
             raise HTTPException(400, f"Недостаточно товара '{product.name}' на складе")
 
+
+def _build_sale(sale: SaleCreate, products: dict):
+    """
+    Списать товары (уже заблокированные и проверенные) и собрать продажу.
+    Возвращает (Sale, позиции, записи истории); позиции и записи — словари
+    для пачечной вставки, sale_id в позиции проставляет _save_sales.
+    """
+    total_sale = Decimal(0)
+    total_cost = Decimal(0)
+    sale_items = []
+    operations = []
+
+    for item in sale.items:
+        product = products[item.product_id]
+
         # Расчёт стоимости с учётом коэффициента
         item_cost = product.purchase_price * item.quantity
         final_price_per_unit = item.sold_price_per_unit * item.coefficient
@@ -38,31 +126,28 @@ def create_sale(sale: SaleCreate, db: Session = Depends(get_db)):
         total_sale += item_revenue
 
         # Списываем товар
-        product.quantity -= item.quantity
-        db.add(product)
+        old_quantity = product.quantity
+        product.quantity = old_quantity - item.quantity
 
-        # Создаём SaleItem с коэффициентом
-        sale_item = SaleItem(
+        # Позиция продажи с коэффициентом
+        sale_items.append(dict(
             product_id=item.product_id,
             quantity=item.quantity,
             sold_price_per_unit=item.sold_price_per_unit,
             coefficient=item.coefficient,
             purchase_price_at_sale=product.purchase_price
-        )
-        sale_items_to_create.append(sale_item)
+        ))
 
         # Логируем списание
-        op = StockOperation(
+        operations.append(dict(
             product_id=item.product_id,
             operation_type=OperationType.SALE,
             quantity_change=-item.quantity,
-            old_quantity=product.quantity + item.quantity,
+            old_quantity=old_quantity,
             new_quantity=product.quantity,
             sold_price_per_unit=item.sold_price_per_unit
-        )
-        db.add(op)
+        ))
 
-    # Сохраняем продажу
     new_sale = Sale(
         client_name=sale.client_name,
         total_sale=total_sale,
@@ -70,40 +155,112 @@ def create_sale(sale: SaleCreate, db: Session = Depends(get_db)):
         margin=total_sale - total_cost,
         payment_status=PaymentStatus.UNPAID
     )
-    db.add(new_sale)
-    db.flush()  # Получаем ID
+    return new_sale, sale_items, operations
+
+
+def _sale_rollup_key(sale: Sale):
+    return sale.client_name, sale.created_at, sale.total_sale, sale.total_cost
+
+
+def _save_sales(db: Session, built: list) -> list:
+    """
+    Записать собранные продажи: INSERT продаж, затем по одному пачечному
+    INSERT для всех позиций и всех записей истории. Число запросов не
+    зависит от количества позиций. Возвращает id продаж.
+    """
+    db.add_all([new_sale for new_sale, _, _ in built])
+    db.flush()  # Получаем ID продаж и пишем списания остатков
+
+    sale_ids = []
+    all_items = []
+    all_operations = []
+    for new_sale, sale_items, operations in built:
+        sale_ids.append(new_sale.id)
+        for si in sale_items:
+            si["sale_id"] = new_sale.id
+        all_items.extend(sale_items)
+        all_operations.extend(operations)
 
-    # Связываем SaleItem с Sale
-    for si in sale_items_to_create:
-        si.sale_id = new_sale.id
-        db.add(si)
+    if all_items:
+        db.execute(insert(SaleItem), all_items)
+    if all_operations:
+        db.execute(insert(StockOperation), all_operations)
 
+    # Агрегаты для /analytics/sales — в той же транзакции
+    apply_sales(db, [
+        (_sale_rollup_key(new_sale), [
+            (si["product_id"], si["quantity"], si["sold_price_per_unit"],
+             si["coefficient"], si["purchase_price_at_sale"])
+            for si in sale_items
+        ])
+        for new_sale, sale_items, _ in built
+    ])
+    metrics.record(db, metrics.SALES_CREATED, len(built))
+    metrics.record(db, metrics.ITEMS_SOLD, sum(si["quantity"] for si in all_items))
+    return sale_ids
+
+
+@router.post("/sales", response_model=SaleResponse, summary="Создать продажу")
+def create_sale(sale: SaleCreate, db: Session = Depends(get_db)):
+    product_ids = [item.product_id for item in sale.items]
+    if SALES_BASELINE_READ_MODIFY_WRITE:
+        products = _read_products_unlocked(db, product_ids)
+    else:
+        # Все товары продажи — одним запросом с блокировкой строк до коммита
+        products = _lock_products(db, product_ids)
+    _check_stock(sale, products)
+
+    [sale_id] = _save_sales(db, [_build_sale(sale, products)])
     db.commit()
-    db.refresh(new_sale)
-
-    # Формируем ответ с названиями и SKU
-    items_response = []
-    for si in sale_items_to_create:
-        product = db.query(Product).filter(Product.id == si.product_id).first()
-        items_response.append(
-            SaleItemResponse(
-                product_id=si.product_id,
-                product_name=product.name if product else "УДАЛЁН",
-                product_sku=product.sku if product and product.sku else None,
-                quantity=si.quantity,
-                sold_price_per_unit=si.sold_price_per_unit,
-                coefficient=si.coefficient
-            )
-        )
 
-    return SaleResponse(
-        id=new_sale.id,
-        client_name=new_sale.client_name,
-        total_sale=new_sale.total_sale,
-        total_cost=new_sale.total_cost,
-        margin=new_sale.margin,
-        payment_status=new_sale.payment_status,
-        items=items_response
+    # Перечитываем продажу вместе с позициями и товарами одним запросом
+    new_sale = _sales_query(db).filter(Sale.id == sale_id).one()
+    return _sale_to_response(new_sale)
+
+
+@router.post("/sales/batch", response_model=SaleBatchResponse, summary="Создать пачку продаж")
+def create_sales_batch(batch: SaleBatchCreate, db: Session = Depends(get_db)):
+    """
+    Массовый ввод продаж одной транзакцией.
+
+    Все товары пачки загружаются и блокируются одним запросом, остатки
+    проверяются последовательно (с учётом уже принятых продаж пачки),
+    а продажи, позиции и записи истории вставляются пачками.
+
+    - **all_or_nothing**: первая ошибка отменяет всю пачку (ответ 400/404)
+    - **best_effort**: ошибочные продажи пропускаются, остальные сохраняются
+    """
+    products = _lock_products(
+        db, [item.product_id for sale in batch.sales for item in sale.items]
+    )
+
+    results = []
+    built = []
+    for index, sale in enumerate(batch.sales):
+        try:
+            _check_stock(sale, products)
+        except HTTPException as e:
+            if batch.mode == BatchMode.ALL_OR_NOTHING:
+                db.rollback()
+                raise HTTPException(e.status_code, f"Продажа #{index}: {e.detail}")
+            results.append(SaleBatchResult(index=index, status="failed", detail=e.detail))
+            continue
+        built.append(_build_sale(sale, products))
+        results.append(SaleBatchResult(index=index, status="created"))
+
+    sale_ids = _save_sales(db, built) if built else []
+    db.commit()
+
+    # Ответы по всем созданным продажам — одним запросом
+    saved = {s.id: s for s in _sales_query(db).filter(Sale.id.in_(sale_ids)).all()}
+    created = [r for r in results if r.status == "created"]
+    for result, sale_id in zip(created, sale_ids):
+        result.sale = _sale_to_response(saved[sale_id])
+
+    return SaleBatchResponse(
+        created=len(created),
+        failed=len(results) - len(created),
+        results=results
     )
 
 
@@ -112,39 +269,12 @@ def get_all_sales(
     status: Optional[str] = Query(None, enum=["PAID", "UNPAID", "PARTIAL"]),
     db: Session = Depends(get_db)
 ):
-    query = db.query(Sale)
+    # Один запрос с JOIN по позициям и товарам — число запросов
+    # не зависит от количества продаж и позиций в них
+    query = _sales_query(db)
     if status:
         query = query.filter(Sale.payment_status == status)
-    sales = query.all()
-
-    sales_response = []
-    for sale in sales:
-        items = db.query(SaleItem).filter(SaleItem.sale_id == sale.id).all()
-        items_response = []
-        for si in items:
-            product = db.query(Product).filter(Product.id == si.product_id).first()
-            items_response.append(
-                SaleItemResponse(
-                    product_id=si.product_id,
-                    product_name=product.name if product else "УДАЛЁН",
-                    product_sku=product.sku if product and product.sku else None,
-                    quantity=si.quantity,
-                    sold_price_per_unit=si.sold_price_per_unit,
-                    coefficient=si.coefficient
-                )
-            )
-        sales_response.append(
-            SaleResponse(
-                id=sale.id,
-                client_name=sale.client_name,
-                total_sale=sale.total_sale,
-                total_cost=sale.total_cost,
-                margin=sale.margin,
-                payment_status=sale.payment_status,
-                items=items_response
-            )
-        )
-    return sales_response
+    return [_sale_to_response(sale) for sale in query.order_by(Sale.id).all()]
 
 
 @router.put("/sales/{id}/status", summary="Изменить статус оплаты")
@@ -166,21 +296,30 @@ def delete_sale(id: int, db: Session = Depends(get_db)):
         raise HTTPException(404, "Продажа не найдена")
 
     items = db.query(SaleItem).filter(SaleItem.sale_id == id).all()
+    # Товары — одним SELECT ... FOR UPDATE, записи возврата — одним INSERT
+    products = _lock_products(db, [item.product_id for item in items])
+    operations = []
     for item in items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
+        product = products.get(item.product_id)
         if product:
-            product.quantity += item.quantity
-            db.add(product)
+            old_quantity = product.quantity
+            product.quantity = old_quantity + item.quantity
             # Лог возврата
-            op = StockOperation(
+            operations.append(dict(
                 product_id=item.product_id,
                 operation_type=OperationType.ADJUSTMENT,
                 quantity_change=item.quantity,
-                old_quantity=product.quantity - item.quantity,
+                old_quantity=old_quantity,
                 new_quantity=product.quantity,
                 reason=f"Отмена продажи #{id}"
-            )
-            db.add(op)
+            ))
+    if operations:
+        db.execute(insert(StockOperation), operations)
+
+    apply_sales(db, [(_sale_rollup_key(sale), [
+        (i.product_id, i.quantity, i.sold_price_per_unit, i.coefficient, i.purchase_price_at_sale)
+        for i in items
+    ])], sign=-1)
 
     db.query(SaleItem).filter(SaleItem.sale_id == id).delete()
     db.delete(sale)
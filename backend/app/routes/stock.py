@@ -0,0 +1,113 @@
+# app/routes/stock.py
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models.product import Product
+from app.schemas.stock import StockAsOfItem, StockAsOfResponse, StockCheckpointResponse
+from app.services.stock_checkpoints import create_checkpoint, stock_as_of
+from app.services.stock_events import broker
+
+router = APIRouter()
+
+KEEPALIVE_SEC = 15  # Комментарий-пинг, чтобы прокси не закрывали тихое соединение
+
+
+def _sse(ev: dict) -> str:
+    if ev is broker.RESET:
+        return "event: reset\ndata: {}\n\n"
+    return f"id: {ev['id']}\nevent: stock\ndata: {json.dumps(ev['changes'], ensure_ascii=False)}\n\n"
+
+
+async def _stream_stock_events(request: Request, last_event_id: Optional[str]):
+    queue, replay = broker.subscribe(last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        for ev in replay:
+            yield _sse(ev)
+        while not await request.is_disconnected():
+            if queue.overflowed and queue.empty():
+                # Клиент не успевал читать — закрываем поток, переподключение догонит по backlog
+                break
+            try:
+                ev = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield _sse(ev)
+    finally:
+        broker.unsubscribe(queue)
+
+
+@router.get("/stock/stream", summary="Лента изменений остатков и цен (SSE)")
+async def stream_stock_changes(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    since: Optional[str] = Query(None, description="ID последнего полученного события"),
+):
+    """
+    Server-Sent Events с изменениями количества и цен товаров сразу после
+    коммита: продажи, удаление продаж, правка товаров и импорт Excel.
+
+    Событие **stock** — список `{product_id, quantity, purchase_price, coefficient}`
+    (у удалённого товара — `{product_id, deleted: true}`). При переподключении
+    EventSource сам присылает Last-Event-ID, и пропущенные события досылаются
+    из буфера процесса. Если событие уже вне буфера, приходит **reset** —
+    клиенту нужно перечитать остатки (например, через **/products/changes**).
+    """
+    return StreamingResponse(
+        _stream_stock_events(request, last_event_id or since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stock/as-of", response_model=StockAsOfResponse, summary="Остатки на момент времени")
+def get_stock_as_of(
+    at: datetime = Query(..., description="Момент времени (ISO 8601, без зоны — UTC)"),
+    product_id: Optional[int] = Query(None, description="ID товара; без него — весь склад"),
+    db: Session = Depends(get_db),
+):
+    """
+    Количество, закупочная цена и коэффициент на момент **at** по журналу
+    операций: от ближайшей контрольной точки применяются только операции
+    после неё. Товары, которых на тот момент ещё не было, не попадают в ответ.
+    """
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    products = db.query(Product.id, Product.name, Product.sku)
+    if product_id is not None:
+        products = products.filter(Product.id == product_id)
+    names = {pid: (name, sku) for pid, name, sku in products}
+    if product_id is not None and not names:
+        raise HTTPException(404, "Товар не найден")
+
+    checkpoint, state = stock_as_of(db, at, product_id)
+    items = [
+        StockAsOfItem(
+            product_id=pid, name=names[pid][0], sku=names[pid][1],
+            quantity=qty, purchase_price=price, coefficient=coeff,
+        )
+        for pid, (qty, price, coeff) in sorted(state.items())
+        if pid in names
+    ]
+    return StockAsOfResponse(
+        at=at,
+        checkpoint_taken_at=checkpoint.taken_at if checkpoint else None,
+        items=items,
+    )
+
+
+@router.post("/stock/checkpoints", response_model=StockCheckpointResponse,
+             summary="Снять контрольную точку остатков")
+def create_stock_checkpoint(db: Session = Depends(get_db)):
+    """
+    Обычно точки снимаются в фоне раз в STOCK_CHECKPOINT_INTERVAL_SEC;
+    ручной вызов нужен, например, после большого импорта.
+    """
+    return create_checkpoint(db)
@@ -0,0 +1,33 @@
+# app/schemas/analytics.py
+from pydantic import BaseModel, computed_field
+from typing import Optional
+from decimal import Decimal
+from datetime import date
+
+class SalesRollupBase(BaseModel):
+    period_start: date
+    revenue: Decimal
+    cost: Decimal
+    sales_count: int
+
+    @computed_field
+    @property
+    def margin(self) -> Decimal:
+        return self.revenue - self.cost
+
+class SalesTotalsResponse(SalesRollupBase):
+    pass
+
+class SalesByProductResponse(SalesRollupBase):
+    product_id: int
+    product_name: Optional[str] = None  # Добавляется в API
+    quantity: int
+
+    class Config:
+        from_attributes = True
+
+class SalesByClientResponse(SalesRollupBase):
+    client_name: str
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,40 @@
+# app/schemas/diagnostics.py
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+class PoolStatsResponse(BaseModel):
+    name: str                           # sync или async (DB_ASYNC)
+    pool_class: str
+    pool_size: Optional[int] = None     # Для NullPool (PgBouncer) не задаётся
+    max_overflow: Optional[int] = None
+    checked_out: int                    # Соединений выдано прямо сейчас
+    overflow: Optional[int] = None      # Из них временных сверх pool_size
+    checkouts: int
+    connects: int
+    invalidated: int
+    timeouts: int                       # Не дождались соединения за DB_POOL_TIMEOUT
+    wait_avg_ms: float
+    wait_p95_ms: float                  # По последним выдачам
+    wait_max_ms: float
+
+class SlowStatement(BaseModel):
+    sql: str
+    parameters: str
+    duration_ms: float
+    plan: Optional[str] = None          # EXPLAIN (ANALYZE, BUFFERS — для читающих SELECT); строится в фоне
+    error: Optional[str] = None
+
+class SlowRequestSummary(BaseModel):
+    id: int
+    captured_at: datetime
+    method: str
+    path: str
+    route: str
+    status: int
+    duration_ms: float
+    db_ms: float
+    queries: int
+
+class SlowRequestResponse(SlowRequestSummary):
+    statements: List[SlowStatement]
@@ -0,0 +1,32 @@
+# app/schemas/import_job.py
+from pydantic import BaseModel, computed_field
+from typing import List, Optional
+from datetime import datetime
+
+class ImportJobResponse(BaseModel):
+    id: int
+    filename: str
+    status: str
+    rows_total: Optional[int]
+    rows_processed: int
+    rows_failed: int
+    products_created: int
+    products_updated: int
+    errors: List[str]
+    detail: Optional[str]
+    created_at: Optional[datetime]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    @computed_field
+    @property
+    def eta_sec(self) -> Optional[float]:
+        """Оценка оставшегося времени по текущей скорости обработки"""
+        if self.status != "RUNNING" or not self.started_at or not self.rows_total or not self.rows_processed:
+            return None
+        elapsed = (datetime.utcnow() - self.started_at).total_seconds()
+        remaining = max(self.rows_total - self.rows_processed, 0)
+        return round(elapsed / self.rows_processed * remaining, 1)
+
+    class Config:
+        from_attributes = True
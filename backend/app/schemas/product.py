@@ -1,5 +1,5 @@
 from pydantic import BaseModel, computed_field
-from typing import Optional
+from typing import List, Optional
 from decimal import Decimal
 
 class ProductBase(BaseModel):
@@ -19,6 +19,9 @@ class ProductUpdate(BaseModel):
     coefficient: Optional[Decimal] = None
     quantity: Optional[int] = None
 
+class ProductBulkUpdate(ProductUpdate):
+    id: int
+
 class ProductResponse(ProductBase):
     id: int
 
@@ -29,4 +32,15 @@ class ProductResponse(ProductBase):
         return self.purchase_price * self.coefficient
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ProductSuggestion(BaseModel):
+    id: int
+    name: str
+    sku: Optional[str] = None
+
+class ProductChanges(BaseModel):
+    upserted: List[ProductResponse]  # Созданные или изменённые товары
+    deleted: List[int]  # id удалённых товаров
+    next_cursor: str  # Передать в since при следующем запросе
+    has_more: bool  # Есть ещё изменения — можно сразу запросить следующую страницу
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, computed_field
+from pydantic import BaseModel, Field, computed_field
 from typing import List, Optional
 from decimal import Decimal
+from enum import Enum
 
 class SaleItemCreate(BaseModel):
     product_id: int
@@ -42,4 +43,23 @@ class SaleResponse(BaseModel):
     items: List[SaleItemResponse]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BatchMode(str, Enum):
+    ALL_OR_NOTHING = "all_or_nothing"  # Любая ошибка отменяет всю пачку
+    BEST_EFFORT = "best_effort"        # Ошибочные продажи пропускаются
+
+class SaleBatchCreate(BaseModel):
+    sales: List[SaleCreate] = Field(..., min_length=1, max_length=1000)
+    mode: BatchMode = BatchMode.ALL_OR_NOTHING
+
+class SaleBatchResult(BaseModel):
+    index: int  # Позиция продажи во входном списке
+    status: str  # created / failed
+    sale: Optional[SaleResponse] = None
+    detail: Optional[str] = None
+
+class SaleBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[SaleBatchResult]
@@ -0,0 +1,27 @@
+# app/schemas/stock.py
+from pydantic import BaseModel
+from typing import List, Optional
+from decimal import Decimal
+from datetime import datetime
+
+class StockAsOfItem(BaseModel):
+    product_id: int
+    name: str
+    sku: Optional[str] = None
+    quantity: int
+    purchase_price: Optional[Decimal]
+    coefficient: Optional[Decimal]
+
+class StockAsOfResponse(BaseModel):
+    at: datetime
+    checkpoint_taken_at: Optional[datetime]  # Точка, от которой проигрывался журнал
+    items: List[StockAsOfItem]
+
+class StockCheckpointResponse(BaseModel):
+    id: int
+    taken_at: datetime
+    products_count: int
+    created_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
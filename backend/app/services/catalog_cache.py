@@ -0,0 +1,117 @@
+# app/services/catalog_cache.py
+"""
+Кэш сериализованного каталога товаров (/products/all).
+
+Каталог версионируется строкой в таблице catalog_version. Сессии
+отмечают, что изменили products/sales/sale_items (через ORM или
+пачечными INSERT/UPDATE/DELETE), и поднимают версию последним запросом
+своей же транзакции, перед коммитом.
+Версия живёт в БД, поэтому все процессы uvicorn видят одно и то же
+значение: кэш процесса сбрасывается, как только версия меняется, а
+клиенту с актуальным ETag отдаётся 304 без запроса каталога и без
+сериализации.
+
+Данные и версия коммитятся вместе: нет окна, в котором изменения уже
+видны, а версия ещё старая (и не теряется подъём при падении процесса
+между ними). Отдельного соединения не нужно — в асинхронном режиме
+UPDATE идёт через асинхронный движок и не блокирует цикл событий.
+Строка catalog_version блокируется только на время коммита.
+"""
+import threading
+from pydantic import TypeAdapter
+from sqlalchemy import Connection, event, update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, engine
+from app.models.catalog_version import CatalogVersion
+from app.models.product import Product
+from app.schemas.product import ProductResponse
+
+CATALOG_TABLES = {"products", "sales", "sale_items"}
+_DIRTY_KEY = "catalog_dirty"
+VERSION_KEY = "catalog_version"  # Версия после коммита сессии, если она её подняла
+
+_catalog_adapter = TypeAdapter(list[ProductResponse])
+
+
+def get_version(db: Session) -> int:
+    return db.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar() or 0
+
+
+_bump_stmt = (
+    update(CatalogVersion.__table__)
+    .where(CatalogVersion.__table__.c.id == 1)
+    .values(version=CatalogVersion.__table__.c.version + 1)
+)
+
+
+def bump_version(conn: Connection = None):
+    """
+    Поднять версию для скриптов, пишущих мимо сессий: в транзакции
+    соединения conn, а без него — отдельной транзакцией
+    """
+    if conn is not None:
+        conn.execute(_bump_stmt)
+        return
+    with engine.begin() as conn:
+        conn.execute(_bump_stmt)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flushed(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if getattr(obj, "__tablename__", None) in CATALOG_TABLES:
+            session.info[_DIRTY_KEY] = True
+            return
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_bulk(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if getattr(table, "name", None) in CATALOG_TABLES:
+            orm_execute_state.session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _bump_before_commit(session):
+    # Коммит сбросит отложенные изменения уже после этого обработчика,
+    # поэтому флашим сами: отметка ставится в after_flush
+    session.flush()
+    if session.info.pop(_DIRTY_KEY, False):
+        session.info[VERSION_KEY] = session.execute(
+            _bump_stmt.returning(CatalogVersion.__table__.c.version)
+        ).scalar()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _reset_after_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+class CatalogCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._body = None
+
+    def get(self, db: Session, version: int) -> bytes:
+        """JSON каталога для версии version (из кэша или собранный заново)"""
+        with self._lock:
+            if self._version == version:
+                return self._body
+
+        body = _catalog_adapter.dump_json(
+            [ProductResponse.model_validate(p) for p in db.query(Product).order_by(Product.id)]
+        )
+        with self._lock:
+            # Более новую версию, собранную другим потоком, не затираем
+            if self._version is None or version >= self._version:
+                self._version, self._body = version, body
+        return body
+
+
+catalog_cache = CatalogCache()
+
+
+def etag_for(version: int) -> str:
+    return f'"catalog-{version}"'
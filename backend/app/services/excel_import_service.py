@@ -1,9 +1,18 @@
 # app/services/excel_import_service.py
 import io
 import re
-from openpyxl import load_workbook
+from decimal import Decimal
+from itertools import islice
+from sqlalchemy import insert, update, bindparam
 from sqlalchemy.orm import Session
 from app.models.product import Product
+from app.models.stock_operation import StockOperation, OperationType
+from app.services.excel_reader import StreamingSheetReader
+from app.services import metrics, product_service, stock_events
+from app.services.product_suggest import suggest_index
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_REASON = "Импорт из Excel"
 
 def parse_price_and_coeff(cell_value, raw_value):
     if isinstance(raw_value, str) and raw_value.startswith('='):
@@ -12,48 +21,186 @@ def parse_price_and_coeff(cell_value, raw_value):
             return float(match.group(1)), float(match.group(2))
     return float(cell_value), 1.0
 
-def import_warehouse_from_excel(db: Session, file_bytes: bytes):
+def import_warehouse_from_excel(db: Session, source):
+    """source — путь к файлу, файловый объект или содержимое файла (bytes)"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
     try:
-        wb_raw = load_workbook(io.BytesIO(file_bytes), data_only=False)
-        wb_vals = load_workbook(io.BytesIO(file_bytes), data_only=True)
-        ws_raw = wb_raw["Склад"]
-        ws_vals = wb_vals["Склад"]
+        reader = StreamingSheetReader(source, "Склад")
     except KeyError:
         raise ValueError("В файле нет листа 'Склад'")
     except Exception as e:
         raise ValueError(f"Ошибка чтения Excel: {e}")
 
     created = 0
-    for (row_raw, row_vals) in zip(ws_raw.iter_rows(min_row=2), ws_vals.iter_rows(min_row=2)):
-        try:
-            name_raw = row_raw[1]
-            qty_raw = row_vals[2]
-            price_val = row_vals[3]
-            price_raw = row_raw[3]
-
-            if not name_raw.value or qty_raw.value is None or price_val.value is None:
+    # Значение и формула ячейки читаются за один проход по листу
+    with reader:
+        for _, row in reader.iter_rows(min_row=2, max_col=4):
+            try:
+                name_cell = row[1]
+                qty_cell = row[2]
+                price_cell = row[3]
+
+                if not name_cell.value or qty_cell.value is None or price_cell.value is None:
+                    continue
+
+                name = str(name_cell.value).strip()
+                qty = int(qty_cell.value)
+                purchase_price, coefficient = parse_price_and_coeff(price_cell.value, price_cell.formula)
+
+                existing = db.query(Product).filter(Product.name == name).first()
+                if existing:
+                    existing.quantity += qty
+                    db.add(existing)
+                else:
+                    product = Product(
+                        name=name,
+                        purchase_price=purchase_price,
+                        coefficient=coefficient,
+                        quantity=qty
+                    )
+                    db.add(product)
+                    created += 1
+            except Exception as e:
+                print(f"Ошибка при импорте строки: {e}")
                 continue
 
-            name = str(name_raw.value).strip()
-            qty = int(qty_raw.value)
-            purchase_price, coefficient = parse_price_and_coeff(price_val.value, price_raw.value)
+    db.commit()
+    return {"products_created": created}
+
+
+def bulk_import_warehouse_rows(db: Session, rows, batch_size: int = IMPORT_BATCH_SIZE, on_batch=None):
+    """
+    Пакетный импорт строк склада.
+
+    rows — итерируемое из кортежей (name, sku, qty, purchase_price, coefficient).
+    Товары сопоставляются по (name, sku) через индекс в памяти, который
+    загружается одним запросом. Новые товары вставляются пачками, остатки
+    существующих увеличиваются пачечным UPDATE, а для каждой строки пишется
+    операция INCOMING. Всё выполняется в одной транзакции.
 
-            existing = db.query(Product).filter(Product.name == name).first()
-            if existing:
-                existing.quantity += qty
-                db.add(existing)
+    on_batch(stats) вызывается после каждой пачки в той же сессии — фоновые
+    задачи используют его, чтобы фиксировать прогресс (и коммитить пачку).
+    """
+    # (name, sku) -> [id, quantity, purchase_price, coefficient]
+    index = {
+        (name, sku): [pid, qty, price, coeff]
+        for pid, name, sku, qty, price, coeff in db.query(
+            Product.id, Product.name, Product.sku, Product.quantity,
+            Product.purchase_price, Product.coefficient
+        )
+    }
+
+    products_table = Product.__table__
+    increment_stmt = (
+        update(products_table)
+        .where(products_table.c.id == bindparam("b_id"))
+        .values(quantity=products_table.c.quantity + bindparam("b_delta"))
+    )
+
+    stats = {"rows_processed": 0, "products_created": 0, "products_updated": 0}
+    updated_ids = set()
+    uncommitted = []  # Новые товары, которые попадут в индекс подсказок после коммита
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+
+        new_products = {}   # (name, sku) -> параметры INSERT
+        new_incoming = []   # (name, sku, qty) для операций по новым товарам
+        increments = {}     # id -> суммарный приход
+        operations = []
+
+        for name, sku, qty, purchase_price, coefficient in batch:
+            key = (name, sku)
+            known = index.get(key)
+            if known is not None:
+                pid, old_qty, price, coeff = known
+                known[1] = old_qty + qty
+                increments[pid] = increments.get(pid, 0) + qty
+                operations.append({
+                    "product_id": pid,
+                    "operation_type": OperationType.INCOMING,
+                    "quantity_change": qty,
+                    "old_quantity": old_qty,
+                    "new_quantity": old_qty + qty,
+                    "old_purchase_price": price,
+                    "new_purchase_price": price,
+                    "old_coefficient": coeff,
+                    "new_coefficient": coeff,
+                    "reason": IMPORT_REASON,
+                })
+            elif key in new_products:
+                # Повтор строки внутри одной пачки — копим количество
+                new_products[key]["quantity"] += qty
+                new_incoming.append((key, qty))
             else:
-                product = Product(
-                    name=name,
-                    purchase_price=purchase_price,
-                    coefficient=coefficient,
-                    quantity=qty
-                )
-                db.add(product)
-                created += 1
-        except Exception as e:
-            print(f"Ошибка при импорте строки: {e}")
-            continue
+                new_products[key] = {
+                    "name": name,
+                    "sku": sku,
+                    "purchase_price": purchase_price,
+                    "coefficient": coefficient,
+                    "quantity": qty,
+                }
+                new_incoming.append((key, qty))
+
+        if new_products:
+            created = db.execute(
+                insert(products_table).returning(
+                    products_table.c.id, products_table.c.name, products_table.c.sku
+                ),
+                list(new_products.values()),
+            )
+            created = created.all()
+            for pid, name, sku in created:
+                uncommitted.append((pid, name, sku))
+                params = new_products[(name, sku)]
+                index[(name, sku)] = [pid, 0, params["purchase_price"], params["coefficient"]]
+            product_service.forget_tombstones(db, (pid for pid, _, _ in created))
+            stats["products_created"] += len(new_products)
+
+            for key, qty in new_incoming:
+                known = index[key]
+                pid, old_qty, price, coeff = known
+                known[1] = old_qty + qty
+                operations.append({
+                    "product_id": pid,
+                    "operation_type": OperationType.INCOMING,
+                    "quantity_change": qty,
+                    "old_quantity": old_qty,
+                    "new_quantity": old_qty + qty,
+                    "old_purchase_price": Decimal(0) if old_qty == 0 else price,
+                    "new_purchase_price": price,
+                    "old_coefficient": Decimal(1) if old_qty == 0 else coeff,
+                    "new_coefficient": coeff,
+                    "reason": IMPORT_REASON,
+                })
+
+        if increments:
+            db.execute(
+                increment_stmt,
+                [{"b_id": pid, "b_delta": delta} for pid, delta in increments.items()],
+            )
+            updated_ids.update(increments)
+
+        if operations:
+            db.execute(insert(StockOperation), operations)
+            # Пачечные INSERT/UPDATE не видны ORM-хукам — передаём итоговые остатки явно
+            stock_events.record(db, (
+                (op["product_id"], op["new_quantity"], op["new_purchase_price"], op["new_coefficient"])
+                for op in operations
+            ))
+
+        stats["rows_processed"] += len(batch)
+        metrics.record(db, metrics.IMPORT_ROWS.labels("processed"), len(batch))
+        stats["products_updated"] = len(updated_ids)
+        if on_batch:
+            on_batch(stats)
+            suggest_index.upsert_many(uncommitted)
+            uncommitted.clear()
 
     db.commit()
-    return {"products_created": created}
\ No newline at end of file
+    suggest_index.upsert_many(uncommitted)
+    return stats
@@ -0,0 +1,91 @@
+# app/services/excel_reader.py
+"""
+Потоковое чтение больших Excel-файлов.
+
+Файл открывается openpyxl в режиме read_only, лист разбирается построчно
+(iterparse), поэтому пиковая память не зависит от количества строк.
+Для каждой ячейки за один проход читаются и закэшированное значение,
+и текст формулы — раньше для этого книгу приходилось загружать дважды
+(data_only=True и data_only=False).
+"""
+import shutil
+import tempfile
+from collections import namedtuple
+from openpyxl import load_workbook
+from openpyxl.worksheet._reader import WorkSheetParser, FORMULA_TAG
+
+# value — значение ячейки (для формул — закэшированный результат),
+# formula — текст формулы вида "=A1*2" или None
+SheetCell = namedtuple("SheetCell", ["value", "formula"])
+EMPTY_CELL = SheetCell(None, None)
+
+
+def spool_upload(upload_file, suffix: str = ".xlsx") -> str:
+    """Сохранить загруженный файл во временный файл на диске и вернуть путь"""
+    upload_file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(upload_file, tmp)
+    return tmp.name
+
+
+class _FormulaValueParser(WorkSheetParser):
+    """Парсер листа, который сохраняет у ячейки и значение, и формулу"""
+
+    def parse_cell(self, element):
+        cell = super().parse_cell(element)
+        if element.find(FORMULA_TAG) is not None:
+            cell["formula"] = self.parse_formula(element)
+        return cell
+
+
+class StreamingSheetReader:
+    """
+    Построчный reader одного листа книги.
+
+    Бросает KeyError, если листа нет. Книгу в режиме read_only нужно
+    закрывать, поэтому reader используется как контекстный менеджер.
+    """
+
+    def __init__(self, source, sheet_name: str):
+        self.workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            self.worksheet = self.workbook[sheet_name]
+        except KeyError:
+            self.workbook.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.workbook.close()
+
+    @property
+    def max_row(self):
+        """Число строк по размеру листа из заголовка файла (может быть None)"""
+        return self.worksheet.max_row
+
+    def iter_rows(self, min_row: int = 1, max_col: int = None):
+        """Кортежи (номер строки, [SheetCell, ...]); пустые строки пропускаются"""
+        ws = self.worksheet
+        with ws._get_source() as src:
+            parser = _FormulaValueParser(
+                src,
+                ws._shared_strings,
+                data_only=True,
+                epoch=self.workbook.epoch,
+                date_formats=self.workbook._date_formats,
+                timedelta_formats=self.workbook._timedelta_formats,
+            )
+            for idx, cells in parser.parse():
+                if idx < min_row:
+                    continue
+                width = max_col or max((c["column"] for c in cells), default=0)
+                row = [EMPTY_CELL] * width
+                for c in cells:
+                    if c["column"] <= width:
+                        row[c["column"] - 1] = SheetCell(c["value"], c.get("formula"))
+                yield idx, row
@@ -0,0 +1,60 @@
+# app/services/import_jobs.py
+"""
+Фоновые задачи импорта.
+
+Задача хранится в таблице import_jobs, поэтому её статус виден из любого
+процесса uvicorn. Разбор файла и работа с БД выполняются в пуле потоков,
+а не в event loop, так что большая загрузка не блокирует другие запросы.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.core.config import IMPORT_WORKERS
+from app.database import SessionLocal
+from app.models.import_job import ImportJob, ImportJobStatus
+
+MAX_STORED_ERRORS = 100
+
+executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+
+
+def create_job(db: Session, filename: str) -> ImportJob:
+    job = ImportJob(filename=filename, status=ImportJobStatus.PENDING, errors=[])
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def submit_job(job_id: int, func, *args):
+    """Запустить func(db, job, *args) в пуле с отдельной сессией"""
+    executor.submit(_run_job, job_id, func, *args)
+
+
+def _run_job(job_id: int, func, *args):
+    db = SessionLocal()
+    try:
+        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+        if not job:
+            return
+        job.status = ImportJobStatus.RUNNING
+        job.started_at = datetime.utcnow()
+        db.commit()
+
+        try:
+            func(db, job, *args)
+        except Exception as e:
+            db.rollback()
+            job.status = ImportJobStatus.FAILED
+            job.detail = str(e)
+        else:
+            job.status = ImportJobStatus.DONE
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def record_errors(job: ImportJob, errors: list):
+    job.rows_failed = len(errors)
+    job.errors = errors[-MAX_STORED_ERRORS:]
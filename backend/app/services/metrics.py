@@ -0,0 +1,115 @@
+# app/services/metrics.py
+"""
+Метрики Prometheus для /metrics.
+
+HTTP-метрики пишет MetricsMiddleware: задержка, размер ответа и число
+ответов по шаблону маршрута (/api/products/{id}, а не конкретный id),
+методу и статусу. Это чистый ASGI-middleware без буферизации тела, так
+что потоковые ответы (SSE, выгрузки) не задерживаются.
+
+Доменные счётчики (продажи, проданные единицы, строки импорта) копятся в
+сессии через record() и увеличиваются только после коммита — откаченная
+транзакция в метрики не попадает.
+
+Метрики хранятся в памяти процесса: при нескольких воркерах uvicorn
+каждый отдаёт свои.
+"""
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from app.database import SessionLocal, pool_stats
+
+_PENDING_KEY = "metrics_pending"
+UNMATCHED_ROUTE = "<unmatched>"  # 404 без маршрута — не плодим метки на каждый путь
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Размер тела ответа",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+RESPONSES = Counter("http_responses_total", "Ответы по статусам", ["method", "route", "status"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "Запросы в обработке", ["method"])
+
+SALES_CREATED = Counter("inventory_sales_created_total", "Созданные продажи")
+ITEMS_SOLD = Counter("inventory_items_sold_total", "Проданные единицы товара")
+IMPORT_ROWS = Counter("inventory_import_rows_total", "Строки импорта склада", ["result"])
+
+# Запросы, в которых один и тот же SQL повторился SQL_REPEAT_THRESHOLD раз (см. sql_tracing)
+REPEATED_QUERIES = Counter("db_repeated_queries_total", "HTTP-запросы с повторяющимся SQL (N+1)", ["route"])
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        response = {"status": 500, "size": 0}
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        in_flight = IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            # Маршрут выставляет роутер FastAPI в общий scope после сопоставления пути
+            route = scope.get("route")
+            template = getattr(route, "path", UNMATCHED_ROUTE)
+            REQUEST_LATENCY.labels(method, template).observe(elapsed)
+            RESPONSE_SIZE.labels(method, template).observe(response["size"])
+            RESPONSES.labels(method, template, str(response["status"])).inc()
+
+
+def record(session, metric, amount=1):
+    """Увеличить счётчик metric (Counter или его .labels(...)) после коммита сессии"""
+    session.info.setdefault(_PENDING_KEY, []).append((metric, amount))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_after_commit(session):
+    for metric, amount in session.info.pop(_PENDING_KEY, ()):
+        metric.inc(amount)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _reset_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+class PoolCollector:
+    """Состояние пулов соединений (см. /api/diagnostics/pool) на момент опроса"""
+
+    def collect(self):
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Выданные соединения", labels=["engine"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Соединения сверх pool_size", labels=["engine"])
+        timeouts = CounterMetricFamily("db_pool_timeouts", "Таймауты ожидания соединения", labels=["engine"])
+        wait_p95 = GaugeMetricFamily("db_pool_wait_p95_seconds", "p95 ожидания соединения", labels=["engine"])
+        for stats in pool_stats:
+            snapshot = stats.snapshot()
+            checked_out.add_metric([stats.name], snapshot["checked_out"])
+            overflow.add_metric([stats.name], snapshot["overflow"] or 0)
+            timeouts.add_metric([stats.name], snapshot["timeouts"])
+            wait_p95.add_metric([stats.name], snapshot["wait_p95_ms"] / 1000)
+        yield from (checked_out, overflow, timeouts, wait_p95)
+
+
+REGISTRY.register(PoolCollector())
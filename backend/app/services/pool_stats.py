@@ -0,0 +1,97 @@
+# app/services/pool_stats.py
+"""
+Статистика пулов соединений с БД для /diagnostics/pool.
+
+Выдача, возврат, новые и сброшенные соединения считаются обработчиками
+событий пула SQLAlchemy (checkout, checkin, detach, connect, invalidate).
+Для ожидания свободного соединения события нет, поэтому класс пула
+оборачивается через timed_pool_class: время внутри _do_get — это ожидание
+в очереди пула (для NullPool — открытие нового соединения).
+"""
+import threading
+import time
+from collections import deque
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+WAIT_SAMPLES = 1000  # По скольким последним выдачам считается p95 ожидания
+
+
+class PoolStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.engine = None
+        self.max_overflow = None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.detached = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.timeouts = 0
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    def attach(self, engine, max_overflow: int = None):
+        """Подписаться на события пула engine (переживают пересоздание пула в dispose)"""
+        self.engine = engine
+        self.max_overflow = max_overflow
+        event.listen(engine, "checkout", lambda *args: self._inc("checkouts"))
+        event.listen(engine, "checkin", lambda *args: self._inc("checkins"))
+        event.listen(engine, "detach", lambda *args: self._inc("detached"))
+        event.listen(engine, "connect", lambda *args: self._inc("connects"))
+        event.listen(engine, "invalidate", lambda *args: self._inc("invalidated"))
+
+    def _inc(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self._wait_count += 1
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+            self._waits.append(seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        queue_pool = isinstance(pool, QueuePool)
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "name": self.name,
+                "pool_class": type(pool).__name__,
+                "pool_size": pool.size() if queue_pool else None,
+                "max_overflow": self.max_overflow,
+                "checked_out": self.checkouts - self.checkins - self.detached,
+                "overflow": max(pool.overflow(), 0) if queue_pool else None,
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidated": self.invalidated,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self._wait_total / self._wait_count * 1000, 3) if self._wait_count else 0.0,
+                "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 3) if waits else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+
+def timed_pool_class(pool_class, stats: PoolStats):
+    """
+    Подкласс pool_class, который замеряет ожидание соединения. Пул при
+    dispose() пересоздаётся через self.__class__, так что замер сохраняется.
+    """
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = pool_class._do_get(self)
+        except exc.TimeoutError:
+            stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        stats.record_wait(time.perf_counter() - started)
+        return conn
+
+    return type(f"Timed{pool_class.__name__}", (pool_class,), {"_do_get": _do_get})
@@ -1,12 +1,30 @@
 # inventory_api/app/services/product_service.py
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, or_, tuple_
 from sqlalchemy.orm import Session
-from app.models.product import Product
+from app.core.config import CHANGES_SETTLE_SEC
+from app.database import db_now
+from app.models.product import Product, ProductTombstone
 from app.schemas.product import ProductCreate, ProductUpdate
 from app.models.stock_operation import StockOperation, OperationType
 
+def forget_tombstones(db: Session, product_ids):
+    """
+    Снять отметки об удалении с id, снова занятых товарами: SQLite отдаёт
+    id последнего удалённого товара следующему, и без этого лента
+    изменений вернула бы один id и в upserted, и в deleted
+    """
+    product_ids = list(product_ids)
+    if product_ids:
+        db.query(ProductTombstone).filter(
+            ProductTombstone.product_id.in_(product_ids)
+        ).delete(synchronize_session=False)
+
 def create_product(db: Session, product_in: ProductCreate):
     db_product = Product(**product_in.model_dump())
     db.add(db_product)
+    db.flush()
+    forget_tombstones(db, [db_product.id])
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -45,8 +63,107 @@ def update_product(db: Session, product_id: int, update_data: ProductUpdate):
 
     return db_product
 
-def search_products(db: Session, query: str = None):
+def search_products(db: Session, query: str = None, limit: int = None):
+    """
+    Поиск по подстроке в названии и SKU.
+
+    В PostgreSQL фильтр обслуживают триграммные GIN-индексы, а результаты
+    сортируются по similarity(). На других СУБД (SQLite в тестах) — тот же
+    фильтр и простое ранжирование: точное совпадение, префикс, остальное.
+    """
     q = db.query(Product)
-    if query:
-        q = q.filter(Product.name.ilike(f"%{query}%"))
-    return q.all()
\ No newline at end of file
+    if not query:
+        return q.all()
+
+    pattern = f"%{query}%"
+    q = q.filter(or_(Product.name.ilike(pattern), Product.sku.ilike(pattern)))
+
+    if db.get_bind().dialect.name == "postgresql":
+        rank = func.greatest(
+            func.similarity(Product.name, query),
+            func.similarity(func.coalesce(Product.sku, ""), query),
+        )
+        q = q.order_by(rank.desc(), Product.name)
+    else:
+        lowered = query.lower()
+        rank = case(
+            (or_(func.lower(Product.name) == lowered, func.lower(Product.sku) == lowered), 0),
+            (or_(Product.name.ilike(f"{query}%"), Product.sku.ilike(f"{query}%")), 1),
+            else_=2,
+        )
+        q = q.order_by(rank, func.length(Product.name), Product.name)
+
+    if limit:
+        q = q.limit(limit)
+    return q.all()
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_changes_cursor(ts: datetime, product_id: int, deleted: bool = False) -> str:
+    """
+    Курсор '<микросекунды с эпохи>-<id>' в hex, например '6405c2e1a3b40-2a';
+    суффикс '-d' — последним отдано удаление с этими временем и id
+    """
+    return f"{(ts - _EPOCH) // _MICROSECOND:x}-{product_id:x}" + ("-d" if deleted else "")
+
+
+def decode_changes_cursor(cursor: str):
+    """Разобрать курсор в (время, id, удаление); ValueError, если он некорректен"""
+    ts, product_id, *kind = cursor.split("-")
+    if kind not in ([], ["d"]):
+        raise ValueError(cursor)
+    return _EPOCH + int(ts, 16) * _MICROSECOND, int(product_id, 16), bool(kind)
+
+
+def get_product_changes(db: Session, since: str = None, limit: int = 500):
+    """
+    Изменения каталога после курсора since: изменённые/созданные товары и
+    удалённые (по отметкам в product_tombstones), по порядку
+    (updated_at, id). Возвращает (upserted, deleted, next_cursor, has_more).
+
+    Без since отдаётся весь каталог (удалений в этом случае нет).
+    Самые свежие изменения (моложе CHANGES_SETTLE_SEC) откладываются до
+    следующего запроса: транзакция, начатая раньше, но закоммиченная
+    позже, иначе могла бы оказаться позади курсора. Горизонт считается по
+    часам БД — теми же, что ставят updated_at.
+    """
+    cursor = decode_changes_cursor(since) if since else None
+    horizon = db_now(db) - timedelta(seconds=CHANGES_SETTLE_SEC)
+
+    products = db.query(Product).filter(Product.updated_at <= horizon)
+    if cursor:
+        products = products.filter(tuple_(Product.updated_at, Product.id) > tuple_(*cursor[:2]))
+    products = products.order_by(Product.updated_at, Product.id).limit(limit + 1).all()
+    changes = [(p.updated_at, p.id, p) for p in products]
+
+    if cursor:
+        # При равных (время, id) удаление идёт после изменения: id, занятый
+        # заново, мог быть создан и удалён в одну миллисекунду (часы SQLite)
+        tombstone_key = tuple_(ProductTombstone.deleted_at, ProductTombstone.product_id)
+        tombstones = (
+            db.query(ProductTombstone)
+            .filter(
+                ProductTombstone.deleted_at <= horizon,
+                tombstone_key > tuple_(*cursor[:2]) if cursor[2] else tombstone_key >= tuple_(*cursor[:2]),
+            )
+            .order_by(ProductTombstone.deleted_at, ProductTombstone.product_id)
+            .limit(limit + 1)
+            .all()
+        )
+        changes += [(t.deleted_at, t.product_id, None) for t in tombstones]
+
+    # Сливаем обе ленты по (время, id) и берём первую страницу
+    changes.sort(key=lambda change: (change[0], change[1], change[2] is None))
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    upserted = [product for _, _, product in changes if product is not None]
+    deleted = [product_id for _, product_id, product in changes if product is None]
+    if changes:
+        next_cursor = encode_changes_cursor(changes[-1][0], changes[-1][1], changes[-1][2] is None)
+    else:
+        next_cursor = since or encode_changes_cursor(_EPOCH, 0)
+    return upserted, deleted, next_cursor, has_more
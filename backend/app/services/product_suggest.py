@@ -0,0 +1,219 @@
+# app/services/product_suggest.py
+"""
+Индекс автодополнения по названиям и SKU товаров.
+
+Живёт в памяти процесса: строится при старте приложения и обновляется
+маршрутами создания, изменения, удаления и импорта товаров, поэтому
+подсказки не перебирают таблицу товаров на каждое нажатие клавиши.
+
+Каждый процесс uvicorn держит свой индекс. Изменения из других процессов
+(второй воркер, импорт, seed_dataset.py) подтягивает refresh() в фоновом
+потоке раз в SUGGEST_REFRESH_SEC: он сверяет версию каталога (catalog_cache)
+и, если она выросла, дочитывает товары с updated_at за последнее время и
+удалённые товары по product_tombstones. Сам поиск к БД не обращается.
+"""
+import heapq
+import re
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy.orm import Session
+from app.core.config import SUGGEST_REFRESH_SEC
+from app.database import SessionLocal, db_now
+from app.models.product import Product, ProductTombstone
+from app.services.catalog_cache import get_version
+
+_WORD_SPLIT = re.compile(r"[\s\-_/.,()]+")
+# Насколько раньше прошлой синхронизации перечитывать изменения: транзакция,
+# начатая до неё, может закоммитить товары со старым updated_at позже
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def _normalize(text):
+    return text.casefold().strip() if text else ""
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _words(text: str):
+    return [w for w in _WORD_SPLIT.split(text) if w]
+
+
+class ProductSuggestIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._products = {}                # id -> (name, sku, name_key, sku_key)
+        self._trigrams = defaultdict(set)  # триграмма -> id товаров
+        self._prefixes = defaultdict(set)  # префикс слова из 1-2 символов -> id
+        self._version = None               # версия каталога, с которой индекс сверен
+        self._synced_at = None             # время БД на момент сверки
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._products)
+
+    def _keys(self, name_key: str, sku_key: str):
+        trigrams = _trigrams(name_key) | _trigrams(sku_key)
+        prefixes = set()
+        for word in _words(name_key) + _words(sku_key):
+            prefixes.add(word[:1])
+            prefixes.add(word[:2])
+        return trigrams, prefixes
+
+    def _remove_locked(self, product_id: int):
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        trigrams, prefixes = self._keys(entry[2], entry[3])
+        for gram in trigrams:
+            ids = self._trigrams[gram]
+            ids.discard(product_id)
+            if not ids:
+                del self._trigrams[gram]
+        for prefix in prefixes:
+            ids = self._prefixes[prefix]
+            ids.discard(product_id)
+            if not ids:
+                del self._prefixes[prefix]
+
+    def _add_locked(self, product_id: int, name: str, sku: str = None):
+        name_key, sku_key = _normalize(name), _normalize(sku)
+        self._products[product_id] = (name, sku, name_key, sku_key)
+        trigrams, prefixes = self._keys(name_key, sku_key)
+        for gram in trigrams:
+            self._trigrams[gram].add(product_id)
+        for prefix in prefixes:
+            self._prefixes[prefix].add(product_id)
+
+    def upsert(self, product_id: int, name: str, sku: str = None):
+        with self._lock:
+            self._remove_locked(product_id)
+            self._add_locked(product_id, name, sku)
+
+    def upsert_many(self, products):
+        """products — итерируемое из (id, name, sku)"""
+        with self._lock:
+            for product_id, name, sku in products:
+                self._remove_locked(product_id)
+                self._add_locked(product_id, name, sku)
+
+    def remove(self, product_id: int):
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def rebuild(self, db: Session):
+        """Полностью перестроить индекс по таблице products"""
+        # Версию и время читаем до товаров: изменение во время перестройки
+        # поднимет версию, и следующий refresh() его дочитает
+        version, synced_at = get_version(db), db_now(db)
+        fresh = ProductSuggestIndex()
+        for product_id, name, sku in db.query(Product.id, Product.name, Product.sku):
+            fresh._add_locked(product_id, name, sku)
+        with self._lock:
+            self._products = fresh._products
+            self._trigrams = fresh._trigrams
+            self._prefixes = fresh._prefixes
+            self._version, self._synced_at = version, synced_at
+
+    def refresh(self, db: Session):
+        """Дочитать изменения других процессов, если версия каталога выросла"""
+        version = get_version(db)
+        if version == self._version:
+            return
+        # Обновлением уже занят другой поток — отвечаем по текущему индексу
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if self._synced_at is None:
+                self.rebuild(db)
+                return
+            synced_at = db_now(db)
+            since = self._synced_at - REFRESH_OVERLAP
+            changed = db.query(Product.id, Product.name, Product.sku).filter(Product.updated_at >= since).all()
+            deleted = db.query(ProductTombstone.product_id).filter(ProductTombstone.deleted_at >= since).all()
+            with self._lock:
+                # Сначала удаления: id удалённого товара мог достаться новому,
+                # и живая строка в products важнее старой отметки
+                for product_id, in deleted:
+                    self._remove_locked(product_id)
+                for product_id, name, sku in changed:
+                    self._add_locked(product_id, name, sku)
+                self._version, self._synced_at = version, synced_at
+        finally:
+            self._refresh_lock.release()
+
+    def search(self, query: str, limit: int = 10):
+        """
+        Подсказки: сначала совпадения с начала названия/SKU, затем с начала
+        слова, затем вхождения внутри слова; при равенстве — короткие названия.
+        """
+        q = _normalize(query)
+        if not q:
+            return []
+
+        with self._lock:
+            if len(q) < 3:
+                candidates = set(self._prefixes.get(q, ()))
+            else:
+                postings = sorted(
+                    (self._trigrams.get(gram, set()) for gram in _trigrams(q)), key=len
+                )
+                candidates = set(postings[0]).intersection(*postings[1:])
+            entries = [(pid, self._products[pid]) for pid in candidates]
+
+        def rank(item):
+            _, (name, _sku, name_key, sku_key) = item
+            if name_key.startswith(q) or sku_key.startswith(q):
+                position = 0
+            elif any(w.startswith(q) for w in _words(name_key) + _words(sku_key)):
+                position = 1
+            else:
+                position = 2
+            return position, len(name_key), name_key
+
+        # Триграммы дают кандидатов — подстроку проверяем явно
+        matches = (e for e in entries if q in e[1][2] or q in e[1][3])
+        best = heapq.nsmallest(limit, matches, key=rank)
+        return [
+            {"id": pid, "name": name, "sku": sku}
+            for pid, (name, sku, _, _) in best
+        ]
+
+
+suggest_index = ProductSuggestIndex()
+
+
+class SuggestRefresher:
+    """Фоновый поток процесса API, сверяющий индекс с каталогом"""
+
+    def __init__(self, index: ProductSuggestIndex, interval_sec: float = SUGGEST_REFRESH_SEC):
+        self.index = index
+        self.interval_sec = interval_sec
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval_sec <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="suggest-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            db = SessionLocal()
+            try:
+                self.index.refresh(db)
+            except Exception as e:
+                print(f"Ошибка обновления индекса автодополнения: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+
+suggest_refresher = SuggestRefresher(suggest_index)
@@ -0,0 +1,173 @@
+# app/services/sales_rollups.py
+"""
+Агрегаты продаж по дням, неделям и месяцам — по товарам и по клиентам.
+
+create_sale / delete_sale применяют к агрегатам приращения в той же
+транзакции (UPSERT с прибавлением), поэтому отчёты читают несколько строк
+агрегатов вместо всей истории продаж. Если агрегаты разошлись с данными
+(например, после ручной правки БД), их пересчитывает rebuild():
+
+    python -m app.services.sales_rollups
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models.sale import Sale, SaleItem
+from app.models.sales_rollup import RollupPeriod, SalesRollupClient, SalesRollupProduct
+
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+_PRODUCT_KEY = ["period", "period_start", "product_id"]
+_CLIENT_KEY = ["period", "period_start", "client_name"]
+# Округляем каждую продажу так же, как её сохраняет БД, иначе сумма
+# нескольких продаж в одной пачке разойдётся с пересчётом на копейку
+_CENT = Decimal("0.01")
+_ROLLUP_SCALE = Decimal("0.0001")
+
+
+def _round(value, scale: Decimal) -> Decimal:
+    return Decimal(value).quantize(scale, rounding=ROUND_HALF_UP)
+
+
+def period_start(period: RollupPeriod, day: date) -> date:
+    if period == RollupPeriod.WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == RollupPeriod.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+class _Accumulator:
+    """Приращения агрегатов по ключу (период, начало периода, товар/клиент)"""
+
+    def __init__(self):
+        self.products = defaultdict(lambda: [0, Decimal(0), Decimal(0), 0])
+        self.clients = defaultdict(lambda: [Decimal(0), Decimal(0), 0])
+
+    def add(self, sale, items, sign: int = 1):
+        """
+        sale — (client_name, created_at, total_sale, total_cost), items —
+        (product_id, quantity, sold_price_per_unit, coefficient, purchase_price_at_sale).
+        """
+        client_name, created_at, total_sale, total_cost = sale
+        day = created_at.date()
+
+        per_product = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+        for product_id, quantity, sold_price, coefficient, purchase_price in items:
+            entry = per_product[product_id]
+            entry[0] += quantity
+            entry[1] += _round(Decimal(sold_price) * Decimal(coefficient) * quantity, _ROLLUP_SCALE)
+            entry[2] += _round(Decimal(purchase_price) * quantity, _ROLLUP_SCALE)
+
+        for period in RollupPeriod:
+            start = period_start(period, day)
+            entry = self.clients[(period, start, client_name)]
+            entry[0] += sign * _round(total_sale, _CENT)
+            entry[1] += sign * _round(total_cost, _CENT)
+            entry[2] += sign
+            for product_id, (quantity, revenue, cost) in per_product.items():
+                entry = self.products[(period, start, product_id)]
+                entry[0] += sign * quantity
+                entry[1] += sign * revenue
+                entry[2] += sign * cost
+                entry[3] += sign  # Продажа считается один раз, сколько бы позиций ни было
+
+    def product_rows(self):
+        # Строки в порядке ключа: параллельные транзакции блокируют их в одном порядке
+        return [
+            dict(period=period, period_start=start, product_id=product_id,
+                 quantity=quantity, revenue=revenue, cost=cost, sales_count=count)
+            for (period, start, product_id), (quantity, revenue, cost, count)
+            in sorted(self.products.items())
+        ]
+
+    def client_rows(self):
+        return [
+            dict(period=period, period_start=start, client_name=client_name,
+                 revenue=revenue, cost=cost, sales_count=count)
+            for (period, start, client_name), (revenue, cost, count)
+            in sorted(self.clients.items())
+        ]
+
+
+def _upsert_add(db: Session, model, key_columns, rows):
+    """INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col для каждой строки"""
+    if not rows:
+        return
+    table = model.__table__
+    stmt = _UPSERT_INSERTS[db.get_bind().dialect.name](table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            name: table.c[name] + stmt.excluded[name]
+            for name in rows[0] if name not in key_columns
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def apply_sales(db: Session, sales, sign: int = 1):
+    """
+    Применить продажи к агрегатам без коммита: sign=1 — созданные, -1 — удалённые.
+    sales — итерируемое из ((client_name, created_at, total_sale, total_cost), items).
+    """
+    acc = _Accumulator()
+    for sale, items in sales:
+        acc.add(sale, items, sign)
+    _upsert_add(db, SalesRollupProduct, _PRODUCT_KEY, acc.product_rows())
+    _upsert_add(db, SalesRollupClient, _CLIENT_KEY, acc.client_rows())
+
+
+def rebuild(db: Session, chunk_size: int = 1000) -> dict:
+    """Пересчитать агрегаты с нуля по sales/sale_items и закоммитить"""
+    acc = _Accumulator()
+    rows = (
+        db.query(
+            Sale.id, Sale.client_name, Sale.created_at, Sale.total_sale, Sale.total_cost,
+            SaleItem.product_id, SaleItem.quantity, SaleItem.sold_price_per_unit,
+            SaleItem.coefficient, SaleItem.purchase_price_at_sale,
+        )
+        .outerjoin(SaleItem, SaleItem.sale_id == Sale.id)
+        .filter(Sale.created_at.isnot(None))
+        .order_by(Sale.id, SaleItem.id)
+        .yield_per(chunk_size)
+    )
+
+    # Позиции идут по порядку продаж — собираем продажу целиком и применяем
+    sales = 0
+    current_id, current_sale, current_items = None, None, []
+    for sale_id, client_name, created_at, total_sale, total_cost, *item in rows:
+        if sale_id != current_id:
+            if current_sale is not None:
+                acc.add(current_sale, current_items)
+                sales += 1
+            current_id, current_sale, current_items = sale_id, (client_name, created_at, total_sale, total_cost), []
+        if item[0] is not None:
+            current_items.append(item)
+    if current_sale is not None:
+        acc.add(current_sale, current_items)
+        sales += 1
+
+    db.query(SalesRollupProduct).delete()
+    db.query(SalesRollupClient).delete()
+    product_rows, client_rows = acc.product_rows(), acc.client_rows()
+    for start in range(0, len(product_rows), chunk_size):
+        db.execute(insert(SalesRollupProduct), product_rows[start:start + chunk_size])
+    for start in range(0, len(client_rows), chunk_size):
+        db.execute(insert(SalesRollupClient), client_rows[start:start + chunk_size])
+    db.commit()
+    return {"sales": sales, "product_rows": len(product_rows), "client_rows": len(client_rows)}
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    started = datetime.now()
+    session = SessionLocal()
+    try:
+        stats = rebuild(session)
+    finally:
+        session.close()
+    print(f"Агрегаты продаж пересчитаны за {datetime.now() - started}: {stats}")
@@ -0,0 +1,156 @@
+# app/services/slow_requests.py
+"""
+Медленные HTTP-запросы с планами их самых долгих SQL.
+
+Если запрос обрабатывался дольше SLOW_REQUEST_MS, он попадает в кольцевой
+буфер процесса (последние SLOW_REQUEST_BUFFER записей) вместе с
+SLOW_EXPLAIN_STATEMENTS самыми долгими SQL (по одному на форму запроса) и
+их параметрами. Для них в отдельном потоке строится план:
+
+- PostgreSQL: для читающих SELECT — EXPLAIN (ANALYZE, BUFFERS): запрос
+  выполняется повторно, в транзакции, которая откатывается, с
+  statement_timeout и lock_timeout. INSERT/UPDATE/DELETE и SELECT ... FOR
+  UPDATE/SHARE — простой EXPLAIN без выполнения: повтор взял бы блокировки
+  строк, нужные рабочим транзакциям, а у INSERT откат не возвращает
+  значения последовательностей;
+- SQLite: EXPLAIN QUERY PLAN (запрос не выполняется).
+
+Пока поток занят, планы для новых медленных запросов не строятся — запись
+сохраняется без них. Просмотр: GET /api/diagnostics/slow-requests.
+"""
+import itertools
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from app.core.config import SLOW_EXPLAIN_STATEMENTS, SLOW_REQUEST_BUFFER, SLOW_REQUEST_MS
+from app.database import engine
+
+EXPLAIN_TIMEOUT_MS = 10_000
+MAX_PARAMS_REPR = 1000
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_DOLLAR_PARAM_RE = re.compile(r"\$(\d+)")
+_READ_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+# Изменение данных (в том числе в CTE) или блокировка строк: FOR UPDATE,
+# FOR NO KEY UPDATE, FOR SHARE, FOR KEY SHARE
+_WRITE_OR_LOCK_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b|\bFOR\s+(KEY\s+)?SHARE\b", re.IGNORECASE)
+
+
+class SlowRequestLog:
+    def __init__(self, size: int = SLOW_REQUEST_BUFFER):
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=size)
+        self._ids = itertools.count(1)
+
+    def add(self, entry: dict) -> dict:
+        with self._lock:
+            entry["id"] = next(self._ids)
+            self._entries.append(entry)
+        return entry
+
+    def list(self) -> list:
+        """Записи от новых к старым"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def get(self, entry_id: int):
+        with self._lock:
+            return next((e for e in self._entries if e["id"] == entry_id), None)
+
+
+slow_log = SlowRequestLog()
+_explain_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-explain")
+_explain_busy = threading.Lock()
+
+
+def _slowest_statements(tracker, limit: int):
+    """Самые долгие запросы трекера, по одному на текст SQL"""
+    seen = set()
+    picked = []
+    for duration, statement, parameters, paramstyle in sorted(tracker.statements, key=lambda s: -s[0]):
+        if statement in seen:
+            continue
+        seen.add(statement)
+        picked.append((duration, statement, parameters, paramstyle))
+        if len(picked) == limit:
+            break
+    return picked
+
+
+def capture(scope, route: str, status: int, elapsed: float, tracker):
+    """Сохранить запрос, если он медленнее порога (вызывается из SqlTracingMiddleware)"""
+    if SLOW_REQUEST_MS <= 0 or elapsed * 1000 < SLOW_REQUEST_MS:
+        return
+    query_string = scope.get("query_string", b"").decode("latin-1")
+    statements = _slowest_statements(tracker, SLOW_EXPLAIN_STATEMENTS)
+    entry = slow_log.add({
+        "captured_at": datetime.utcnow(),
+        "method": scope["method"],
+        "path": scope["path"] + (f"?{query_string}" if query_string else ""),
+        "route": route,
+        "status": status,
+        "duration_ms": round(elapsed * 1000, 2),
+        "db_ms": round(tracker.duration * 1000, 2),
+        "queries": tracker.count,
+        "statements": [
+            {
+                "sql": statement,
+                "parameters": repr(parameters)[:MAX_PARAMS_REPR],
+                "duration_ms": round(duration * 1000, 3),
+                "plan": None,
+                "error": None,
+            }
+            for duration, statement, parameters, _ in statements
+        ],
+    })
+    if statements and _explain_busy.acquire(blocking=False):
+        _explain_worker.submit(_explain_entry, entry, statements)
+
+
+def _explain_entry(entry: dict, statements: list):
+    try:
+        for item, (_, statement, parameters, paramstyle) in zip(entry["statements"], statements):
+            if not _EXPLAINABLE_RE.match(statement):
+                item["error"] = "План строится только для SELECT/INSERT/UPDATE/DELETE"
+                continue
+            try:
+                item["plan"] = explain(statement, parameters, paramstyle)
+            except Exception as e:
+                item["error"] = str(e).strip()[:MAX_PARAMS_REPR]
+    finally:
+        _explain_busy.release()
+
+
+def _to_pyformat(statement: str, parameters, paramstyle: str):
+    """Запрос асинхронного движка ($1, $2 — asyncpg) в вид для psycopg2 (%s)"""
+    if paramstyle not in ("numeric_dollar", "numeric"):
+        return statement, parameters
+    values = list(parameters or ())
+    order = [int(n) - 1 for n in _DOLLAR_PARAM_RE.findall(statement)]
+    statement = _DOLLAR_PARAM_RE.sub("%s", statement.replace("%", "%%"))
+    return statement, [values[i] for i in order]
+
+
+def can_analyze(statement: str) -> bool:
+    """Можно ли выполнить запрос повторно ради EXPLAIN ANALYZE: только читающий SELECT"""
+    return bool(_READ_RE.match(statement)) and not _WRITE_OR_LOCK_RE.search(statement)
+
+
+def explain(statement: str, parameters=None, paramstyle: str = None) -> str:
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        if engine.dialect.name == "postgresql":
+            statement, parameters = _to_pyformat(statement, parameters, paramstyle)
+            cur.execute(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+            cur.execute("SET LOCAL lock_timeout = 1000")
+            options = "(ANALYZE, BUFFERS) " if can_analyze(statement) else ""
+            cur.execute(f"EXPLAIN {options}{statement}", parameters)
+            return "\n".join(row[0] for row in cur.fetchall())
+        cur.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+        return "\n".join(str(row[-1]) for row in cur.fetchall())
+    finally:
+        # EXPLAIN ANALYZE выполняет запрос — не оставляем после него транзакцию
+        raw.rollback()
+        raw.close()
@@ -0,0 +1,179 @@
+# app/services/sql_tracing.py
+"""
+Подсчёт SQL-запросов на HTTP-запрос и поиск N+1.
+
+Обработчики before/after_cursor_execute движков замеряют каждый запрос к
+БД и записывают его в трекер текущего HTTP-запроса (contextvar: FastAPI
+копирует контекст в поток синхронного обработчика, run_sync асинхронной
+сессии выполняется в том же контексте). Фоновые потоки трекера не имеют и
+не учитываются.
+
+SqlTracingMiddleware отдаёт итог в заголовке Server-Timing
+(db;dur=<мс>;desc="<N> queries") — его видно во вкладке Network браузера.
+Если один и тот же запрос (с точностью до параметров и длины списков IN)
+выполнился SQL_REPEAT_THRESHOLD раз и больше, это похоже на N+1: пишется
+предупреждение и увеличивается db_repeated_queries_total.
+
+Если включён захват медленных запросов (SLOW_REQUEST_MS), трекер хранит и
+сами запросы с параметрами — их разбирает slow_requests.
+
+query_budget() — проверка бюджета запросов для кода, вызываемого в том же
+процессе; assert_query_budget() — то же по заголовку ответа. Бюджеты
+эндпоинтов (QUERY_BUDGETS) общие для pytest и test_api_full.py.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from app.core.config import SLOW_REQUEST_MS, SQL_REPEAT_THRESHOLD
+from app.database import async_engine, engine
+from app.services import slow_requests
+from app.services.metrics import REPEATED_QUERIES, UNMATCHED_ROUTE
+
+_tracker = ContextVar("sql_tracker", default=None)
+
+# Список плейсхолдеров в скобках: IN (%(id_1)s, %(id_2)s) -> IN (?)
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*(?:%\(\w+\)s|%s|\?|\$\d+|:\w+)(?:\s*,\s*(?:%\(\w+\)s|%s|\?|\$\d+|:\w+))*\s*\)")
+_SPACES_RE = re.compile(r"\s+")
+_SERVER_TIMING_RE = re.compile(r'(?:^|,)\s*db;dur=([\d.]+);desc="(\d+) queries"')
+KEEP_STATEMENTS = 1000  # Сколько запросов с параметрами держать для разбора медленного запроса
+
+
+# Бюджеты SQL-запросов на эндпоинт: не должны зависеть от числа продаж, позиций и операций
+QUERY_BUDGETS = {
+    "POST /sales": 12,
+    "DELETE /sales/{id}": 14,
+    "GET /sales": 2,
+    "GET /products/all": 2,
+    "GET /stock-history": 2,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def statement_shape(statement: str) -> str:
+    return _PLACEHOLDER_LIST_RE.sub("(?)", _SPACES_RE.sub(" ", statement).strip())
+
+
+class QueryTracker:
+    def __init__(self, keep_statements: int = 0):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.keep_statements = keep_statements
+        self.statements = []  # (длительность, SQL, параметры, paramstyle)
+
+    def add(self, statement: str, duration: float, parameters=None, paramstyle: str = None):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+        if len(self.statements) < self.keep_statements:
+            self.statements.append((duration, statement, parameters, paramstyle))
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD):
+        """[(shape, count)] запросов, повторившихся не меньше threshold раз"""
+        if threshold <= 0:
+            return []
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _tracker.get() is not None:
+        context._sql_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    tracker = _tracker.get()
+    started = getattr(context, "_sql_started", None)
+    if tracker is not None and started is not None:
+        if executemany and parameters:
+            parameters = parameters[0]  # Для плана достаточно первого набора
+        tracker.add(statement, time.perf_counter() - started, parameters, conn.dialect.paramstyle)
+
+
+for _engine in (engine, async_engine.sync_engine if async_engine is not None else None):
+    if _engine is not None:
+        event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SqlTracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracker = QueryTracker(KEEP_STATEMENTS if SLOW_REQUEST_MS > 0 else 0)
+        token = _tracker.set(tracker)
+        started = time.perf_counter()
+        response = {"status": 500, "content_type": b""}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["content_type"] = dict(message.get("headers", [])).get(b"content-type", b"")
+                # Запросы потокового тела (SSE, выгрузки) сюда уже не попадут
+                app_timing = f"app;dur={(time.perf_counter() - started) * 1000:.2f}"
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f"{tracker.server_timing()}, {app_timing}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            _tracker.reset(token)
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            repeated = tracker.repeated()
+            if repeated:
+                REPEATED_QUERIES.labels(route).inc()
+                for shape, n in repeated:
+                    print(f"Повторяющийся SQL ({n} раз) в {scope['method']} {route}: {shape[:300]}")
+            # Лента SSE открыта часами — её длительность ни о чём не говорит
+            if not response["content_type"].startswith(b"text/event-stream"):
+                slow_requests.capture(scope, route, response["status"], elapsed, tracker)
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """
+    Выполнить блок с подсчётом запросов; больше max_queries —
+    QueryBudgetExceeded со списком запросов, которые повторялись:
+
+        with query_budget(2):
+            get_all_sales(db=db)
+    """
+    tracker = QueryTracker()
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+    if tracker.count > max_queries:
+        top = "; ".join(f"{n}× {shape[:120]}" for shape, n in tracker.shapes.most_common(3))
+        raise QueryBudgetExceeded(f"{tracker.count} запросов при бюджете {max_queries}: {top}")
+
+
+def assert_query_budget(response, max_queries: int) -> int:
+    """Проверить бюджет по заголовку Server-Timing ответа (httpx/TestClient), вернуть число запросов"""
+    match = _SERVER_TIMING_RE.search(response.headers.get("server-timing", ""))
+    if match is None:
+        raise QueryBudgetExceeded("В ответе нет Server-Timing с числом запросов")
+    count = int(match.group(2))
+    if count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{response.request.method} {response.request.url.path}: "
+            f"{count} запросов при бюджете {max_queries}"
+        )
+    return count
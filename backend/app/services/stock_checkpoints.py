@@ -0,0 +1,200 @@
+# app/services/stock_checkpoints.py
+"""
+Остатки на произвольный момент времени по журналу stock_operations.
+
+Состояние товара на момент T — это ближайшая контрольная точка не позже T
+плюс операции после неё: количество складывается из quantity_change,
+цена и коэффициент берутся из последней операции, где они заданы.
+Без контрольной точки журнал проигрывается с начала.
+
+Журнал с начала неполон (остатки до его ведения, правки в обход
+операций), поэтому контрольная точка снимается не проигрыванием, а с
+таблицы products: текущий остаток минус операции после taken_at — одним
+INSERT ... SELECT, то есть по одному снимку данных. Журнал
+проигрывается только между соседними точками. Точка снимается с
+отставанием CHANGES_SETTLE_SEC по часам БД: операции получают timestamp
+в начале транзакции, и ещё не закоммиченная операция иначе могла бы
+оказаться раньше уже снятой точки.
+"""
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import case, exists, func, insert, literal, or_, select, text
+from sqlalchemy.orm import Session
+from app.core.config import CHANGES_SETTLE_SEC, STOCK_CHECKPOINT_INTERVAL_SEC
+from app.database import SessionLocal, db_now
+from app.models.product import Product
+from app.models.stock_checkpoint import StockCheckpoint, StockSnapshot
+from app.models.stock_operation import StockOperation
+
+CHECK_EVERY_SEC = 60
+_ADVISORY_LOCK_KEY = 0x73746f636b  # Один процесс снимает точку, остальные пропускают
+
+
+def _ledger_deltas(db: Session, since, until, product_id: int = None) -> dict:
+    """product_id -> [сумма quantity_change, последняя цена, последний коэффициент] за (since, until]"""
+    ops = StockOperation
+
+    def window(query):
+        if since is not None:
+            query = query.filter(ops.timestamp > since)
+        if product_id is not None:
+            query = query.filter(ops.product_id == product_id)
+        return query.filter(ops.timestamp <= until)
+
+    deltas = {
+        pid: [total, None, None]
+        for pid, total in window(
+            db.query(ops.product_id, func.sum(ops.quantity_change))
+        ).group_by(ops.product_id)
+    }
+    for slot, column in ((1, ops.new_purchase_price), (2, ops.new_coefficient)):
+        rank = func.row_number().over(
+            partition_by=ops.product_id, order_by=(ops.timestamp.desc(), ops.id.desc())
+        )
+        latest = window(
+            db.query(ops.product_id, column.label("value"), rank.label("rank"))
+            .filter(column.isnot(None))
+        ).subquery()
+        for pid, value in db.query(latest.c.product_id, latest.c.value).filter(latest.c.rank == 1):
+            deltas[pid][slot] = value
+    return deltas
+
+
+def stock_as_of(db: Session, at: datetime, product_id: int = None):
+    """
+    Состояние склада (или одного товара) на момент at.
+    Возвращает (контрольная точка или None, {product_id: [quantity, purchase_price, coefficient]}).
+    """
+    checkpoint = (
+        db.query(StockCheckpoint)
+        .filter(StockCheckpoint.taken_at <= at)
+        .order_by(StockCheckpoint.taken_at.desc(), StockCheckpoint.id.desc())
+        .first()
+    )
+
+    state = {}
+    if checkpoint:
+        snapshots = db.query(
+            StockSnapshot.product_id, StockSnapshot.quantity,
+            StockSnapshot.purchase_price, StockSnapshot.coefficient,
+        ).filter(StockSnapshot.checkpoint_id == checkpoint.id)
+        if product_id is not None:
+            snapshots = snapshots.filter(StockSnapshot.product_id == product_id)
+        state = {pid: [qty, price, coeff] for pid, qty, price, coeff in snapshots}
+
+    since = checkpoint.taken_at if checkpoint else None
+    for pid, (delta, price, coeff) in _ledger_deltas(db, since, at, product_id).items():
+        entry = state.setdefault(pid, [0, None, None])
+        entry[0] += delta
+        if price is not None:
+            entry[1] = price
+        if coeff is not None:
+            entry[2] = coeff
+    return checkpoint, state
+
+
+def _value_at(column, product_column, taken_at: datetime):
+    """
+    Цена или коэффициент товара на taken_at: из products, а если после
+    taken_at их меняла операция — из последней операции не позже taken_at
+    """
+    ops = StockOperation
+    changed_later = exists().where(
+        ops.product_id == Product.id, ops.timestamp > taken_at, column.isnot(None)
+    )
+    before = (
+        select(column)
+        .where(ops.product_id == Product.id, ops.timestamp <= taken_at, column.isnot(None))
+        .order_by(ops.timestamp.desc(), ops.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return case((changed_later, before), else_=product_column)
+
+
+def create_checkpoint(db: Session, taken_at: datetime = None) -> StockCheckpoint:
+    """
+    Снять контрольную точку (по умолчанию — на now - CHANGES_SETTLE_SEC
+    по часам БД) и закоммитить. Остатки берутся из products за вычетом
+    операций после taken_at; товары, созданные позже, в точку не попадают.
+    """
+    taken_at = taken_at or db_now(db) - timedelta(seconds=CHANGES_SETTLE_SEC)
+
+    checkpoint = StockCheckpoint(taken_at=taken_at)
+    db.add(checkpoint)
+    db.flush()
+
+    ops = StockOperation
+    later = (
+        select(ops.product_id, func.sum(ops.quantity_change).label("delta"))
+        .where(ops.timestamp > taken_at)
+        .group_by(ops.product_id)
+        .subquery()
+    )
+    snapshot = (
+        select(
+            literal(checkpoint.id),
+            Product.id,
+            Product.quantity - func.coalesce(later.c.delta, 0),
+            _value_at(ops.new_purchase_price, Product.purchase_price, taken_at),
+            _value_at(ops.new_coefficient, Product.coefficient, taken_at),
+        )
+        .outerjoin(later, later.c.product_id == Product.id)
+        .where(or_(Product.created_at <= taken_at, Product.created_at.is_(None)))
+    )
+    checkpoint.products_count = db.execute(
+        insert(StockSnapshot).from_select(
+            ["checkpoint_id", "product_id", "quantity", "purchase_price", "coefficient"], snapshot
+        )
+    ).rowcount
+    db.commit()
+    return checkpoint
+
+
+def create_checkpoint_if_due(db: Session, interval_sec: float = STOCK_CHECKPOINT_INTERVAL_SEC):
+    """Снять точку, если последняя старше interval_sec; возвращает точку или None"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Блокировка до конца транзакции: несколько процессов API не снимут точку дважды
+        locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar()
+        if not locked:
+            db.rollback()
+            return None
+
+    latest = db.query(func.max(StockCheckpoint.created_at)).scalar()
+    if latest is not None and latest > db_now(db) - timedelta(seconds=interval_sec):
+        db.rollback()
+        return None
+    return create_checkpoint(db)
+
+
+class CheckpointScheduler:
+    """Фоновый поток процесса API, периодически снимающий контрольные точки"""
+
+    def __init__(self, interval_sec: float = STOCK_CHECKPOINT_INTERVAL_SEC):
+        self.interval_sec = interval_sec
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval_sec <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stock-checkpoints", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(min(CHECK_EVERY_SEC, self.interval_sec)):
+            db = SessionLocal()
+            try:
+                create_checkpoint_if_due(db, self.interval_sec)
+            except Exception as e:
+                print(f"Ошибка контрольной точки остатков: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+
+checkpoint_scheduler = CheckpointScheduler()
@@ -0,0 +1,196 @@
+# app/services/stock_events.py
+"""
+Лента изменений остатков и цен для подписчиков (SSE).
+
+Изменения товаров собираются в сессии: ORM-изменения Product ловятся
+автоматически (after_flush), пачечные записи импорта передаются явно
+через record(). В PostgreSQL перед коммитом события отправляются через
+pg_notify — NOTIFY доставляется только при успешном коммите и в порядке
+коммитов, а каждый процесс API слушает канал (LISTEN) и раздаёт события
+своим подписчикам. На других СУБД события раздаются внутри процесса
+после коммита.
+
+Каждый процесс хранит последние STOCK_EVENTS_BACKLOG событий, чтобы
+переподключившийся клиент (Last-Event-ID) получил пропущенное.
+"""
+import asyncio
+import json
+import select
+import threading
+import time
+import uuid
+from collections import deque
+from sqlalchemy import event, func, inspect, select as sql_select
+from app.core.config import STOCK_EVENTS_BACKLOG
+from app.database import SessionLocal, engine
+from app.models.product import Product
+
+STOCK_CHANNEL = "stock_changes"
+MAX_NOTIFY_CHANGES = 50  # Держим payload NOTIFY заметно ниже лимита 8000 байт
+_TRACKED_FIELDS = ("quantity", "purchase_price", "coefficient")
+_CHANGES_KEY = "stock_changes"
+
+
+def _change(product_id, quantity, purchase_price, coefficient) -> dict:
+    return {
+        "product_id": product_id,
+        "quantity": quantity,
+        "purchase_price": str(purchase_price) if purchase_price is not None else None,
+        "coefficient": str(coefficient) if coefficient is not None else None,
+    }
+
+
+def record(session, changes):
+    """
+    Добавить изменения к текущей транзакции сессии; changes — итерируемое
+    из (product_id, quantity, purchase_price, coefficient).
+    """
+    session.info.setdefault(_CHANGES_KEY, {}).update(
+        (product_id, _change(product_id, qty, price, coeff))
+        for product_id, qty, price, coeff in changes
+    )
+
+
+def _events(changes: dict):
+    items = list(changes.values())
+    for start in range(0, len(items), MAX_NOTIFY_CHANGES):
+        yield {"id": uuid.uuid4().hex[:16], "changes": items[start:start + MAX_NOTIFY_CHANGES]}
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_orm_changes(session, flush_context):
+    changes = session.info.setdefault(_CHANGES_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, Product):
+            changes[obj.id] = _change(obj.id, obj.quantity, obj.purchase_price, obj.coefficient)
+    for obj in session.dirty:
+        if isinstance(obj, Product):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in _TRACKED_FIELDS):
+                changes[obj.id] = _change(obj.id, obj.quantity, obj.purchase_price, obj.coefficient)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            changes[obj.id] = {"product_id": obj.id, "deleted": True}
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _notify_before_commit(session):
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    # before_commit вызывается до финального flush — сбрасываем изменения сами,
+    # чтобы after_flush успел собрать их до отправки NOTIFY
+    session.flush()
+    changes = session.info.get(_CHANGES_KEY)
+    if not changes:
+        return
+    # NOTIFY транзакционный: подписчики получат событие только после коммита
+    session.info.pop(_CHANGES_KEY)
+    for ev in _events(changes):
+        session.execute(sql_select(func.pg_notify(STOCK_CHANNEL, json.dumps(ev))))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_after_commit(session):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if changes:
+        for ev in _events(changes):
+            broker.publish_threadsafe(ev)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _reset_after_rollback(session):
+    session.info.pop(_CHANGES_KEY, None)
+
+
+class StockEventBroker:
+    """
+    Раздача событий подписчикам процесса. Буфер и очереди меняются только
+    в потоке event loop, остальные потоки передают события через
+    call_soon_threadsafe.
+    """
+
+    RESET = {"type": "reset"}  # Клиент должен перечитать остатки целиком
+
+    def __init__(self, backlog: int = STOCK_EVENTS_BACKLOG, queue_size: int = 1000):
+        self.loop = None
+        self.backlog = deque(maxlen=backlog)
+        self.subscribers = set()
+        self.queue_size = queue_size
+        self._listener = None
+        self._stop = threading.Event()
+
+    def start(self, loop):
+        self.loop = loop
+        self._stop.clear()
+        if engine.dialect.name == "postgresql":
+            self._listener = threading.Thread(target=self._listen, name="stock-events", daemon=True)
+            self._listener.start()
+
+    def stop(self):
+        self._stop.set()
+        self.loop = None
+
+    @property
+    def local_fanout(self) -> bool:
+        """Без LISTEN/NOTIFY события раздаются прямо из процесса-автора"""
+        return engine.dialect.name != "postgresql"
+
+    def publish_threadsafe(self, ev):
+        if self.local_fanout and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._dispatch, ev)
+
+    def _dispatch(self, ev):
+        if ev is not self.RESET:
+            self.backlog.append(ev)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(ev)
+            except asyncio.QueueFull:
+                # Медленный клиент: отключаем, при переподключении догонит по backlog
+                self.subscribers.discard(queue)
+                queue.overflowed = True
+
+    def subscribe(self, last_event_id: str = None):
+        """Новая очередь подписчика и события для догоняющей отправки"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        queue.overflowed = False
+        self.subscribers.add(queue)
+
+        if not last_event_id:
+            return queue, []
+        ids = [ev["id"] for ev in self.backlog]
+        if last_event_id not in ids:
+            # Событие вышло за окно backlog — догнать не получится
+            return queue, [self.RESET]
+        return queue, list(self.backlog)[ids.index(last_event_id) + 1:]
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                raw = engine.raw_connection()
+                conn = raw.driver_connection
+                raw.detach()  # Соединение живёт всё время процесса, вне пула
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {STOCK_CHANNEL}")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        ev = json.loads(conn.notifies.pop(0).payload)
+                        if self.loop is not None:
+                            self.loop.call_soon_threadsafe(self._dispatch, ev)
+                conn.close()
+            except Exception as e:
+                print(f"Ошибка LISTEN {STOCK_CHANNEL}: {e}")
+                # Пока соединения не было, события могли потеряться
+                if self.loop is not None:
+                    self.loop.call_soon_threadsafe(self._dispatch, self.RESET)
+                time.sleep(1)
+
+
+broker = StockEventBroker()
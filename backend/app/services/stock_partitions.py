@@ -0,0 +1,445 @@
+# app/services/stock_partitions.py
+"""
+Помесячные партиции stock_operations и архив старой истории (PostgreSQL).
+
+При STOCK_OPERATIONS_PARTITIONED=true таблица создаётся как
+PARTITION BY RANGE (timestamp): на каждый месяц своя партиция
+stock_operations_pYYYYMM плюс stock_operations_default для строк вне
+диапазонов. Запросы с условием по timestamp (days= в истории, курсор)
+читают только нужные партиции. Партиции создаются заранее, на текущий
+и следующие PARTITION_MONTHS_AHEAD месяцев.
+
+Архивация отключает партиции старше STOCK_ARCHIVE_AFTER_MONTHS, сохраняя
+их в STOCK_ARCHIVE_DIR как stock_operations_pYYYYMM.csv.gz (COPY ... CSV).
+Архив можно читать через include_archived в /stock-history.
+
+Файл архива — цепочка gzip-членов по ARCHIVE_CHUNK_ROWS строк (для gzip
+это один сжатый поток), рядом — индекс .idx со смещением и временем
+первой строки каждого члена. С начала файл читается потоком, а с конца —
+по одному члену: память не зависит от размера месяца, а страницы истории
+с курсором пропускают более новые члены, не распаковывая их.
+
+    python -m app.services.stock_partitions migrate   # перевести существующую таблицу
+    python -m app.services.stock_partitions ensure    # создать партиции наперёд
+    python -m app.services.stock_partitions archive   # выгрузить старые партиции
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import text
+from app.core.config import STOCK_ARCHIVE_AFTER_MONTHS, STOCK_ARCHIVE_DIR
+from app.database import engine, SessionLocal
+from app.models.stock_operation import StockOperation
+
+PARENT_TABLE = StockOperation.__tablename__
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+PARTITION_MONTHS_AHEAD = 2
+MAINTAIN_EVERY_SEC = 6 * 3600
+ARCHIVE_CHUNK_ROWS = 10000  # Строк в одном gzip-члене архива
+
+_PARTITION_RE = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$")
+_ARCHIVE_RE = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})\.csv\.gz$")
+_COLUMNS = [c.name for c in StockOperation.__table__.columns]
+_INT_COLUMNS = {"id", "product_id", "quantity_change", "old_quantity", "new_quantity"}
+_DECIMAL_COLUMNS = {
+    "old_purchase_price", "new_purchase_price", "old_coefficient",
+    "new_coefficient", "sold_price_per_unit",
+}
+
+
+def _add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+    ), {"table": PARENT_TABLE}).scalar()
+
+
+def list_partitions(conn):
+    """Помесячные партиции [(month, name)] по возрастанию месяца"""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalars()
+    partitions = []
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def ensure_partitions(conn, since: date = None, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Создать недостающие партиции с месяца since (по умолчанию — текущего) и наперёд"""
+    current = date.today().replace(day=1)
+    month = (since or current).replace(day=1)
+    last = _add_months(current, months_ahead)
+    while month <= last:
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF {PARENT_TABLE} '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        ))
+        month = _add_months(month, 1)
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF {PARENT_TABLE} DEFAULT'))
+
+
+def migrate_to_partitioned():
+    """
+    Перевести обычную таблицу stock_operations в партиционированную одной
+    транзакцией: старая таблица переименовывается, создаётся новая по модели,
+    данные переносятся, счётчик id продолжается. Таблица заблокирована на
+    время переноса — запускать в окно обслуживания.
+    """
+    legacy = f"{PARENT_TABLE}_legacy"
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            print("stock_operations уже партиционирована")
+            return
+
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {legacy}"))
+        # Имена индексов и последовательности освобождаем для новой таблицы
+        indexes = conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :table"
+        ), {"table": legacy}).scalars().all()
+        for index in indexes:
+            conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_legacy"'))
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {PARENT_TABLE}_id_seq RENAME TO {legacy}_id_seq"))
+
+        StockOperation.__table__.create(conn, checkfirst=True)
+        oldest = conn.execute(text(f"SELECT min(timestamp) FROM {legacy}")).scalar()
+        ensure_partitions(conn, since=oldest.date() if oldest else None)
+
+        columns = ", ".join(_COLUMNS)
+        moved = conn.execute(text(
+            f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {columns} FROM {legacy}"
+        )).rowcount
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{PARENT_TABLE}', 'id'), "
+            f"(SELECT COALESCE(max(id), 0) + 1 FROM {PARENT_TABLE}), false)"
+        ))
+        conn.execute(text(f"DROP TABLE {legacy}"))
+    print(f"stock_operations партиционирована, перенесено строк: {moved}")
+
+
+def archive_path(month: date) -> str:
+    return os.path.join(STOCK_ARCHIVE_DIR, f"{partition_name(month)}.csv.gz")
+
+
+def archive_index_path(month: date) -> str:
+    return f"{archive_path(month)}.idx"
+
+
+class _ArchiveWriter(io.TextIOBase):
+    """
+    Приёмник COPY ... TO STDOUT WITH (FORMAT csv, HEADER true): пишет строки
+    в gzip-файл отдельными членами — заголовок и по ARCHIVE_CHUNK_ROWS строк —
+    и собирает индекс [[смещение, время первой строки], ...] членов со строками.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "wb")
+        self._record = []     # Куски незаконченной строки CSV
+        self._quoted = False  # Внутри кавычек: перевод строки — часть значения
+        self._rows = []
+        self._header = None
+        self.index = []
+
+    def writable(self):
+        return True
+
+    def write(self, data: str) -> int:
+        start = 0
+        while (end := data.find("\n", start)) >= 0:
+            piece = data[start:end + 1]
+            # Кавычки внутри значений удваиваются, поэтому чётность не сбивается
+            self._quoted ^= piece.count('"') % 2 == 1
+            self._record.append(piece)
+            if not self._quoted:
+                self._add_row("".join(self._record))
+                self._record = []
+            start = end + 1
+        if start < len(data):
+            self._quoted ^= data.count('"', start) % 2 == 1
+            self._record.append(data[start:])
+        return len(data)
+
+    def _add_row(self, row: str):
+        if self._header is None:
+            self._header = row
+            self._write_member([row])
+            return
+        self._rows.append(row)
+        if len(self._rows) >= ARCHIVE_CHUNK_ROWS:
+            self._flush_rows()
+
+    def _flush_rows(self):
+        if self._rows:
+            timestamp = next(csv.reader([self._rows[0]]))[_COLUMNS.index("timestamp")]
+            self.index.append([self._file.tell(), timestamp])
+            self._write_member(self._rows)
+            self._rows = []
+
+    def _write_member(self, rows: list):
+        with gzip.GzipFile(fileobj=self._file, mode="wb") as member:
+            member.write("".join(rows).encode("utf-8"))
+
+    def close(self):
+        if not self._file.closed:
+            self._flush_rows()
+            self._file.close()
+        super().close()
+
+
+def _detached_partitions(conn):
+    """Отключённые от stock_operations, но ещё не удалённые партиции [(month, name)]"""
+    names = conn.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+        "AND relnamespace = current_schema()::regnamespace AND relname LIKE :prefix"
+    ), {"prefix": f"{PARENT_TABLE}%"}).scalars()
+    partitions = []
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def _write_archive(month: date, name: str):
+    """Выгрузить таблицу name в архив месяца через временные файлы"""
+    path, index_path = archive_path(month), archive_index_path(month)
+    tmp_path = f"{path}.tmp"
+    raw = engine.raw_connection()
+    try:
+        with _ArchiveWriter(tmp_path) as out:
+            with raw.cursor() as cur:
+                cur.copy_expert(
+                    f'COPY (SELECT {", ".join(_COLUMNS)} FROM "{name}" ORDER BY timestamp, id) '
+                    f"TO STDOUT WITH (FORMAT csv, HEADER true)",
+                    out,
+                )
+    finally:
+        raw.close()
+    with open(f"{index_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(out.index, f)
+    # Индекс раньше файла: архив без индекса читается, но целиком
+    os.replace(f"{index_path}.tmp", index_path)
+    os.replace(tmp_path, path)
+
+
+def archive_partitions(older_than_months: int = STOCK_ARCHIVE_AFTER_MONTHS):
+    """
+    Выгрузить в архив и удалить партиции, целиком лежащие раньше
+    начала месяца (текущий - older_than_months). Возвращает список месяцев.
+
+    Партиции сначала отключаются (DETACH) — в одной транзакции с контрольной
+    точкой остатков на границе архива, после которой /stock/as-of считает без
+    архивных операций. В отключённую таблицу никто не пишет, поэтому COPY
+    выгружает окончательные данные, а DROP выполняется только после того, как
+    файл и индекс на месте. Пока месяц выгружается, его операций нет ни в
+    таблице, ни в архиве. Таблицы, отключённые прерванным запуском, дочищаются
+    следующим.
+    """
+    from app.services.stock_checkpoints import create_checkpoint
+
+    cutoff = _add_months(date.today().replace(day=1), -older_than_months)
+    db = SessionLocal()
+    try:
+        months = [(m, name) for m, name in list_partitions(db.connection()) if _add_months(m, 1) <= cutoff]
+        if months:
+            for _, name in months:
+                db.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+            boundary = datetime.combine(_add_months(months[-1][0], 1), datetime.min.time())
+            create_checkpoint(db, boundary - timedelta(microseconds=1))  # коммитит и DETACH
+        detached = _detached_partitions(db.connection())
+        db.commit()
+    finally:
+        db.close()
+
+    os.makedirs(STOCK_ARCHIVE_DIR, exist_ok=True)
+    archived = []
+    for month, name in detached:
+        _write_archive(month, name)
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP TABLE "{name}"'))
+        archived.append(month)
+    return archived
+
+
+def archived_months():
+    """Месяцы, выгруженные в архив, по возрастанию"""
+    if not os.path.isdir(STOCK_ARCHIVE_DIR):
+        return []
+    months = []
+    for filename in os.listdir(STOCK_ARCHIVE_DIR):
+        match = _ARCHIVE_RE.match(filename)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def _parse_archived_row(row: dict) -> dict:
+    op = {}
+    for column in _COLUMNS:
+        value = row.get(column)
+        if value == "" or value is None:
+            op[column] = None
+        elif column in _INT_COLUMNS:
+            op[column] = int(value)
+        elif column in _DECIMAL_COLUMNS:
+            op[column] = Decimal(value)
+        elif column == "timestamp":
+            op[column] = datetime.fromisoformat(value)
+        else:
+            op[column] = value
+    return op
+
+
+def _matching(rows, product_id, operation_type, since, before, deleted_products):
+    """Разобранные строки архива, прошедшие фильтры истории"""
+    for row in rows:
+        row_product_id = int(row["product_id"])
+        if product_id and row_product_id != product_id:
+            continue
+        if row_product_id in deleted_products:
+            continue
+        if operation_type and row["operation_type"] != operation_type:
+            continue
+        op = _parse_archived_row(row)
+        if since and op["timestamp"] < since:
+            continue
+        if before and (op["timestamp"], op["id"]) >= before:
+            continue
+        yield op
+
+
+def _read_member(f, offset: int) -> str:
+    """Распаковать один gzip-член файла f, начинающийся со смещения offset"""
+    f.seek(offset)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = []
+    while not decompressor.eof:
+        block = f.read(1 << 16)
+        if not block:
+            break
+        chunks.append(decompressor.decompress(block))
+    return b"".join(chunks).decode("utf-8")
+
+
+def _iter_month_reversed(month: date, filters: tuple):
+    """Операции архивного месяца от новых к старым, по одному gzip-члену"""
+    since, before = filters[2], filters[3]
+    try:
+        with open(archive_index_path(month), encoding="utf-8") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        # Архив без индекса (одним gzip-членом) читается целиком
+        with gzip.open(archive_path(month), "rt", encoding="utf-8", newline="") as f:
+            ops = list(_matching(csv.DictReader(f), *filters))
+        yield from reversed(ops)
+        return
+
+    with open(archive_path(month), "rb") as f:
+        header = next(csv.reader([_read_member(f, 0)]))
+        for offset, first_timestamp in reversed(index):
+            first_timestamp = datetime.fromisoformat(first_timestamp)
+            if before and first_timestamp > before[0]:
+                continue  # Весь член новее курсора
+            rows = csv.DictReader(io.StringIO(_read_member(f, offset), newline=""), fieldnames=header)
+            yield from reversed(list(_matching(rows, *filters)))
+            if since and first_timestamp < since:
+                return  # Более ранние члены целиком раньше since
+
+
+def iter_archived_operations(product_id: int = None, operation_type: str = None,
+                             since: datetime = None, before: tuple = None,
+                             newest_first: bool = True, deleted_products=frozenset()):
+    """
+    Операции из архивных файлов (словари с колонками stock_operations) с теми
+    же фильтрами, что у истории; before — курсор (timestamp, id), строки строго
+    раньше него. Файлы целиком раньше since не читаются. Строки читаются
+    потоком: от старых к новым — подряд, от новых к старым — по gzip-членам.
+
+    Удаление товара не переписывает архив: операции товаров из
+    deleted_products (id из product_tombstones) пропускаются при чтении.
+    """
+    filters = (product_id, operation_type, since, before, deleted_products)
+    months = archived_months()
+    if newest_first:
+        months.reverse()
+    for month in months:
+        month_end = datetime.combine(_add_months(month, 1), datetime.min.time())
+        if since and month_end <= since:
+            if newest_first:
+                break
+            continue
+        if before and datetime.combine(month, datetime.min.time()) > before[0]:
+            continue
+
+        if newest_first:
+            yield from _iter_month_reversed(month, filters)
+        else:
+            # В файле строки уже по возрастанию (timestamp, id)
+            with gzip.open(archive_path(month), "rt", encoding="utf-8", newline="") as f:
+                yield from _matching(csv.DictReader(f), *filters)
+
+
+class PartitionMaintainer:
+    """Фоновый поток: держит партиции созданными на PARTITION_MONTHS_AHEAD месяцев вперёд"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+
+    def start(self):
+        with engine.begin() as conn:
+            if not is_partitioned(conn):
+                return
+            # Первый раз — синхронно, чтобы вставкам было куда писать сразу после старта
+            ensure_partitions(conn)
+        self._stop.clear()
+        threading.Thread(target=self._run, name="stock-partitions", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(MAINTAIN_EVERY_SEC):
+            try:
+                with engine.begin() as conn:
+                    ensure_partitions(conn)
+            except Exception as e:
+                print(f"Ошибка создания партиций stock_operations: {e}")
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "migrate":
+        migrate_to_partitioned()
+    elif command == "ensure":
+        with engine.begin() as conn:
+            ensure_partitions(conn)
+    elif command == "archive":
+        months = archive_partitions()
+        print(f"В архив выгружено партиций: {len(months)} {[m.strftime('%Y-%m') for m in months]}")
+    else:
+        print("Использование: python -m app.services.stock_partitions migrate|ensure|archive")
+        sys.exit(1)
@@ -0,0 +1,70 @@
+# tests/conftest.py
+"""
+Тесты в процессе: приложение на временной SQLite через TestClient.
+
+    cd backend && python -m pytest tests
+
+Окружение выставляется до импорта app: настройки читаются при импорте
+app.core.config. База одна на весь прогон — тесты создают свои товары
+и проверяют только их.
+"""
+import os
+import sys
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="inventory_tests_")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}",
+    "DB_ASYNC": "false",
+    "CHANGES_SETTLE_SEC": "0",
+    "SLOW_REQUEST_MS": "0",
+    "STOCK_CHECKPOINT_INTERVAL_SEC": "0",
+    "SUGGEST_REFRESH_SEC": "0",
+    "STOCK_ARCHIVE_DIR": os.path.join(_TMP_DIR, "archive"),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itertools
+import pytest
+from fastapi.testclient import TestClient
+from app.database import SessionLocal
+from app.main import app
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_products(client):
+    """Создать count товаров одним POST /products/bulk, вернуть их id"""
+    def make(count: int, quantity: int = 100, price: str = "100.00") -> list:
+        resp = client.post("/api/products/bulk", json=[
+            {"name": f"ТЕСТ-{n}", "sku": f"T-{n:06d}", "purchase_price": price,
+             "coefficient": "1.2", "quantity": quantity}
+            for n in itertools.islice(_names, count)
+        ])
+        assert resp.status_code == 200, resp.text
+        return [p["id"] for p in resp.json()]
+    return make
+
+
+def sell(client, product_id: int, quantity: int = 1, client_name: str = "ООО Тест"):
+    resp = client.post("/api/sales", json={"client_name": client_name, "items": [
+        {"product_id": product_id, "quantity": quantity, "sold_price_per_unit": "150.00", "coefficient": "1.0"}
+    ]})
+    assert resp.status_code == 200, resp.text
+    return resp.json()
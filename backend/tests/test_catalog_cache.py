@@ -0,0 +1,45 @@
+# tests/test_catalog_cache.py
+from sqlalchemy import update
+from app.database import SessionLocal
+from app.models.product import Product
+from app.services.catalog_cache import VERSION_KEY, get_version
+from conftest import sell
+
+
+def _committed_version() -> int:
+    session = SessionLocal()
+    try:
+        return get_version(session)
+    finally:
+        session.close()
+
+
+def test_version_bumped_in_committing_transaction(make_products, db):
+    [product_id] = make_products(1)
+    before = _committed_version()
+
+    db.get(Product, product_id).name = "ТЕСТ-ПЕРЕИМЕНОВАН"
+    db.commit()
+    assert db.info[VERSION_KEY] == before + 1
+    assert _committed_version() == before + 1
+
+    # Пачечный UPDATE тоже поднимает версию, откат и чтение — нет
+    db.execute(update(Product).where(Product.id == product_id).values(quantity=5))
+    db.commit()
+    db.execute(update(Product).where(Product.id == product_id).values(quantity=6))
+    db.rollback()
+    db.get(Product, product_id)
+    db.commit()
+    assert _committed_version() == before + 2
+
+
+def test_etag_follows_sales(client, make_products):
+    [product_id] = make_products(1)
+    etag = client.get("/api/products/all").headers["etag"]
+    assert client.get("/api/products/all", headers={"If-None-Match": etag}).status_code == 304
+
+    sell(client, product_id)
+    resp = client.get("/api/products/all", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+    assert next(p for p in resp.json() if p["id"] == product_id)["quantity"] == 99
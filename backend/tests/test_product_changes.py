@@ -0,0 +1,65 @@
+# tests/test_product_changes.py
+import pytest
+from sqlalchemy import func, update
+from app.models.product import Product
+
+
+def _feed(client, since=None, limit: int = 10):
+    """Все страницы /products/changes от курсора since: (upserted id, deleted id, последний курсор)"""
+    upserted, deleted = [], []
+    while True:
+        resp = client.get("/api/products/changes", params={"limit": limit, **({"since": since} if since else {})})
+        assert resp.status_code == 200, resp.text
+        page = resp.json()
+        upserted += [p["id"] for p in page["upserted"]]
+        deleted += page["deleted"]
+        assert page["next_cursor"] != since or not page["has_more"], "курсор не продвигается"
+        since = page["next_cursor"]
+        if not page["has_more"]:
+            return upserted, deleted, since
+
+
+def test_changes_within_one_second(client, make_products):
+    # Пачка товаров создаётся одной транзакцией — updated_at в одной секунде
+    _, _, cursor = _feed(client, limit=5000)
+    ids = make_products(45)
+
+    upserted, deleted, _ = _feed(client, cursor, limit=10)
+    assert len(upserted) == len(set(upserted)), "товары повторяются"
+    assert set(ids) <= set(upserted)
+    assert deleted == []
+
+
+def test_changes_with_equal_timestamps(client, make_products, db):
+    # Одинаковый updated_at у всех: порядок и курсор держатся только на id
+    _, _, cursor = _feed(client, limit=5000)
+    ids = make_products(33)
+    ours = Product.id.in_(ids)
+    same_time = db.query(func.max(Product.updated_at)).filter(ours).scalar()
+    db.execute(update(Product).where(ours).values(updated_at=same_time))
+    db.commit()
+    for product_id in ids[:4]:
+        assert client.delete(f"/api/products/{product_id}").status_code == 200
+
+    upserted, deleted, _ = _feed(client, cursor, limit=10)
+    assert len(upserted) == len(set(upserted)), "товары повторяются"
+    assert set(upserted) >= set(ids[4:])
+    assert sorted(deleted) == ids[:4]
+
+
+def test_delete_recreate_delete_same_id(client, make_products):
+    # SQLite отдаёт id последнего удалённого товара следующему
+    _, _, cursor = _feed(client, limit=5000)
+    _, _, cursor = _feed(client, cursor, limit=5000)  # и удаления из прошлых тестов
+    [first] = make_products(1)
+    assert client.delete(f"/api/products/{first}").status_code == 200
+    [again] = make_products(1)
+    if again != first:
+        pytest.skip("id не переиспользуются (последовательность PostgreSQL)")
+
+    upserted, deleted, cursor = _feed(client, cursor)
+    assert (upserted, deleted) == ([again], []), "id одновременно живой и удалённый"
+
+    assert client.delete(f"/api/products/{again}").status_code == 200
+    upserted, deleted, _ = _feed(client, cursor)
+    assert (upserted, deleted) == ([], [again])
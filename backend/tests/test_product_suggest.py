@@ -0,0 +1,47 @@
+# tests/test_product_suggest.py
+from sqlalchemy import delete, func, insert, update
+from app.database import SessionLocal
+from app.models.product import Product, ProductTombstone
+from app.services.product_suggest import suggest_index
+from app.services.sql_tracing import assert_query_budget
+
+
+def _suggest(client, q: str) -> list:
+    resp = client.get("/api/products/suggest", params={"q": q})
+    assert resp.status_code == 200, resp.text
+    assert_query_budget(resp, 0)  # Подсказки — только из памяти
+    return [s["id"] for s in resp.json()]
+
+
+def _refresh():
+    """Один проход фонового обновления (в тестах поток выключен: SUGGEST_REFRESH_SEC=0)"""
+    session = SessionLocal()
+    try:
+        suggest_index.refresh(session)
+    finally:
+        session.close()
+
+
+def test_suggest_picks_up_changes_from_other_processes(client, db):
+    _refresh()  # индекс сверен с текущей версией
+
+    # Изменения мимо маршрутов API — так пишут другие воркеры, импорт и seed_dataset.py
+    product_id = db.execute(insert(Product).returning(Product.id), [
+        {"name": "ФОТОБАРАБАН ВНЕШНИЙ ZX9", "sku": "EXT-ZX9", "purchase_price": "10", "coefficient": "1", "quantity": 1}
+    ]).scalar()
+    db.commit()
+    assert _suggest(client, "zx9") == []
+    _refresh()
+    assert _suggest(client, "zx9") == [product_id]
+
+    db.execute(update(Product).where(Product.id == product_id).values(name="ФОТОБАРАБАН ВНЕШНИЙ QW7", sku="EXT-QW7"))
+    db.commit()
+    _refresh()
+    assert _suggest(client, "zx9") == []
+    assert _suggest(client, "qw7") == [product_id]
+
+    db.execute(delete(Product).where(Product.id == product_id))
+    db.merge(ProductTombstone(product_id=product_id, deleted_at=func.now()))
+    db.commit()
+    _refresh()
+    assert _suggest(client, "qw7") == []
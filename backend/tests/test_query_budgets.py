@@ -0,0 +1,60 @@
+# tests/test_query_budgets.py
+from app.models.stock_operation import OperationType, StockOperation
+from app.routes.sales import get_all_sales
+from app.services.sql_tracing import QUERY_BUDGETS, assert_query_budget, query_budget
+
+
+def _sale(client, product_ids: list) -> dict:
+    resp = client.post("/api/sales", json={"client_name": "ООО Бюджет", "items": [
+        {"product_id": product_id, "quantity": 2, "sold_price_per_unit": "150.00", "coefficient": "1.0"}
+        for product_id in product_ids
+    ]})
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def _partial_sales(client, product_ids: list, count: int):
+    # Статус PARTIAL выделяет продажи этого теста из общей базы
+    for _ in range(count):
+        sale = _sale(client, product_ids)
+        resp = client.put(f"/api/sales/{sale['id']}/status", json={"payment_status": "PARTIAL"})
+        assert resp.status_code == 200, resp.text
+    resp = client.get("/api/sales", params={"status": "PARTIAL"})
+    assert resp.status_code == 200
+    return resp
+
+
+def test_get_sales_budget(client, make_products, db):
+    # Число запросов не зависит от числа продаж и позиций
+    ids = make_products(10)
+    resp = _partial_sales(client, ids, 1)
+    assert len(resp.json()) == 1
+    one_sale = assert_query_budget(resp, QUERY_BUDGETS["GET /sales"])
+
+    resp = _partial_sales(client, ids, 14)
+    assert len(resp.json()) == 15
+    assert assert_query_budget(resp, QUERY_BUDGETS["GET /sales"]) == one_sale
+
+    with query_budget(QUERY_BUDGETS["GET /sales"]):
+        assert len(get_all_sales(status=None, db=db)) >= 15
+
+
+def test_delete_sale_budget(client, make_products, db):
+    ids = make_products(10, quantity=100)
+    sale = _sale(client, ids)
+
+    resp = client.delete(f"/api/sales/{sale['id']}")
+    assert resp.status_code == 200, resp.text
+    assert_query_budget(resp, QUERY_BUDGETS["DELETE /sales/{id}"])
+
+    # Пачечный возврат: остатки восстановлены, по корректировке на позицию
+    products = {p["id"]: p for p in client.get("/api/products/all").json()}
+    assert all(products[product_id]["quantity"] == 100 for product_id in ids)
+    returns = db.query(StockOperation).filter(
+        StockOperation.product_id.in_(ids), StockOperation.reason == f"Отмена продажи #{sale['id']}"
+    ).all()
+    assert sorted(op.product_id for op in returns) == ids
+    assert all(
+        op.operation_type == OperationType.ADJUSTMENT and op.quantity_change == 2 and op.new_quantity == 100
+        for op in returns
+    )
@@ -0,0 +1,31 @@
+# tests/test_sales_concurrency.py
+from concurrent.futures import ThreadPoolExecutor
+from app.models.stock_operation import OperationType, StockOperation
+
+STOCK = 20
+BUYERS = 60
+
+
+def test_concurrent_sales_do_not_oversell(client, make_products, db):
+    # Спрос втрое больше остатка, все продажи — в один SKU одновременно
+    [product_id] = make_products(1, quantity=STOCK)
+
+    def buy(_):
+        return client.post("/api/sales", json={"client_name": "ООО Гонка", "items": [
+            {"product_id": product_id, "quantity": 1, "sold_price_per_unit": "150.00", "coefficient": "1.0"}
+        ]}).status_code
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(buy, range(BUYERS)))
+
+    assert sorted(set(statuses)) == [200, 400]
+    assert statuses.count(200) == STOCK
+
+    products = {p["id"]: p for p in client.get("/api/products/all").json()}
+    assert products[product_id]["quantity"] == 0
+
+    sales = db.query(StockOperation).filter(
+        StockOperation.product_id == product_id, StockOperation.operation_type == OperationType.SALE
+    ).all()
+    assert len(sales) == STOCK
+    assert sorted(op.new_quantity for op in sales) == list(range(STOCK))
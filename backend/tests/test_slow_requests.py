@@ -0,0 +1,19 @@
+# tests/test_slow_requests.py
+import pytest
+from app.services.slow_requests import can_analyze
+
+
+@pytest.mark.parametrize("statement, expected", [
+    ("SELECT products.id, products.updated_at FROM products WHERE products.id = %(id)s", True),
+    ("WITH last AS (SELECT max(id) AS id FROM stock_operations) SELECT * FROM last", True),
+    ("SELECT products.id FROM products WHERE products.id IN (1, 2) ORDER BY products.id FOR UPDATE", False),
+    ("SELECT id FROM products FOR NO KEY UPDATE", False),
+    ("select id from products for share", False),
+    ("SELECT id FROM products FOR KEY SHARE", False),
+    ("UPDATE products SET quantity=%(quantity)s WHERE products.id = %(id)s", False),
+    ("DELETE FROM stock_operations WHERE product_id = %(id)s", False),
+    ("INSERT INTO sales (client_name) VALUES (%(client_name)s) RETURNING id", False),
+    ("WITH moved AS (DELETE FROM stock_operations RETURNING *) SELECT count(*) FROM moved", False),
+])
+def test_analyze_only_read_only_selects(statement, expected):
+    assert can_analyze(statement) is expected
@@ -0,0 +1,97 @@
+# tests/test_stock_archive.py
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import date, datetime, timedelta
+from app.services import stock_partitions
+from app.services.stock_partitions import (
+    _COLUMNS, _ArchiveWriter, archive_index_path, archive_path, iter_archived_operations,
+)
+
+MONTHS = [date(2001, 1, 1), date(2001, 2, 1)]
+
+
+def _copy_output(month: date, count: int) -> str:
+    """CSV как у COPY ... WITH (FORMAT csv, HEADER true), по возрастанию (timestamp, id)"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(_COLUMNS)
+    start = datetime.combine(month, datetime.min.time())
+    for n in range(count):
+        op_id = month.month * 1000 + n
+        writer.writerow([
+            op_id, n % 3 + 1, "SALE" if n % 2 else "INCOMING", 1, 0, 1, "", "", "", "", "",
+            # Переводы строк и кавычки внутри значения не должны рвать член архива
+            f'строка {n}\nпричина "в кавычках"' if n % 5 == 0 else "",
+            # Парами в одну секунду: порядок держится на id
+            (start + timedelta(seconds=n // 2)).isoformat(sep=" "),
+        ])
+    return out.getvalue()
+
+
+def _write_archives(monkeypatch, chunk_rows: int, count: int = 40):
+    monkeypatch.setattr(stock_partitions, "ARCHIVE_CHUNK_ROWS", chunk_rows)
+    os.makedirs(stock_partitions.STOCK_ARCHIVE_DIR, exist_ok=True)
+    for month in MONTHS:
+        data = _copy_output(month, count)
+        with _ArchiveWriter(archive_path(month)) as out:
+            # COPY отдаёт данные кусками произвольной длины
+            for start in range(0, len(data), 37):
+                out.write(data[start:start + 37])
+        with open(archive_index_path(month), "w", encoding="utf-8") as f:
+            json.dump(out.index, f)
+
+
+def _expected(count: int = 40) -> list:
+    ops = []
+    for month in MONTHS:
+        ops += list(csv.DictReader(io.StringIO(_copy_output(month, count))))
+    return [(datetime.fromisoformat(op["timestamp"]), int(op["id"]), op["reason"] or None) for op in ops]
+
+
+def _keys(ops) -> list:
+    return [(op["timestamp"], op["id"], op["reason"]) for op in ops]
+
+
+def test_archive_is_plain_gzip_in_chunks(monkeypatch):
+    _write_archives(monkeypatch, chunk_rows=7)
+    with open(archive_index_path(MONTHS[0]), encoding="utf-8") as f:
+        assert len(json.load(f)) == 6  # 40 строк по 7
+    with gzip.open(archive_path(MONTHS[0]), "rt", encoding="utf-8", newline="") as f:
+        assert len(list(csv.DictReader(f))) == 40
+
+
+def test_read_both_directions(monkeypatch):
+    _write_archives(monkeypatch, chunk_rows=7)
+    expected = _expected()
+    assert _keys(iter_archived_operations(newest_first=False)) == expected
+    assert _keys(iter_archived_operations()) == expected[::-1]
+
+
+def test_newest_first_with_filters(monkeypatch):
+    _write_archives(monkeypatch, chunk_rows=7)
+    expected = _expected()
+    before = expected[55][:2]
+    since = expected[12][0]
+    ops = _keys(iter_archived_operations(operation_type="SALE", since=since, before=before))
+    assert ops == [
+        op for op in expected[::-1]
+        if op[:2] < before and op[0] >= since and op[1] % 2 == 1
+    ]
+
+
+def test_archive_without_index(monkeypatch):
+    _write_archives(monkeypatch, chunk_rows=7)
+    for month in MONTHS:
+        os.remove(archive_index_path(month))
+    assert _keys(iter_archived_operations()) == _expected()[::-1]
+
+
+def test_deleted_products_are_skipped(monkeypatch):
+    # Удаление товара не переписывает архив — его операции отсеиваются при чтении
+    _write_archives(monkeypatch, chunk_rows=7)
+    ops = list(iter_archived_operations(deleted_products=frozenset({2})))
+    assert ops and all(op["product_id"] != 2 for op in ops)
+    assert len(ops) == len([n for n in range(40) if n % 3 + 1 != 2]) * len(MONTHS)
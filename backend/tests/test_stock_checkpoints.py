@@ -0,0 +1,47 @@
+# tests/test_stock_checkpoints.py
+from decimal import Decimal
+from sqlalchemy import delete, update
+from app.database import db_now
+from app.models.product import Product
+from app.models.stock_operation import StockOperation
+from app.services.stock_checkpoints import create_checkpoint
+from conftest import sell
+
+
+def _as_of(client, at, product_id: int) -> dict:
+    resp = client.get("/api/stock/as-of", params={"at": at.isoformat(), "product_id": product_id})
+    assert resp.status_code == 200, resp.text
+    [item] = resp.json()["items"]
+    return item
+
+
+def test_checkpoint_covers_stock_missing_from_ledger(client, make_products, db):
+    # Остаток до ведения журнала (приходов нет) и правка в обход операций
+    old_stock, edited = make_products(2, quantity=50)
+    db.execute(delete(StockOperation).where(StockOperation.product_id.in_([old_stock, edited])))
+    db.execute(update(Product).where(Product.id == edited).values(quantity=70))
+    db.commit()
+
+    assert client.post("/api/stock/checkpoints").status_code == 200
+    sell(client, old_stock, quantity=5)
+
+    now = db_now(db)
+    assert _as_of(client, now, old_stock)["quantity"] == 45
+    assert _as_of(client, now, edited)["quantity"] == 70
+
+
+def test_checkpoint_before_later_operations(client, make_products, db):
+    # Точка в прошлом: из products вычитаются операции после неё
+    [product_id] = make_products(1, quantity=50, price="100.00")
+    before = db_now(db)
+    sell(client, product_id, quantity=3)
+    resp = client.put(f"/api/products/{product_id}", json={"purchase_price": "120.00"})
+    assert resp.status_code == 200, resp.text
+
+    checkpoint = create_checkpoint(db, before)
+    assert checkpoint.products_count > 0
+
+    item = _as_of(client, before, product_id)
+    assert (item["quantity"], Decimal(item["purchase_price"])) == (50, Decimal("100.00"))
+    item = _as_of(client, db_now(db), product_id)
+    assert (item["quantity"], Decimal(item["purchase_price"])) == (47, Decimal("120.00"))
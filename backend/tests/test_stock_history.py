@@ -0,0 +1,51 @@
+# tests/test_stock_history.py
+from sqlalchemy import update
+from app.models.stock_operation import StockOperation
+from conftest import sell
+
+
+def _history_pages(client, limit: int, **params) -> list:
+    """Все страницы /stock-history по X-Next-Cursor: [[id, ...], ...]"""
+    pages, cursor = [], None
+    while True:
+        resp = client.get("/api/stock-history", params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})})
+        assert resp.status_code == 200, resp.text
+        pages.append([op["id"] for op in resp.json()])
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            return pages
+        assert len(pages) < 1000, "курсор не продвигается"
+
+
+def test_pagination_within_one_second(client, make_products, db):
+    # Приходы пачки и продажи — десятки операций с временем в одной секунде
+    ids = make_products(30)
+    for product_id in ids:
+        sell(client, product_id)
+    ours = set(
+        op_id for op_id, in db.query(StockOperation.id).filter(StockOperation.product_id.in_(ids))
+    )
+    assert len(ours) == 60
+
+    pages = _history_pages(client, limit=10)
+    seen = [op_id for page in pages for op_id in page]
+    assert len(seen) == len(set(seen)), "страницы повторяются"
+    assert ours <= set(seen)
+    # Порядок проверяем по своим операциям: у параллельных продаж других тестов
+    # время в PostgreSQL — начало транзакции, и с порядком id оно не совпадает
+    seen_ours = [op_id for op_id in seen if op_id in ours]
+    assert seen_ours == sorted(seen_ours, reverse=True)
+
+
+def test_pagination_with_equal_timestamps(client, make_products, db):
+    # Одинаковое время у всех строк: порядок и курсор держатся только на id
+    ids = make_products(25)
+    ops = StockOperation.product_id.in_(ids)
+    same_time = db.query(StockOperation.timestamp).filter(ops).limit(1).scalar()
+    db.execute(update(StockOperation).where(ops).values(timestamp=same_time))
+    db.commit()
+    ours = {op_id for op_id, in db.query(StockOperation.id).filter(ops)}
+
+    seen = [op_id for page in _history_pages(client, limit=7) for op_id in page]
+    assert len(seen) == len(set(seen)), "страницы повторяются"
+    assert ours <= set(seen)
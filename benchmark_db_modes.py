@@ -0,0 +1,114 @@
+# benchmark_db_modes.py
+"""
+Сравнение синхронного и асинхронного (DB_ASYNC=true) режимов API под высокой
+конкурентностью: пропускная способность и хвостовые задержки.
+
+Для каждого режима поднимается отдельный uvicorn из backend/ на одной и той же
+БД, на него подаётся смешанная нагрузка (история, дельта каталога, продажи),
+затем процесс останавливается.
+
+Использование:
+    DATABASE_URL=postgresql://... python benchmark_db_modes.py --concurrency 200 --requests 5000
+
+Нужны httpx и asyncpg (pip install httpx asyncpg).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import httpx
+from load_test import start_server, stop_server, summarize, wait_ready
+
+# Доли запросов в смеси: (метод, путь, вес)
+WORKLOAD = [
+    ("GET", "/stock-history?limit=50", 4),
+    ("GET", "/products/changes?limit=100", 3),
+    ("POST", "/sales", 3),
+]
+
+
+async def seed_products(client: httpx.AsyncClient, count: int = 50) -> list:
+    resp = await client.post("/products/bulk", json=[
+        {"name": f"BENCH-{i}", "sku": f"BENCH-{i}", "purchase_price": "100.00",
+         "coefficient": "1.2", "quantity": 1_000_000}
+        for i in range(count)
+    ])
+    resp.raise_for_status()
+    return [p["id"] for p in resp.json()]
+
+
+async def one_request(client: httpx.AsyncClient, product_ids: list):
+    method, path, _ = random.choices(WORKLOAD, weights=[w for _, _, w in WORKLOAD])[0]
+    if method == "POST":
+        body = {"client_name": "bench", "items": [{
+            "product_id": random.choice(product_ids), "quantity": 1,
+            "sold_price_per_unit": "150.00", "coefficient": "1.0",
+        }]}
+        return await client.post(path, json=body)
+    return await client.get(path)
+
+
+async def run_load(client: httpx.AsyncClient, product_ids: list, total: int, concurrency: int):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                resp = await one_request(client, product_ids)
+                if resp.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def bench_mode(mode: str, port: int, args) -> dict:
+    server = start_server(port, {
+        "DATABASE_URL": args.database_url,
+        "DB_ASYNC": "true" if mode == "async" else "false",
+    })
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}/api", timeout=60.0, limits=limits) as client:
+            await wait_ready(client, server)
+            product_ids = await seed_products(client)
+            await run_load(client, product_ids, args.warmup, min(args.concurrency, args.warmup))
+            latencies, errors, elapsed = await run_load(client, product_ids, args.requests, args.concurrency)
+        return {"mode": mode, **summarize(latencies, errors, elapsed)}
+    finally:
+        stop_server(server)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="PostgreSQL для обоих режимов")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8801)
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("нужен --database-url или DATABASE_URL")
+
+    results = []
+    for offset, mode in enumerate(args.modes.split(",")):
+        result = await bench_mode(mode, args.port + offset, args)
+        results.append(result)
+        print(f"{mode:>6}: {result['rps']:>8} req/s  p50 {result['p50_ms']} ms  "
+              f"p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  ошибок {result['errors']}")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -28,6 +28,7 @@ const api = axios.create({
 // Products API
 export const productsAPI = {
   search: (query) => api.get('/products', { params: { q: query } }),
+  suggest: (query) => api.get('/products/suggest', { params: { q: query } }),
   getAll: () => api.get('/products/all'),
   create: (data) => api.post('/products', data),
   update: (id, data) => api.put(`/products/${id}`, data),
@@ -38,6 +39,7 @@ export const productsAPI = {
 export const salesAPI = {
   getAll: (status) => api.get('/sales', { params: { status } }),
   create: (data) => api.post('/sales', data),
+  createBatch: (data) => api.post('/sales/batch', data),
   updateStatus: (id, data) => api.put(`/sales/${id}/status`, data),
   delete: (id) => api.delete(`/sales/${id}`),
 };
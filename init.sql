@@ -7,3 +7,6 @@ CREATE EXTENSION IF NOT EXISTS "pgcrypto";
 
 -- Гарантировать права доступа
 GRANT ALL PRIVILEGES ON DATABASE inventory_db TO inventory_user;
+
+-- Триграммный поиск по названию и SKU товаров
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
@@ -0,0 +1,320 @@
+# load_test.py
+"""
+Нагрузочный тест API: поднимает uvicorn из backend/ на локальной БД,
+заполняет её товарами и гоняет смешанную нагрузку из пула асинхронных
+клиентов httpx. Результат — JSON с p50/p95/p99 и запросами в секунду
+по каждому сценарию и в целом; его можно сравнить с прошлым прогоном.
+
+Сценарии (вес в смеси):
+    catalog   GET /products/all, половина клиентов — с ETag (304)
+    search    GET /products?q=... по словам из названий и SKU
+    sale_hot  POST /sales, 80% позиций — на горячие SKU (конкуренция за строки)
+    history   GET /stock-history с переходом по X-Next-Cursor
+    import    POST /import/warehouse, небольшой xlsx
+
+Использование:
+    python load_test.py                                   # временная SQLite
+    python load_test.py --database-url postgresql://... --concurrency 100 --duration 60
+    python load_test.py --scenarios sale_hot,history --output after.json --compare before.json
+
+Для PostgreSQL нужна пустая (или тестовая) база: тест создаёт в ней товары и продажи.
+Нужны httpx и openpyxl (pip install httpx openpyxl).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import httpx
+import openpyxl
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+
+WORDS = ["ТОНЕР", "ДРАМ", "ФИЛЬТР", "ВАЛ", "РЕМЕНЬ", "ЧИП"]
+MODELS = ["C60", "C75", "DC250", "V80", "WC4110", "C560", "D110", "700DCP"]
+HOT_SKUS = 10         # Горячие товары, на которые приходится HOT_SHARE позиций продаж
+HOT_SHARE = 0.8
+HISTORY_PAGES = 3     # Сколько страниц истории листает один клиент
+IMPORT_ROWS = 200
+
+# Доля сценария в смеси по умолчанию
+WEIGHTS = {"catalog": 3, "search": 3, "sale_hot": 3, "history": 2, "import": 0.1}
+
+# Настройки сервера на время теста; переменные окружения запуска важнее
+SERVER_ENV = {
+    "SLOW_REQUEST_MS": "0",                  # EXPLAIN медленных запросов исказил бы замер
+    "STOCK_CHECKPOINT_INTERVAL_SEC": "0",
+}
+
+
+def start_server(port: int, env: dict) -> subprocess.Popen:
+    """uvicorn из backend/ с переменными env поверх окружения"""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**SERVER_ENV, **os.environ, **env},
+    )
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {server.returncode}")
+        try:
+            if (await client.get("/products/all")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.3)
+    raise RuntimeError("Сервер не поднялся")
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    """Сводка по списку задержек (сек): число, ошибки, rps и перцентили в мс"""
+    if not latencies:
+        return {"requests": 0, "errors": errors, "rps": 0.0}
+    q = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(q[49] * 1000, 1),
+        "p95_ms": round(q[94] * 1000, 1),
+        "p99_ms": round(q[98] * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def product_name(i: int) -> tuple:
+    return f"{WORDS[i % len(WORDS)]} {MODELS[i % len(MODELS)]} #{i}", f"LT-{i:06d}"
+
+
+async def seed_products(client: httpx.AsyncClient, count: int) -> list:
+    ids = []
+    for start in range(0, count, 1000):
+        resp = await client.post("/products/bulk", json=[
+            {"name": name, "sku": sku, "purchase_price": f"{100 + i % 900}.00",
+             "coefficient": "1.2", "quantity": 10_000_000}
+            for i in range(start, min(start + 1000, count))
+            for name, sku in [product_name(i)]
+        ], timeout=120.0)
+        resp.raise_for_status()
+        ids.extend(p["id"] for p in resp.json())
+    return ids
+
+
+def build_import_file(products: int) -> bytes:
+    """Лист «Склад»: половина строк — приход по существующим товарам, половина — новые"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Склад"
+    ws.append(["#", "Клиент/товар", "количество", "закупка за штуку", "SKU"])
+    for row in range(IMPORT_ROWS):
+        if row % 2 == 0:
+            name, sku = product_name(random.randrange(products))
+        else:
+            name, sku = f"ИМПОРТ {MODELS[row % len(MODELS)]} #{row}", f"LT-IMP-{row:05d}"
+        ws.append([row + 1, name, 5, "=150*1.2", sku])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+class Workload:
+    def __init__(self, product_ids: list, import_file: bytes):
+        self.product_ids = product_ids
+        self.hot_ids = product_ids[:HOT_SKUS]
+        self.import_file = import_file
+        self.catalog_etag = None
+
+    async def catalog(self, client):
+        headers = {}
+        if self.catalog_etag and random.random() < 0.5:
+            headers["If-None-Match"] = self.catalog_etag
+        resp = await client.get("/products/all", headers=headers)
+        self.catalog_etag = resp.headers.get("etag", self.catalog_etag)
+        yield resp
+
+    async def search(self, client):
+        term = random.choice(WORDS + MODELS + ["LT-0001", "LT-00"])
+        yield await client.get("/products", params={"q": term, "limit": 20})
+
+    async def sale_hot(self, client):
+        items = []
+        for _ in range(random.randint(1, 3)):
+            pool = self.hot_ids if random.random() < HOT_SHARE else self.product_ids
+            items.append({"product_id": random.choice(pool), "quantity": 1,
+                          "sold_price_per_unit": "250.00", "coefficient": "1.0"})
+        yield await client.post("/sales", json={"client_name": f"load-{random.randrange(50)}", "items": items})
+
+    async def history(self, client):
+        params = {"limit": 100}
+        if random.random() < 0.5:
+            params["product_id"] = random.choice(self.hot_ids)
+        for _ in range(HISTORY_PAGES):
+            resp = await client.get("/stock-history", params=params)
+            yield resp
+            cursor = resp.headers.get("x-next-cursor")
+            if not cursor:
+                break
+            params = {**params, "cursor": cursor}
+
+    async def import_(self, client):
+        yield await client.post(
+            "/import/warehouse",
+            files={"file": ("load.xlsx", self.import_file,
+                            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+        )
+
+
+async def run_load(client: httpx.AsyncClient, workload: Workload, weights: dict,
+                   concurrency: int, duration: float) -> tuple:
+    """Гонять сценарии duration секунд; вернуть ({сценарий: (задержки, ошибки)}, прошедшее время)"""
+    names = list(weights)
+    handlers = {name: getattr(workload, "import_" if name == "import" else name) for name in names}
+    results = {name: ([], [0]) for name in names}
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights=[weights[n] for n in names])[0]
+            latencies, errors = results[name]
+            # Каждый HTTP-запрос сценария (например, страница истории) замеряется отдельно
+            started = time.perf_counter()
+            try:
+                async for resp in handlers[name](client):
+                    latencies.append(time.perf_counter() - started)
+                    if resp.status_code >= 400:
+                        errors[0] += 1
+                        break
+                    started = time.perf_counter()
+            except httpx.HTTPError:
+                latencies.append(time.perf_counter() - started)
+                errors[0] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+def build_report(results: dict, elapsed: float, meta: dict) -> dict:
+    all_latencies = [lat for latencies, _ in results.values() for lat in latencies]
+    all_errors = sum(errors[0] for _, errors in results.values())
+    return {
+        "meta": meta,
+        "overall": summarize(all_latencies, all_errors, elapsed),
+        "scenarios": {
+            name: summarize(latencies, errors[0], elapsed)
+            for name, (latencies, errors) in results.items()
+        },
+    }
+
+
+def print_report(report: dict, baseline: dict = None):
+    rows = [("overall", report["overall"])] + list(report["scenarios"].items())
+    print(f"{'сценарий':<10} {'запросов':>9} {'ошибок':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, s in rows:
+        line = (f"{name:<10} {s['requests']:>9} {s['errors']:>7} {s['rps']:>8} "
+                f"{s.get('p50_ms', '-'):>8} {s.get('p95_ms', '-'):>8} {s.get('p99_ms', '-'):>8}")
+        if baseline:
+            base = baseline["overall"] if name == "overall" else baseline.get("scenarios", {}).get(name)
+            if base and base.get("rps") and base.get("p95_ms") and s.get("p95_ms"):
+                line += (f"   rps {(s['rps'] / base['rps'] - 1) * 100:+.1f}%"
+                         f"  p95 {(s['p95_ms'] / base['p95_ms'] - 1) * 100:+.1f}%")
+        print(line)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("LOAD_TEST_DATABASE_URL"),
+                        help="БД для сервера; по умолчанию — временная SQLite")
+    parser.add_argument("--scenarios", default=",".join(WEIGHTS), help="Сценарии через запятую")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="Длительность замера, сек")
+    parser.add_argument("--warmup", type=float, default=5, help="Прогрев перед замером, сек")
+    parser.add_argument("--products", type=int, default=2000, help="Сколько товаров создать")
+    parser.add_argument("--port", type=int, default=8802)
+    parser.add_argument("--seed", type=int, default=1, help="Seed случайного выбора сценариев и товаров")
+    parser.add_argument("--output", help="Сохранить JSON-отчёт в файл")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    weights = {}
+    for name in args.scenarios.split(","):
+        if name not in WEIGHTS:
+            parser.error(f"неизвестный сценарий {name}, есть: {', '.join(WEIGHTS)}")
+        weights[name] = WEIGHTS[name]
+    random.seed(args.seed)
+
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.mkdtemp(prefix="load_test_")
+        database_url = f"sqlite:///{os.path.join(tmp_dir, 'load.db')}"
+
+    server = start_server(args.port, {"DATABASE_URL": database_url})
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}/api",
+                                     timeout=60.0, limits=limits) as client:
+            await wait_ready(client, server)
+            product_ids = await seed_products(client, args.products)
+            workload = Workload(product_ids, build_import_file(args.products))
+            if args.warmup:
+                await run_load(client, workload, weights, args.concurrency, args.warmup)
+            results, elapsed = await run_load(client, workload, weights, args.concurrency, args.duration)
+    finally:
+        stop_server(server)
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = build_report(results, elapsed, {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "database": database_url.split(":", 1)[0].split("+", 1)[0],
+        "concurrency": args.concurrency,
+        "duration_sec": args.duration,
+        "products": args.products,
+        "weights": weights,
+    })
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,239 @@
+# microbench.py
+"""
+Микробенчмарки горячих функций — в процессе, без сервера и без БД:
+
+    parse_import_formula   parse_price_and_coeff из routes/import_excel.py, ячейка «=1234.56*1.2»
+    parse_import_number    то же, число с запятой «1234,56»
+    parse_service_formula  parse_price_and_coeff из services/excel_import_service.py
+    product_response       ProductResponse.model_validate(товар) + JSON, как /products/all
+    sale_response          _sale_to_response(продажа на 4 позиции) + JSON, как /sales
+    sale_pricing           _build_sale: Decimal-расчёт сумм и списание для продажи на 4 позиции
+
+Каждый бенчмарк запускается в отдельном процессе (состояние родителя и
+соседних бенчмарков не влияет на замер) и крутится пачками не короче
+--min-time; из --repeat замеров берётся лучший. Результат — операций в секунду; он сравнивается с
+сохранёнными базовыми значениями (microbench_baseline.json), и если
+какой-то бенчмарк медленнее базы больше чем на --threshold, скрипт
+завершается с кодом 1.
+
+Использование:
+    python microbench.py                          # прогон и сравнение с базой
+    python microbench.py -k parse                 # только бенчмарки с «parse» в имени
+    python microbench.py --save                   # записать текущие результаты как базу
+
+Базовые значения зависят от машины и версии Python: после изменения,
+ускоряющего код, или на новой машине их перезаписывают через --save и
+коммитят вместе с изменением.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+BASELINE_PATH = os.path.join(ROOT_DIR, "microbench_baseline.json")
+
+CATALOG_SIZE = 1000  # Товаров в одном вызове product_response
+SALES_BATCH = 100    # Продаж в одном вызове sale_response
+
+
+def _products(count: int) -> list:
+    from app.models.product import Product
+    return [
+        Product(
+            id=i, name=f"ТОНЕР-КАРТРИДЖ ЧЕРНЫЙ C60 #{i}", sku=f"TN-C60-{i:06d}",
+            purchase_price=Decimal(f"{1000 + i % 9000}.50"), coefficient=Decimal("1.2000"),
+            quantity=1_000_000,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def bench_parse_import_formula():
+    from app.routes.import_excel import parse_price_and_coeff
+    return lambda: parse_price_and_coeff("=1234.56*1.2"), 1
+
+
+def bench_parse_import_number():
+    from app.routes.import_excel import parse_price_and_coeff
+    return lambda: parse_price_and_coeff("1234,56"), 1
+
+
+def bench_parse_service_formula():
+    from app.services.excel_import_service import parse_price_and_coeff
+    return lambda: parse_price_and_coeff(1481.47, "=1234.56*1.2"), 1
+
+
+def bench_product_response():
+    from app.schemas.product import ProductResponse
+    from app.services.catalog_cache import _catalog_adapter
+    products = _products(CATALOG_SIZE)
+    return lambda: _catalog_adapter.dump_json([ProductResponse.model_validate(p) for p in products]), CATALOG_SIZE
+
+
+def bench_sale_response():
+    from pydantic import TypeAdapter
+    from app.models.sale import PaymentStatus, Sale, SaleItem
+    from app.routes.sales import _sale_to_response
+    from app.schemas.sale import SaleResponse
+    adapter = TypeAdapter(list[SaleResponse])
+    products = _products(4)
+    sales = [
+        Sale(
+            id=n, client_name="ООО Тест", total_sale=Decimal("24000.00"), total_cost=Decimal("16000.00"),
+            margin=Decimal("8000.00"), payment_status=PaymentStatus.PAID,
+            items=[
+                SaleItem(product_id=p.id, product=p, quantity=2, sold_price_per_unit=Decimal("3000.00"),
+                         coefficient=Decimal("1.0000"), purchase_price_at_sale=p.purchase_price)
+                for p in products
+            ],
+        )
+        for n in range(1, SALES_BATCH + 1)
+    ]
+    return lambda: adapter.dump_json([_sale_to_response(s) for s in sales]), SALES_BATCH
+
+
+def bench_sale_pricing():
+    from app.routes.sales import _build_sale
+    from app.schemas.sale import SaleCreate
+    products = {p.id: p for p in _products(4)}
+    sale = SaleCreate(client_name="ООО Тест", items=[
+        {"product_id": pid, "quantity": 2, "sold_price_per_unit": "3000.00", "coefficient": "1.2"}
+        for pid in products
+    ])
+    return lambda: _build_sale(sale, products), 1
+
+
+BENCHMARKS = {
+    "parse_import_formula": bench_parse_import_formula,
+    "parse_import_number": bench_parse_import_number,
+    "parse_service_formula": bench_parse_service_formula,
+    "product_response": bench_product_response,
+    "sale_response": bench_sale_response,
+    "sale_pricing": bench_sale_pricing,
+}
+
+
+def measure(func, ops_per_call: int, repeat: int, min_time: float) -> float:
+    """Лучшая за repeat замеров скорость, операций в секунду"""
+    # Как в timeit: сборщик мусора в замер не попадает
+    gc.collect()
+    gc.disable()
+    try:
+        return _measure(func, ops_per_call, repeat, min_time)
+    finally:
+        gc.enable()
+
+
+def _measure(func, ops_per_call: int, repeat: int, min_time: float) -> float:
+    # Подбираем число вызовов в пачке так, чтобы пачка шла не меньше min_time
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        calls = calls * 2 if elapsed < min_time / 10 else int(calls * min_time / elapsed) + 1
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, time.perf_counter() - started)
+    return calls * ops_per_call / best
+
+
+def run_isolated(name: str, repeat: int, min_time: float) -> float:
+    """Замерить бенчмарк name в отдельном процессе"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", name,
+         "--repeat", str(repeat), "--min-time", str(min_time)],
+        check=True, stdout=subprocess.PIPE, text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def worker(name: str, repeat: int, min_time: float):
+    # БД не нужна: движок создаётся, но соединений не открывает
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    sys.path.insert(0, BACKEND_DIR)
+    func, ops_per_call = BENCHMARKS[name]()
+    print(measure(func, ops_per_call, repeat, min_time))
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(terse=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки импорта, сериализации и расчёта продаж")
+    parser.add_argument("-k", dest="pattern", help="только бенчмарки, в имени которых есть подстрока")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="длительность одного замера, с")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="допустимое замедление относительно базы (0.2 = 20%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="записать результаты в файл базы")
+    parser.add_argument("--worker", choices=BENCHMARKS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.repeat, args.min_time)
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        if saved.get("environment") != environment():
+            print(f"База снята в другом окружении ({saved.get('environment')}) — сравнение ориентировочное")
+
+    results = {}
+    regressions = []
+    print(f"{'бенчмарк':<24}{'оп/с':>14}{'мкс/оп':>10}{'база, оп/с':>14}{'изм.':>9}")
+    for name in BENCHMARKS:
+        if args.pattern and args.pattern not in name:
+            continue
+        ops = run_isolated(name, args.repeat, args.min_time)
+        results[name] = round(ops, 1)
+        line = f"{name:<24}{ops:>14,.0f}{1e6 / ops:>10.2f}"
+        if name in baseline:
+            change = ops / baseline[name] - 1
+            line += f"{baseline[name]:>14,.0f}{change:>+9.1%}"
+            if change < -args.threshold:
+                regressions.append(name)
+                line += "  ЗАМЕДЛЕНИЕ"
+        print(line)
+
+    if args.save:
+        # Остальные бенчмарки из базы сохраняем как были (при запуске с -k)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "saved_at": datetime.now().isoformat(timespec="seconds"),
+                "environment": environment(),
+                "results": {**baseline, **results},
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"База записана: {args.baseline}")
+    elif regressions:
+        print(f"Медленнее базы больше чем на {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
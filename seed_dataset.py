@@ -0,0 +1,347 @@
+# seed_dataset.py
+"""
+Большой синтетический набор данных для проверки производительности:
+товары, продажи с позициями и полная история остатков (stock_operations).
+
+Данные моделируются по времени: товары заводятся приходом в начале
+периода (--days до текущего момента), затем идут продажи по 1–4 позиции.
+Популярность SKU распределена по Ципфу (--zipf): небольшая доля товаров
+даёт большую часть продаж, как на реальном складе. Когда остатка не
+хватает, перед продажей появляется поставка (INCOMING); изредка —
+корректировки (ADJUSTMENT). Остатки в products сходятся с историей,
+суммы продаж считаются так же, как в create_sale.
+
+Строки пишутся во временные TSV-файлы и загружаются одной транзакцией:
+в PostgreSQL — через COPY, в SQLite — пачками executemany. Данные
+добавляются к уже существующим (id продолжают текущие). После загрузки
+пересчитываются агрегаты продаж и повышается версия каталога.
+
+Использование:
+    DATABASE_URL=postgresql://... python seed_dataset.py             # 100k товаров, 400k продаж
+    python seed_dataset.py --database-url sqlite:///./big.db --products 10000 --sales 40000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+
+BASE_NAMES = [
+    "ТОНЕР-КАРТРИДЖ ЧЕРНЫЙ", "ТОНЕР-КАРТРИДЖ СИНИЙ", "ТОНЕР-КАРТРИДЖ ПУРПУРНЫЙ",
+    "ТОНЕР-КАРТРИДЖ ЖЕЛТЫЙ", "ДРАМ-КАРТРИДЖ ЧЕРНЫЙ", "ФИЛЬТР ОЗОНОВЫЙ",
+    "НАГРЕВАТЕЛЬНЫЙ ВАЛ", "ПРИЖИМНОЙ ВАЛ", "РЕМЕНЬ ПЕРЕНОСА", "ЧИП НА ДРАМ",
+]
+SKU_TYPES = ["TN", "TN", "TN", "TN", "DM", "FLT", "ROL", "ROL", "BLT", "CH"]
+MODELS = ["700DCP", "C1000", "V80", "C60", "DC250", "C75", "WC4110", "C560", "D110", "PL-C9070"]
+CLIENT_PREFIXES = ["ООО", "ИП", "АО", "ЗАО"]
+PRODUCT_COEFFICIENTS = ["1.0000", "1.1000", "1.2000", "1.3000", "1.5000"]
+# Коэффициент позиции продажи (НДС, наличка): (значение в десятых, вес)
+SALE_COEFFICIENTS = [(10, 80), (12, 15), (11, 5)]
+PAYMENT_STATUSES = [("PAID", 70), ("UNPAID", 20), ("PARTIAL", 10)]
+
+PRODUCTS_SHARE_OF_PERIOD = 0.05  # Товары заводятся в первые 5% периода
+RESTOCKS_PER_PERIOD = 12         # Примерно столько поставок за период у популярного товара
+ADJUSTMENT_RATE = 0.02           # Доля продаж, после которых идёт корректировка остатка
+SQLITE_CHUNK = 10_000
+NULL = "\\N"
+
+# Колонки в порядке записи в TSV (порядок таблиц — порядок загрузки из-за внешних ключей)
+COLUMNS = {
+    "products": ["id", "name", "sku", "purchase_price", "coefficient", "quantity", "created_at", "updated_at"],
+    "sales": ["id", "client_name", "total_sale", "total_cost", "margin", "payment_status", "created_at"],
+    "sale_items": [
+        "id", "sale_id", "product_id", "quantity", "sold_price_per_unit",
+        "coefficient", "purchase_price_at_sale",
+    ],
+    "stock_operations": [
+        "id", "product_id", "operation_type", "quantity_change", "old_quantity", "new_quantity",
+        "old_purchase_price", "new_purchase_price", "old_coefficient", "new_coefficient",
+        "sold_price_per_unit", "reason", "timestamp",
+    ],
+}
+
+
+def money(cents: int) -> str:
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def stamp(value: datetime) -> str:
+    """
+    Время всегда с микросекундами: SQLite сравнивает время как строки, а
+    str() у целой секунды отбрасывает '.000000', и такая строка оказалась
+    бы раньше курсора '... .000000' той же секунды
+    """
+    return value.isoformat(sep=" ", timespec="microseconds")
+
+
+def round_half_up(value: int, divisor: int) -> int:
+    return (value + divisor // 2) // divisor
+
+
+def zipf_cum_weights(count: int, exponent: float) -> list:
+    """Накопленные веса рангов 1..count для random.choices"""
+    return list(accumulate(1.0 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Generator:
+    """Моделирует склад и пишет строки таблиц во временные TSV-файлы"""
+
+    def __init__(self, args, first_ids: dict, workdir: str):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.next_id = dict(first_ids)
+        self.counts = dict.fromkeys(COLUMNS, 0)
+        self.paths = {table: os.path.join(workdir, f"{table}.tsv") for table in COLUMNS}
+        self.files = {table: open(path, "w", encoding="utf-8") for table, path in self.paths.items()}
+
+    def write(self, table: str, values: list) -> int:
+        row_id = self.next_id[table]
+        self.next_id[table] += 1
+        self.counts[table] += 1
+        self.files[table].write(f"{row_id}\t" + "\t".join(values) + "\n")
+        return row_id
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+    def run(self, now: datetime):
+        args, rng = self.args, self.rng
+        start = now - timedelta(days=args.days)
+        period = (now - start).total_seconds()
+        products_until = period * PRODUCTS_SHARE_OF_PERIOD
+
+        # Популярность: ранг по Ципфу, товары по рангам перемешаны
+        ranks = list(range(args.products))
+        rng.shuffle(ranks)
+        cum_weights = zipf_cum_weights(args.products, args.zipf)
+        total_weight = cum_weights[-1]
+        expected_units = args.sales * 2.5 * 2.2  # В среднем позиций на продажу и единиц на позицию
+
+        # Товар: [id, название, SKU, цена в копейках, коэффициент, остаток, партия поставки, создан]
+        products = []
+        for i in range(args.products):
+            base = rng.randrange(len(BASE_NAMES))
+            model = rng.choice(MODELS)
+            share = (cum_weights[ranks[i]] - (cum_weights[ranks[i] - 1] if ranks[i] else 0)) / total_weight
+            lot = max(5, round(share * expected_units / RESTOCKS_PER_PERIOD))
+            created_at = start + timedelta(seconds=products_until * i / args.products)
+            products.append([
+                self.next_id["products"] + i,
+                f"{BASE_NAMES[base]} {model} v{i}",
+                f"{SKU_TYPES[base]}-{model}-{i:06d}",
+                rng.randrange(50_000, 3_000_000),
+                rng.choice(PRODUCT_COEFFICIENTS),
+                lot,
+                lot,
+                created_at,
+            ])
+            self.incoming(products[-1], lot, created_at, "Ручной приход", first=True)
+
+        by_rank = [None] * args.products
+        for i, rank in enumerate(ranks):
+            by_rank[rank] = products[i]
+        clients = [f"{rng.choice(CLIENT_PREFIXES)} Клиент {n}" for n in range(args.clients)]
+        client_weights = zipf_cum_weights(args.clients, 1.0)
+        sale_coefficients = [c for c, _ in SALE_COEFFICIENTS]
+        sale_coeff_weights = list(accumulate(w for _, w in SALE_COEFFICIENTS))
+        statuses = [s for s, _ in PAYMENT_STATUSES]
+        status_weights = list(accumulate(w for _, w in PAYMENT_STATUSES))
+
+        sales_from = products_until
+        step = (period - sales_from) / max(args.sales, 1)
+        for n in range(args.sales):
+            slot = start + timedelta(seconds=sales_from + n * step)
+            at = slot + timedelta(seconds=rng.random() * step)
+            picked = {}
+            for product in rng.choices(by_rank, cum_weights=cum_weights, k=rng.randint(1, 4)):
+                quantity = rng.choices((1, 2, 3, 5, 10), cum_weights=(50, 75, 88, 96, 100))[0]
+                picked[product[0]] = (product, picked.get(product[0], (None, 0))[1] + quantity)
+            self.sale(picked.values(), slot, at, rng.choices(clients, cum_weights=client_weights)[0],
+                      rng.choices(statuses, cum_weights=status_weights)[0],
+                      sale_coefficients, sale_coeff_weights)
+            if rng.random() < ADJUSTMENT_RATE:
+                self.adjustment(rng.choices(by_rank, cum_weights=cum_weights)[0], at)
+
+        # Итоговые остатки известны только после всей истории
+        for product_id, name, sku, price, coeff, quantity, _, created_at in products:
+            self.write("products", [name, sku, money(price), coeff, str(quantity),
+                                    stamp(created_at), stamp(created_at)])
+
+    def incoming(self, product, quantity: int, at: datetime, reason: str, first: bool = False):
+        price, coeff = money(product[3]), product[4]
+        old_quantity = 0 if first else product[5]
+        if not first:
+            product[5] += quantity
+        self.write("stock_operations", [
+            str(product[0]), "INCOMING", str(quantity), str(old_quantity), str(old_quantity + quantity),
+            "0.00" if first else price, price, "1.0000" if first else coeff, coeff,
+            NULL, reason, stamp(at),
+        ])
+
+    def adjustment(self, product, at: datetime):
+        # Недостача при инвентаризации: списываем не больше, чем есть
+        change = -min(product[5], self.rng.randint(1, 3))
+        if change == 0:
+            return
+        old_quantity = product[5]
+        product[5] += change
+        self.write("stock_operations", [
+            str(product[0]), "ADJUSTMENT", str(change), str(old_quantity), str(product[5]),
+            NULL, NULL, NULL, NULL, NULL, "Ручная корректировка", stamp(at),
+        ])
+
+    def sale(self, picked, slot: datetime, at: datetime, client: str, status: str, coefficients, coeff_weights):
+        rng = self.rng
+        sale_id = self.next_id["sales"]
+        at_text = stamp(at)
+        # Суммы в тысячных долях копейки: цена (коп.) × коэффициент (десятые) × количество
+        revenue = 0
+        cost = 0
+        for product, quantity in picked:
+            if product[5] < quantity:
+                # Поставка между предыдущей продажей и этой
+                self.incoming(product, max(product[6], quantity), slot, "Поставка")
+            sold_cents = round_half_up(product[3] * int(product[4].replace(".", "")), 10_000)
+            sold_cents += rng.randrange(0, sold_cents // 10 + 1)  # Торг: до +10% к базовой цене
+            coefficient = rng.choices(coefficients, cum_weights=coeff_weights)[0]
+            revenue += sold_cents * coefficient * quantity
+            cost += product[3] * quantity * 10
+            old_quantity = product[5]
+            product[5] -= quantity
+            self.write("sale_items", [
+                str(sale_id), str(product[0]), str(quantity), money(sold_cents),
+                f"{coefficient // 10}.{coefficient % 10}000", money(product[3]),
+            ])
+            self.write("stock_operations", [
+                str(product[0]), "SALE", str(-quantity), str(old_quantity), str(product[5]),
+                NULL, NULL, NULL, NULL, money(sold_cents), NULL, at_text,
+            ])
+        total_sale = round_half_up(revenue, 10)
+        total_cost = round_half_up(cost, 10)
+        self.write("sales", [client, money(total_sale), money(total_cost),
+                             money(total_sale - total_cost), status, at_text])
+
+
+def first_ids(conn) -> dict:
+    from sqlalchemy import text
+    return {
+        table: conn.execute(text(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")).scalar()
+        for table in COLUMNS
+    }
+
+
+def load_postgres(conn, paths: dict, since: datetime):
+    from sqlalchemy import text
+    from app.services.stock_partitions import ensure_partitions, is_partitioned
+    if is_partitioned(conn):
+        ensure_partitions(conn, since=since.date())
+    cursor = conn.connection.dbapi_connection.cursor()
+    for table, columns in COLUMNS.items():
+        started = time.perf_counter()
+        with open(paths[table], encoding="utf-8") as f:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text)", f)
+        print(f"  COPY {table}: {cursor.rowcount} строк за {time.perf_counter() - started:.1f} с")
+    for table in COLUMNS:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+        ))
+
+
+def load_sqlite(conn, paths: dict):
+    cursor = conn.connection.dbapi_connection.cursor()
+    for table, columns in COLUMNS.items():
+        started = time.perf_counter()
+        statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        rows = 0
+        with open(paths[table], encoding="utf-8") as f:
+            chunk = []
+            for line in f:
+                chunk.append([None if v == NULL else v for v in line.rstrip("\n").split("\t")])
+                if len(chunk) == SQLITE_CHUNK:
+                    cursor.executemany(statement, chunk)
+                    rows += len(chunk)
+                    chunk = []
+            cursor.executemany(statement, chunk)
+            rows += len(chunk)
+        print(f"  INSERT {table}: {rows} строк за {time.perf_counter() - started:.1f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетический набор данных большого объёма")
+    parser.add_argument("--database-url", help="по умолчанию DATABASE_URL из окружения/.env")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--sales", type=int, default=400_000)
+    parser.add_argument("--clients", type=int, default=5_000)
+    parser.add_argument("--days", type=int, default=365, help="период истории до текущего момента")
+    parser.add_argument("--zipf", type=float, default=1.1, help="показатель распределения популярности SKU")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-rollups", action="store_true", help="не пересчитывать агрегаты продаж")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, BACKEND_DIR)
+    from app.database import Base, SessionLocal, engine
+    from app.services import sales_rollups
+    from sqlalchemy import delete, func, update
+    from app.models.product import Product, ProductTombstone
+    from app.services.catalog_cache import bump_version
+    import app.models  # noqa: F401 — все таблицы для create_all
+
+    Base.metadata.create_all(bind=engine)
+    print(f"БД: {engine.url.render_as_string(hide_password=True)}")
+
+    total_started = time.perf_counter()
+    now = datetime.utcnow().replace(microsecond=0)
+    with tempfile.TemporaryDirectory(prefix="seed_dataset_") as workdir:
+        with engine.connect() as conn:
+            ids = first_ids(conn)
+            generator = Generator(args, ids, workdir)
+        started = time.perf_counter()
+        try:
+            generator.run(now)
+        finally:
+            generator.close()
+        print(f"Сгенерировано за {time.perf_counter() - started:.1f} с: "
+              + ", ".join(f"{table} {count}" for table, count in generator.counts.items()))
+
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                load_postgres(conn, generator.paths, now - timedelta(days=args.days))
+            else:
+                load_sqlite(conn, generator.paths)
+            if engine.dialect.name == "postgresql":
+                for table in COLUMNS:
+                    conn.exec_driver_sql(f"ANALYZE {table}")
+        print(f"Загружено за {time.perf_counter() - started:.1f} с")
+
+    # Для дельта-синхронизации и индекса подсказок новые товары — изменения,
+    # сделанные сейчас: updated_at по часам БД уже после загрузки (иначе они
+    # оказались бы позади курсоров клиентов), версия каталога — вместе с ним
+    with engine.begin() as conn:
+        conn.execute(update(Product).where(Product.id >= ids["products"]).values(updated_at=func.now()))
+        # id после MAX(id) могли принадлежать удалённым товарам
+        conn.execute(delete(ProductTombstone).where(ProductTombstone.product_id >= ids["products"]))
+        bump_version(conn)
+
+    if not args.skip_rollups:
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            result = sales_rollups.rebuild(db)
+        finally:
+            db.close()
+        print(f"Агрегаты продаж пересчитаны за {time.perf_counter() - started:.1f} с: {result}")
+    print(f"Готово за {time.perf_counter() - total_started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# stress_sales.py
+"""
+Стресс-тест продаж: N параллельных POST /sales по нескольким горячим SKU
+с ограниченным остатком. Спрос больше остатка, поэтому часть продаж
+обязана получить отказ (400), а склад — дойти ровно до нуля.
+
+После прогона проверяется по каждому горячему товару:
+    - остаток не ушёл в минус;
+    - остаток = начальный остаток − списания по журналу (stock_operations);
+    - списания по журналу = сумма позиций успешных ответов;
+    - в журнале нет отрицательных new_quantity;
+и что не было ответов 5xx (взаимоблокировки, таймауты пула).
+Печатает успешные продажи в секунду; при нарушении — код выхода 1.
+
+С --baseline тот же прогон сначала выполняется на сервере со старой схемой
+продажи (SALES_BASELINE_READ_MODIFY_WRITE: SELECT на позицию без блокировки
+и запись пересчитанного остатка), и печатаются обе скорости. Нарушения
+базового прогона только показываются — ради них он и нужен.
+
+Использование:
+    python stress_sales.py                                 # временная SQLite
+    python stress_sales.py --baseline                      # сравнить со старой схемой
+    python stress_sales.py --database-url postgresql://... --sales 5000 --concurrency 100
+
+Для PostgreSQL нужна пустая (или тестовая) база. Нужен httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import httpx
+from load_test import start_server, stop_server, summarize, wait_ready
+
+
+async def seed_hot_products(client: httpx.AsyncClient, count: int, stock: int) -> list:
+    resp = await client.post("/products/bulk", json=[
+        {"name": f"STRESS-{i}", "sku": f"STRESS-{i:03d}", "purchase_price": "100.00",
+         "coefficient": "1.2", "quantity": stock}
+        for i in range(count)
+    ])
+    resp.raise_for_status()
+    return [p["id"] for p in resp.json()]
+
+
+async def ledger(client: httpx.AsyncClient, product_id: int) -> list:
+    """Все операции товара из /stock-history (по страницам)"""
+    ops, params = [], {"product_id": product_id, "limit": 5000}
+    while True:
+        resp = await client.get("/stock-history", params=params)
+        resp.raise_for_status()
+        ops += resp.json()
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            return ops
+        params = {**params, "cursor": cursor}
+
+
+async def run_sales(client: httpx.AsyncClient, product_ids: list, sales: int, concurrency: int):
+    """Продажи из очереди в concurrency потоков; вернуть (задержки, проданные единицы, коды ответов)"""
+    queue = asyncio.Queue()
+    for _ in range(sales):
+        queue.put_nowait([
+            {"product_id": random.choice(product_ids), "quantity": random.randint(1, 3),
+             "sold_price_per_unit": "150.00", "coefficient": "1.0"}
+            for _ in range(random.randint(1, 3))
+        ])
+    latencies = []
+    sold = {product_id: 0 for product_id in product_ids}
+    statuses = {}
+
+    async def worker():
+        while not queue.empty():
+            items = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                resp = await client.post("/sales", json={"client_name": "stress", "items": items})
+                status = resp.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                for item in items:
+                    sold[item["product_id"]] += item["quantity"]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, sold, statuses, time.perf_counter() - started
+
+
+async def check_stock(client: httpx.AsyncClient, product_ids: list, stock: int, sold: dict) -> list:
+    """Нарушения инвариантов склада (пустой список — всё сошлось)"""
+    problems = []
+    products = {p["id"]: p for p in (await client.get("/products/all")).json()}
+    for product_id in product_ids:
+        quantity = products[product_id]["quantity"]
+        ops = await ledger(client, product_id)
+        written_off = -sum(op["quantity_change"] for op in ops if op["operation_type"] == "SALE")
+        if quantity < 0:
+            problems.append(f"товар {product_id}: отрицательный остаток {quantity}")
+        if quantity != stock - written_off:
+            problems.append(f"товар {product_id}: остаток {quantity}, а по журналу {stock} − {written_off}")
+        if written_off != sold[product_id]:
+            problems.append(f"товар {product_id}: в журнале списано {written_off}, продано {sold[product_id]}")
+        negative = [op["id"] for op in ops if op["new_quantity"] is not None and op["new_quantity"] < 0]
+        if negative:
+            problems.append(f"товар {product_id}: отрицательный остаток в операциях {negative[:5]}")
+    return problems
+
+
+async def stress(args, baseline: bool) -> tuple:
+    """Один прогон на отдельном сервере; вернуть (продаж/с, нарушения)"""
+    random.seed(args.seed)  # Оба прогона получают одинаковые продажи
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.mkdtemp(prefix="stress_sales_")
+        database_url = f"sqlite:///{os.path.join(tmp_dir, 'stress.db')}"
+
+    env = {"DATABASE_URL": database_url, "SALES_BASELINE_READ_MODIFY_WRITE": str(baseline).lower()}
+    server = start_server(args.port, env)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}/api",
+                                     timeout=120.0, limits=limits) as client:
+            await wait_ready(client, server)
+            product_ids = await seed_hot_products(client, args.hot_skus, args.stock)
+            latencies, sold, statuses, elapsed = await run_sales(client, product_ids, args.sales, args.concurrency)
+            problems = await check_stock(client, product_ids, args.stock, sold)
+    finally:
+        stop_server(server)
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    succeeded = statuses.get(200, 0)
+    failed = {status: n for status, n in statuses.items() if status not in (200, 400)}
+    summary = summarize(latencies, sum(failed.values()), elapsed)
+    print(f"[{'старая схема' if baseline else 'блокировка строк'}]")
+    print(f"Успешно: {succeeded} ({succeeded / elapsed:.1f} продаж/с), отказов по остатку: {statuses.get(400, 0)}")
+    print(f"Задержка p50/p95/p99: {summary.get('p50_ms')}/{summary.get('p95_ms')}/{summary.get('p99_ms')} мс")
+    print(f"Продано единиц: {sum(sold.values())} из {args.hot_skus * args.stock}")
+    if failed:
+        problems.append(f"ошибочные ответы: {failed}")
+    return succeeded / elapsed, problems
+
+
+def print_problems(problems: list):
+    for problem in problems:
+        print(f"  - {problem}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="БД для сервера; по умолчанию — временная SQLite")
+    parser.add_argument("--sales", type=int, default=2000, help="Сколько продаж отправить")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--hot-skus", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=500, help="Начальный остаток каждого горячего SKU")
+    parser.add_argument("--port", type=int, default=8803)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", action="store_true",
+                        help="Сначала прогнать старую схему продажи без блокировок и сравнить скорость")
+    args = parser.parse_args()
+
+    print(f"Продаж: {args.sales}, параллельно: {args.concurrency}, горячих SKU: {args.hot_skus} × {args.stock} шт.")
+    if args.baseline:
+        baseline_rate, baseline_problems = await stress(args, baseline=True)
+        if baseline_problems:
+            print("⚠️ Нарушения старой схемы (ожидаемо):")
+            print_problems(baseline_problems)
+    rate, problems = await stress(args, baseline=False)
+
+    if args.baseline:
+        ratio = f" ({rate / baseline_rate:.2f}×)" if baseline_rate else ""
+        print(f"Продаж/с: старая схема {baseline_rate:.1f}, блокировка строк {rate:.1f}{ratio}")
+    if problems:
+        print("❌ Нарушения:")
+        print_problems(problems)
+        sys.exit(1)
+    print("✅ Перепродаж нет, остатки сходятся с журналом")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
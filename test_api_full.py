@@ -1,10 +1,29 @@
 # test_api_full.py
 import asyncio
+import os
+import sys
 import time
 import httpx
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from app.services.sql_tracing import QUERY_BUDGETS, QueryBudgetExceeded, assert_query_budget
+
 BASE_URL = "http://localhost:8700/api"
 
+# Бюджеты SQL-запросов (QUERY_BUDGETS) общие с backend/tests/test_query_budgets.py
+budget_failures = []
+
+def check_query_budget(resp, endpoint):
+    """Сравнить число запросов к БД из заголовка Server-Timing с бюджетом"""
+    budget = QUERY_BUDGETS[endpoint]
+    try:
+        count = assert_query_budget(resp, budget)
+    except QueryBudgetExceeded as e:
+        budget_failures.append(f"{endpoint}: {e}")
+        print(f"  ❌ {e}")
+        return
+    print(f"  → SQL-запросов: {count} (бюджет {budget})")
+
 async def log(msg):
     print("\n✅", msg)
     await asyncio.sleep(1)
@@ -103,6 +122,7 @@ async def test_full_workflow():
         sale_ids = []
         for sale in sales_to_create:
             resp = await client.post(f"{BASE_URL}/sales", json=sale)
+            check_query_budget(resp, "POST /sales")
             if resp.status_code == 200:
                 data = resp.json()
                 sale_ids.append(data["id"])
@@ -118,12 +138,14 @@ async def test_full_workflow():
         await log("6. Удаляем первую продажу → товары должны вернуться на склад")
         resp = await client.delete(f"{BASE_URL}/sales/{sale_ids[0]}")
         print(f"  → Удаление продажи #{sale_ids[0]}: статус {resp.status_code}")
+        check_query_budget(resp, "DELETE /sales/{id}")
 
         await asyncio.sleep(1)
 
         # === 7. Получение всех продаж с фильтрацией по статусу ===
         await log("7. Получаем все продажи")
         resp = await client.get(f"{BASE_URL}/sales")
+        check_query_budget(resp, "GET /sales")
         if resp.status_code == 200:
             sales = resp.json()
             print(f"  → Всего продаж: {len(sales)}")
@@ -148,6 +170,7 @@ async def test_full_workflow():
         # === 9. Финальный вывод склада ===
         await log("9. Текущее состояние склада после всех операций")
         resp = await client.get(f"{BASE_URL}/products/all")
+        check_query_budget(resp, "GET /products/all")
         if resp.status_code == 200:
             products = resp.json()
             print(f"  → Всего товаров на складе: {len(products)}")
@@ -161,6 +184,7 @@ async def test_full_workflow():
         # === 10. Получение истории операций ===
         await log("10. Получаем историю операций со складом (последние 7 дней)")
         resp = await client.get(f"{BASE_URL}/stock-history", params={"days": 7})
+        check_query_budget(resp, "GET /stock-history")
         if resp.status_code == 200:
             history = resp.json()
             print(f"  → Всего операций: {len(history)}")
@@ -175,4 +199,7 @@ async def test_full_workflow():
         await log("✅ Тестирование завершено!")
 
 if __name__ == "__main__":
-    asyncio.run(test_full_workflow())
\ No newline at end of file
+    asyncio.run(test_full_workflow())
+    if budget_failures:
+        print("\n❌ Превышены бюджеты SQL-запросов:\n  " + "\n  ".join(budget_failures))
+        sys.exit(1)